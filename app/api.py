@@ -0,0 +1,144 @@
+"""Read-only JSON API served by an ASGI server next to the Flask UI:
+
+    uvicorn app.api:api --host 0.0.0.0 --port 8001
+
+Handlers are async; each one runs its blocking queries on a dedicated thread limiter (API_DB_THREADS)
+through the same services and SQL the Flask pages use, so many lightweight pollers share a few
+pooled connections without holding Flask workers. A bearer token is required and decides the agency
+(API_TOKENS / API_TOKEN); every endpoint reads only that agency, routed to its database, and never writes.
+"""
+import hmac
+import anyio
+from fastapi import Depends, FastAPI, Header, HTTPException
+from sqlalchemy import text
+from app.config.settings import API_DB_THREADS, API_TOKEN, API_TOKENS, DEFAULT_AGENCY_ID
+from app.db.session import SessionLocal
+from app.services.agency import current_agency_id, use_agency
+from app.services.day_context import get_day_context
+from app.services.workflow_state import read_progress
+from app.services.day_views import (
+    load_stock_summary, load_issue_totals, load_delivery_issues, load_cash_balances, load_saved_cash_balances,
+)
+
+_limiter = None
+
+
+def _parse_tokens(value, default_token):
+    tokens = {}
+    for item in filter(None, (part.strip() for part in value.split(";"))):
+        token, _, agency_id = item.rpartition("=")
+        tokens[token.strip()] = int(agency_id)
+    if default_token:
+        tokens[default_token] = DEFAULT_AGENCY_ID
+    return tokens
+
+
+# Bearer token -> the one agency it may read
+TOKENS = _parse_tokens(API_TOKENS, API_TOKEN)
+
+
+def _db_limiter():
+    # Created lazily: a CapacityLimiter must be built inside the running event loop
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(API_DB_THREADS)
+    return _limiter
+
+
+async def run_db(fn, agency_id, *args):
+    """Run fn(db, *args) for one agency on the DB thread pool with its own session."""
+    def call():
+        with use_agency(agency_id):
+            db = SessionLocal()
+            try:
+                return fn(db, *args)
+            finally:
+                db.close()
+    return await anyio.to_thread.run_sync(call, limiter=_db_limiter())
+
+
+def token_agency(authorization: str = Header(default="")):
+    """The agency bound to the request's bearer token; 401 when it matches none (or none are configured)."""
+    agency_id = None
+    for token, token_agency_id in TOKENS.items():
+        if hmac.compare_digest(authorization, f"Bearer {token}"):
+            agency_id = token_agency_id
+    if agency_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or missing API token")
+    return agency_id
+
+
+def _rows(rows):
+    return [dict(r._mapping) for r in rows]
+
+
+def _resolve_day(db, day_id):
+    if day_id is not None:
+        owned = db.execute(text("SELECT 1 FROM stock_days WHERE stock_day_id = :id AND agency_id = :agency"),
+                           {"id": day_id, "agency": current_agency_id()}).fetchone()
+        if not owned:
+            raise HTTPException(status_code=404, detail="No such stock day")
+        return day_id
+    s_id = get_day_context(db).stock_day_id
+    if s_id is None:
+        raise HTTPException(status_code=404, detail="No OPEN stock day")
+    return s_id
+
+
+def _day_status(db):
+    ctx = get_day_context(db)
+    return {
+        "open_day": dict(ctx.open_day._mapping) if ctx.open_day else None,
+        "prev_day": dict(ctx.prev_day._mapping) if ctx.prev_day else None,
+        "progress": read_progress(db, ctx.stock_day_id) if ctx.open_day else None,
+    }
+
+
+def _stock_summary(db, day_id):
+    s_id = _resolve_day(db, day_id)
+    totals = load_issue_totals(db, s_id)
+    items = []
+    for row in _rows(load_stock_summary(db, s_id)):
+        iss = totals.get(row["cylinder_type_id"])
+        row["issues"] = dict(iss._mapping) if iss else None
+        items.append(row)
+    return {"stock_day_id": s_id, "items": items}
+
+
+def _delivery_issues(db, day_id):
+    s_id = _resolve_day(db, day_id)
+    return {"stock_day_id": s_id, "items": _rows(load_delivery_issues(db, s_id))}
+
+
+def _cash_balances(db, day_id):
+    # The open day shows working balances; a given day returns what was saved for it
+    if day_id is None:
+        s_id = _resolve_day(db, None)
+        return {"stock_day_id": s_id, "items": _rows(load_cash_balances(db, s_id))}
+    s_id = _resolve_day(db, day_id)
+    return {"stock_day_id": s_id, "items": _rows(load_saved_cash_balances(db, s_id))}
+
+
+def create_api():
+    api = FastAPI(title="Gas Agency read API")
+
+    @api.get("/api/v1/day")
+    async def day_status(agency_id: int = Depends(token_agency)):
+        return await run_db(_day_status, agency_id)
+
+    @api.get("/api/v1/stock-summary")
+    async def stock_summary(day_id: int | None = None, agency_id: int = Depends(token_agency)):
+        return await run_db(_stock_summary, agency_id, day_id)
+
+    @api.get("/api/v1/delivery-issues")
+    async def delivery_issues(day_id: int | None = None, agency_id: int = Depends(token_agency)):
+        return await run_db(_delivery_issues, agency_id, day_id)
+
+    @api.get("/api/v1/cash-balances")
+    async def cash_balances(day_id: int | None = None, agency_id: int = Depends(token_agency)):
+        return await run_db(_cash_balances, agency_id, day_id)
+
+    return api
+
+
+api = create_api()
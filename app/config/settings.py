@@ -1,7 +1,73 @@
 import os
 
-DB_HOST = "localhost"
-DB_PORT = 3306
-DB_NAME = "gas_agency_db"
-DB_USER = "root"
-DB_PASSWORD = "root"
\ No newline at end of file
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+DB_NAME = os.getenv("DB_NAME", "gas_agency_db")
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "root")
+
+# Full SQLAlchemy URL; when set it replaces the MySQL DB_* settings above. sqlite:///gas_agency.db runs
+# the app on a local file in WAL mode (single-PC branch installs); sqlite:// on a private in-memory database
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Seconds a SQLite connection waits on another writer's lock before giving up
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+# Agency used outside web requests: CLI commands without --agency (flask recompute-from --agency 2 ...) and
+# the single-agency API_TOKEN. Single-agency installs keep everything on agency 1. Web requests always work on
+# the signed-in user's agency; signed out, only login/register and the metrics endpoints are served.
+DEFAULT_AGENCY_ID = int(os.getenv("DEFAULT_AGENCY_ID", "1"))
+# Optional per-agency databases as "agency_id=url" pairs separated by ";", e.g.
+# "2=mysql+pymysql://u:p@db2/gas_agency;3=sqlite:///agency3.db". Unlisted agencies share the main database,
+# which always holds the agencies and users tables.
+AGENCY_DATABASE_URLS = os.getenv("AGENCY_DATABASE_URLS", "")
+
+SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
+
+# Engine profile: dev (echo on, small pool), prod or bench. See app/db/session.py
+APP_ENV = os.getenv("APP_ENV", "dev").lower()
+
+# Optional overrides for the profile's pool settings (unset = use the profile value)
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE")
+DB_MAX_OVERFLOW = os.getenv("DB_MAX_OVERFLOW")
+DB_POOL_TIMEOUT = os.getenv("DB_POOL_TIMEOUT")
+DB_POOL_RECYCLE = os.getenv("DB_POOL_RECYCLE")
+DB_STATEMENT_TIMEOUT_MS = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+DB_ECHO = os.getenv("DB_ECHO")
+
+# Seconds a worker may reuse its cached OPEN/CLOSED day lookup
+DAY_CONTEXT_TTL = float(os.getenv("DAY_CONTEXT_TTL", "5"))
+
+# Seconds between master data version checks in each worker
+MASTER_DATA_CHECK_INTERVAL = float(os.getenv("MASTER_DATA_CHECK_INTERVAL", "2"))
+
+# Authenticated user lookups: cache lifetime (seconds) and size per worker.
+# USER_SESSION_EMBED keeps the identity in the signed session so most requests skip the lookup entirely.
+# Approval changes bump user_directory_version; each worker re-reads it every USER_VERSION_CHECK_INTERVAL
+# seconds and drops cached and embedded identities older than the stamp.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_VERSION_CHECK_INTERVAL = float(os.getenv("USER_VERSION_CHECK_INTERVAL", "2"))
+USER_SESSION_EMBED = os.getenv("USER_SESSION_EMBED", "0").lower() in ("1", "true", "yes")
+
+# Password hashing: werkzeug method string (cost parameters included, e.g. "scrypt:32768:8:1" or
+# "pbkdf2:sha256:600000"); stored hashes with other parameters are upgraded on the next successful login.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+# Hashes run on a bounded pool: at most WORKERS at once, QUEUE more waiting, each waiting at most WAIT seconds
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+PASSWORD_HASH_WAIT = float(os.getenv("PASSWORD_HASH_WAIT", "5"))
+
+# ASGI read API (uvicorn app.api:api): threads for blocking DB work - keep within the engine's
+# pool_size + max_overflow - and the bearer tokens it accepts. Each token reads exactly one agency:
+# API_TOKENS is "token=agency_id;token=agency_id", and API_TOKEN is a token for DEFAULT_AGENCY_ID.
+# With neither set the API refuses every call.
+API_DB_THREADS = int(os.getenv("API_DB_THREADS", "8"))
+API_TOKEN = os.getenv("API_TOKEN")
+API_TOKENS = os.getenv("API_TOKENS", "")
+
+# SQL instrumentation: statements slower than this (ms) are logged to the "app.sql.slow" logger; 0 disables
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+# Bearer token for /metrics, /metrics/slowest and /pool-stats (set it in the Prometheus scrape config).
+# Unset keeps those endpoints closed.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
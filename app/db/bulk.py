@@ -0,0 +1,32 @@
+from sqlalchemy import text
+from app.db.dialect import on_conflict_update
+
+# Rows per multi-row statement; keeps packets well under max_allowed_packet
+DEFAULT_CHUNK_SIZE = 500
+
+
+def chunked(rows, size=DEFAULT_CHUNK_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def bulk_upsert(db, table, columns, rows, update_columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Multi-row INSERT with the dialect's upsert clause, one statement per chunk.
+
+    rows is a list of dicts keyed by column name. Returns the number of rows sent.
+    """
+    rows = list(rows)
+    col_sql = ", ".join(columns)
+    upsert_sql = on_conflict_update(db, table, update_columns)
+
+    for chunk in chunked(rows, chunk_size):
+        params = {}
+        values = []
+        for i, row in enumerate(chunk):
+            values.append("(" + ", ".join(f":{c}_{i}" for c in columns) + ")")
+            params.update({f"{c}_{i}": row[c] for c in columns})
+        db.execute(text(
+            f"INSERT INTO {table} ({col_sql}) VALUES {', '.join(values)} {upsert_sql}"
+        ), params)
+    return len(rows)
+
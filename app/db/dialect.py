@@ -0,0 +1,57 @@
+"""The few statements that differ between MySQL and SQLite.
+
+MySQL upserts with ON DUPLICATE KEY UPDATE and reads the incoming row as VALUES(col); SQLite names the
+conflict target and reads it as excluded.col. Helpers take anything with a dialect: an Engine,
+Connection or Session.
+"""
+
+# Conflict target (the primary key) of every table the app upserts into
+CONFLICT_KEYS = {
+    "daily_stock_summary": ("stock_day_id", "cylinder_type_id"),
+    "delivery_issues": ("stock_day_id", "delivery_boy_id", "cylinder_type_id"),
+    "delivery_vehicle_empty_stock": ("stock_day_id", "delivery_boy_id", "cylinder_type_id"),
+    "delivery_expected_amount": ("stock_day_id", "delivery_boy_id"),
+    "delivery_cash_deposit": ("stock_day_id", "delivery_boy_id"),
+    "delivery_cash_balance": ("stock_day_id", "delivery_boy_id"),
+    "day_workflow_state": ("stock_day_id",),
+    "delivery_vehicle_balance": ("delivery_boy_id", "cylinder_type_id"),
+    "delivery_cash_carry_forward": ("delivery_boy_id",),
+    "monthly_stock_rollup": ("month_start", "cylinder_type_id"),
+    "monthly_cash_rollup": ("month_start", "delivery_boy_id"),
+    "price_nc_revisions": ("cylinder_type_id", "effective_from"),
+}
+
+
+def dialect_name(bind):
+    dialect = getattr(bind, "dialect", None)
+    if dialect is None:
+        dialect = bind.get_bind().dialect
+    return dialect.name
+
+
+def is_sqlite(bind):
+    return dialect_name(bind) == "sqlite"
+
+
+def inserted(bind, column):
+    """The incoming value of `column` inside an upsert's update clause."""
+    return f"excluded.{column}" if is_sqlite(bind) else f"VALUES({column})"
+
+
+def on_conflict_update(bind, table, assignments):
+    """Trailing clause that turns an INSERT into `table` into an upsert.
+
+    assignments maps column -> SQL expression (use inserted() for the incoming value); a plain list of
+    columns overwrites those columns with the incoming row.
+    """
+    if not isinstance(assignments, dict):
+        assignments = {c: inserted(bind, c) for c in assignments}
+    sets = ", ".join(f"{c} = {expr}" for c, expr in assignments.items())
+    if is_sqlite(bind):
+        return f"ON CONFLICT ({', '.join(CONFLICT_KEYS[table])}) DO UPDATE SET {sets}"
+    return f"ON DUPLICATE KEY UPDATE {sets}"
+
+
+def constant_source(bind):
+    """FROM clause for an INSERT ... SELECT of expressions only; MySQL wants FROM DUAL before its upsert clause."""
+    return "" if is_sqlite(bind) else "FROM DUAL"
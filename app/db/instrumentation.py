@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from app.config.settings import SLOW_QUERY_MS
+
+slow_log = logging.getLogger("app.sql.slow")
+
+# Statement text kept for the slowest-statement record and slow log lines
+STATEMENT_PREVIEW = 300
+
+
+class RequestStats:
+    """SQL figures for one request, kept on flask.g."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = None
+        self.slow_queries = 0
+        self.streamed = False
+
+
+class RouteStats:
+    """Cumulative per-route counters for this process, exported by /metrics."""
+
+    FIELDS = ("requests", "errors", "request_seconds", "queries", "db_seconds", "pool_wait_seconds", "slow_queries")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, method, stats, failed):
+        with self._lock:
+            row = self._routes.setdefault((route, method), dict.fromkeys(self.FIELDS, 0) | {
+                "slowest_seconds": 0.0, "slowest_sql": None})
+            row["requests"] += 1
+            row["errors"] += int(failed)
+            row["request_seconds"] += time.perf_counter() - stats.started
+            row["queries"] += stats.queries
+            row["db_seconds"] += stats.db_seconds
+            row["pool_wait_seconds"] += stats.pool_wait
+            row["slow_queries"] += stats.slow_queries
+            if stats.slowest > row["slowest_seconds"]:
+                row["slowest_seconds"] = stats.slowest
+                row["slowest_sql"] = stats.slowest_sql
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(row) for key, row in self._routes.items()}
+
+
+route_stats = RouteStats()
+
+
+def _current():
+    return g.get("sql_stats") if has_request_context() else None
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, not the connection, so a statement that raises leaves nothing behind
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is not None:
+        _record_statement(statement, time.perf_counter() - started)
+
+
+def _on_error(exception_context):
+    started = getattr(exception_context.execution_context, "_query_started", None)
+    if started is not None and exception_context.statement:
+        _record_statement(exception_context.statement, time.perf_counter() - started, failed=True)
+
+
+def _record_statement(statement, elapsed, failed=False):
+    stats = _current()
+    slow = SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS
+    if slow:
+        route = request.endpoint if has_request_context() else "-"
+        slow_log.warning("%.1f ms [%s]%s %s", elapsed * 1000, route, " failed" if failed else "",
+                         " ".join(statement.split())[:STATEMENT_PREVIEW])
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += elapsed
+    stats.slow_queries += int(bool(slow))
+    if elapsed > stats.slowest:
+        stats.slowest = elapsed
+        stats.slowest_sql = " ".join(statement.split())[:STATEMENT_PREVIEW]
+
+
+def record_pool_wait(seconds):
+    """Called by the pool on every checkout; charged to the current request, if any."""
+    stats = _current()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _on_error)
+
+
+def init_app(app):
+    """Collect per-request SQL stats, report them in a Server-Timing header and fold them into route_stats."""
+
+    @app.before_request
+    def _start_sql_stats():
+        g.sql_stats = RequestStats()
+
+    @app.after_request
+    def _server_timing(response):
+        stats = _current()
+        if stats is not None:
+            # For a streamed body this covers the view only; its statements run after the headers are sent
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                f'pool;dur={stats.pool_wait * 1000:.1f}')
+            if response.is_streamed and request.endpoint:
+                # Teardown runs before the body is iterated, so a streamed request is recorded once it is closed
+                stats.streamed = True
+                endpoint, method = request.endpoint, request.method
+                response.call_on_close(lambda: route_stats.record(endpoint, method, stats, False))
+        return response
+
+    @app.teardown_request
+    def _record_sql_stats(exc):
+        stats = g.get("sql_stats")
+        if stats is None or stats.streamed:
+            # Left on g: stream_with_context pushes this context again while the body runs
+            return
+        g.pop("sql_stats")
+        if request.endpoint:
+            route_stats.record(request.endpoint, request.method, stats, exc is not None)
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                          for k, v in labels.items()) + "}"
+
+
+def render_prometheus(pool_stats):
+    """Route and pool figures in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+    routes = route_stats.snapshot()
+    per_route = lambda field: [({"route": r, "method": m}, row[field]) for (r, m), row in sorted(routes.items())]
+    metric("app_requests_total", "counter", "Requests handled.", per_route("requests"))
+    metric("app_request_errors_total", "counter", "Requests that raised.", per_route("errors"))
+    metric("app_request_seconds_total", "counter", "Wall time spent in requests.", per_route("request_seconds"))
+    metric("app_db_queries_total", "counter", "SQL statements executed.", per_route("queries"))
+    metric("app_db_seconds_total", "counter", "Time spent executing SQL.", per_route("db_seconds"))
+    metric("app_db_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection.",
+           per_route("pool_wait_seconds"))
+    metric("app_db_slow_queries_total", "counter", f"Statements slower than {SLOW_QUERY_MS:g} ms.",
+           per_route("slow_queries"))
+    metric("app_db_slowest_statement_seconds", "gauge", "Slowest single statement seen per route.",
+           per_route("slowest_seconds"))
+
+    # One series per engine: the main database and each routed agency database
+    engines = pool_stats["engines"]
+    per_engine = lambda field, scale=1: [({"engine": e["engine"]}, e[field] * scale) for e in engines]
+    metric("app_db_pool_connections", "gauge", "Pool connections by state.", [
+        ({"engine": e["engine"], "state": state}, e[state])
+        for e in engines for state in ("checked_out", "checked_in", "overflow")
+    ])
+    metric("app_db_pool_size", "gauge", "Configured pool size.", per_engine("pool_size"))
+    metric("app_db_pool_checkouts_total", "counter", "Connection checkouts.", per_engine("checkouts"))
+    metric("app_db_pool_timeouts_total", "counter", "Checkouts that timed out.", per_engine("timeouts"))
+    metric("app_db_pool_wait_seconds_max", "gauge", "Longest checkout wait.", per_engine("wait_max_ms", 1 / 1000))
+    return "\n".join(lines) + "\n"
+
+
+def slowest_statements():
+    """Slowest statement recorded per route, slowest first (for the JSON view)."""
+    rows = [{"route": r, "method": m, "seconds": round(row["slowest_seconds"], 6), "sql": row["slowest_sql"]}
+            for (r, m), row in route_stats.snapshot().items() if row["slowest_sql"]]
+    return sorted(rows, key=lambda x: -x["seconds"])
@@ -0,0 +1,133 @@
+import importlib
+import pkgutil
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, func, inspect, select, text
+
+# Applied versions are recorded here; each vNNN_*.py module in this package is one migration
+# exposing DESCRIPTION and upgrade(conn).
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(255)),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+
+def ensure_index(conn, index):
+    """Create an index unless the table already has one (or a key) over the same columns."""
+    insp = inspect(conn)
+    table = index.table.name
+    wanted = tuple(c.name for c in index.columns)
+    existing = {tuple(ix["column_names"]) for ix in insp.get_indexes(table)}
+    existing |= {tuple(uc["column_names"]) for uc in insp.get_unique_constraints(table)}
+    existing.add(tuple(insp.get_pk_constraint(table)["constrained_columns"]))
+    if wanted not in existing:
+        index.create(conn)
+
+
+def drop_unique(conn, table, columns):
+    """Drop every unique index over exactly these columns, whatever it was named when the table was made."""
+    insp = inspect(conn)
+    columns = tuple(columns)
+    names = {ix["name"] for ix in insp.get_indexes(table)
+             if ix.get("unique") and tuple(ix["column_names"]) == columns}
+    names |= {uc["name"] for uc in insp.get_unique_constraints(table) if tuple(uc["column_names"]) == columns}
+    for name in filter(None, names):
+        conn.execute(text(f"DROP INDEX {name}" if conn.dialect.name == "sqlite" else f"DROP INDEX {name} ON {table}"))
+
+
+def add_column(conn, table, column):
+    """ALTER TABLE ... ADD COLUMN for a Core Column, skipped when the column already exists."""
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def load_migrations():
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if info.name.startswith("v") and info.name[1:4].isdigit():
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            migrations.append((int(info.name[1:4]), info.name, module))
+    return sorted(migrations)
+
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def upgrade(engine, target=None):
+    """Apply pending migrations in order, each in its own transaction. Returns the versions applied."""
+    applied = []
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+        conn.commit()
+        for version, name, module in load_migrations():
+            if version in done or (target is not None and version > target):
+                continue
+            module.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(version=version, description=module.DESCRIPTION))
+            conn.commit()
+            applied.append((version, name))
+    return applied
+
+
+@click.group("schema")
+def schema_cli():
+    """Versioned schema migrations."""
+
+
+@schema_cli.command("upgrade")
+@click.option("--to", "target", type=int, default=None, help="Stop after this version.")
+@with_appcontext
+def upgrade_command(target):
+    """Apply pending migrations (to every agency database when some are routed elsewhere)."""
+    from app.db.session import all_engines
+    for engine in all_engines():
+        applied = upgrade(engine, target)
+        for version, name in applied:
+            click.echo(f"Applied {name} to {engine.url.render_as_string(hide_password=True)}")
+        if not applied:
+            click.echo(f"{engine.url.render_as_string(hide_password=True)}: schema is up to date.")
+
+
+@schema_cli.command("status")
+@with_appcontext
+def status_command():
+    """List migrations and whether they are applied."""
+    from app.db.session import all_engines
+    for engine in all_engines():
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+            conn.commit()
+        click.echo(engine.url.render_as_string(hide_password=True))
+        for version, name, module in load_migrations():
+            mark = "x" if version in done else " "
+            click.echo(f"[{mark}] {name} - {module.DESCRIPTION}")
+
+
+@schema_cli.command("check")
+@with_appcontext
+def check_command():
+    """EXPLAIN each hot statement and flag full scans of day-scoped tables."""
+    from app.db.session import all_engines
+    from app.db.migrations.check import explain_hot_queries
+    problems = 0
+    for engine in all_engines():
+        with engine.connect() as conn:
+            findings = explain_hot_queries(conn)
+        click.echo(engine.url.render_as_string(hide_password=True))
+        for name, table, access, key, rows, flagged in findings:
+            mark = "SCAN" if flagged else "ok"
+            problems += flagged
+            click.echo(f"{mark:>4}  {name:<42} {table or '-':<32} {access or '-':<8} {key or '-':<34} {rows}")
+    if problems:
+        raise click.ClickException(f"{problems} full table scan(s) on day-scoped tables")
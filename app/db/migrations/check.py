@@ -0,0 +1,80 @@
+import re
+from sqlalchemy import text
+from app.config.settings import DEFAULT_AGENCY_ID
+from app.db.dialect import is_sqlite
+
+# Tables that grow with every stock day; a full scan of these on a hot path is a missing index.
+# Master tables (delivery_boys, cylinder_types, prices) and one-row-per-pair state tables are small by design.
+DAY_SCOPED_TABLES = {
+    "stock_days", "daily_stock_summary", "delivery_issues", "delivery_vehicle_empty_stock",
+    "delivery_expected_amount", "delivery_cash_deposit", "delivery_cash_balance", "day_workflow_state", "users",
+}
+
+def _hot_queries():
+    """(name, statement) pairs for the reads every page runs, taken from the services that run them."""
+    from app.services import day_context, day_views, pricing, user_cache, vehicle_stock
+    from app.services.exports import cash_report_sql, stock_report_sql
+
+    queries = [(f"{module.__name__.rsplit('.', 1)[-1]}.{name}", str(getattr(module, name)))
+               for module, names in (
+                   (day_context, ("OPEN_DAY_SQL", "PREV_DAY_SQL", "DAY_FLAGS_SQL")),
+                   (day_views, ("LATEST_DAY_SQL", "OPENING_SUMMARY_SQL", "IOCL_MOVEMENTS_SQL", "STOCK_SUMMARY_SQL",
+                                "ISSUE_TOTALS_SQL", "DELIVERY_ISSUES_SQL", "CASH_DEPOSITS_SQL", "CASH_BALANCES_SQL",
+                                "SAVED_CASH_BALANCES_SQL")),
+                   (vehicle_stock, ("EXPECTED_EMPTIES_SQL", "PREV_VEHICLE_EMPTIES_SQL", "CURRENT_BALANCES_SQL",
+                                    "BALANCES_AS_OF_SQL", "RECONCILE_GRID_SQL")),
+                   (pricing, ("SAVED_EXPECTED_SQL",)),
+                   (user_cache, ("USER_BY_ID_SQL", "USER_BY_NAME_SQL")),
+               )
+               for name in names]
+    queries.append(("pricing.ISSUES_SQL", pricing.ISSUES_SQL.format(where=pricing.DAY_ISSUES_WHERE)))
+    for by_range in (False, True):
+        suffix = "range" if by_range else "day"
+        queries.append((f"exports.stock_report_sql({suffix})", stock_report_sql(by_range)))
+        queries.append((f"exports.cash_report_sql({suffix})", cash_report_sql(by_range)))
+    return queries
+
+
+# SQLite plan lines: "SCAN sd", "SEARCH dss USING COVERING INDEX ix_name (stock_day_id=?)"
+_SQLITE_PLAN = re.compile(r"^(SCAN|SEARCH) (\w+)(?: USING (?:COVERING )?(?:INDEX (\w+)|(INTEGER PRIMARY KEY)))?")
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|LEFT\b|JOIN\b|GROUP\b|ORDER\b)(\w+))?",
+                          re.IGNORECASE)
+
+
+def _explain_mysql(conn, sql, params):
+    for row in conn.execute(text("EXPLAIN " + sql), params).mappings():
+        access = row.get("type")
+        yield row.get("table"), access, row.get("key"), row.get("rows"), access == "ALL"
+
+
+def _explain_sqlite(conn, sql, params):
+    aliases = {}
+    for table, alias in _TABLE_ALIAS.findall(sql):
+        aliases[alias or table] = table
+    for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params):
+        m = _SQLITE_PLAN.match(row.detail)
+        if m:
+            access, name, index, rowid = m.groups()
+            key = index or rowid
+            # No row estimates in SQLite plans; a SCAN without an index reads the whole table
+            yield aliases.get(name, name), access, key, None, access == "SCAN" and key is None
+
+
+def explain_hot_queries(conn):
+    """Run EXPLAIN (EXPLAIN QUERY PLAN on SQLite) on each hot statement.
+
+    Returns (query, table, access type, key, estimated rows, flagged) per plan row; flagged means a
+    full table scan (MySQL type ALL, SQLite SCAN without an index) of a day-scoped table.
+    """
+    day = conn.execute(text("SELECT MAX(stock_day_id) FROM stock_days")).scalar() or 0
+    prev = max(day - 1, 0)
+    # One value per bind name used by the statements; names a statement does not use are ignored
+    params = {"s_id": day, "id": day, "o": day, "d": day, "open_id": day, "p": prev, "prev_id": prev,
+              "agency": DEFAULT_AGENCY_ID, "start": "2000-01-01", "end": "2100-01-01", "u": "admin"}
+    explain = _explain_sqlite if is_sqlite(conn) else _explain_mysql
+
+    findings = []
+    for name, sql in _hot_queries():
+        for table, access, key, rows, full_scan in explain(conn, sql, params):
+            findings.append((name, table, access, key, rows, full_scan and table in DAY_SCOPED_TABLES))
+    return findings
@@ -0,0 +1,145 @@
+from sqlalchemy import (
+    MetaData, Table, Column, Index, Integer, SmallInteger, String, Date, DateTime, Numeric, func,
+)
+from app.db.migrations import ensure_index
+
+DESCRIPTION = "Tables used by the blueprints, with indexes for the hot queries in app/routes"
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("user_id", Integer, primary_key=True, autoincrement=True),
+    Column("username", String(50), nullable=False),
+    Column("password_hash", String(255), nullable=False),
+    Column("full_name", String(100)),
+    Column("is_approved", SmallInteger, nullable=False, server_default="0"),
+    Column("created_at", DateTime, server_default=func.now()),
+    # auth.login / auth.register look users up by name
+    Index("ux_users_username", "username", unique=True),
+)
+
+Table(
+    "stock_days", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=True),
+    Column("stock_date", Date, nullable=False),
+    Column("status", String(10), nullable=False, server_default="OPEN"),
+    Column("delivery_no_movement", SmallInteger, nullable=False, server_default="0"),
+    Index("ux_stock_days_stock_date", "stock_date", unique=True),
+    # WHERE status = 'OPEN'/'CLOSED' ORDER BY stock_date DESC (day context, history, reports)
+    Index("ix_stock_days_status_date", "status", "stock_date"),
+)
+
+Table(
+    "delivery_boys", metadata,
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String(100), nullable=False),
+    Column("mobile", String(15), nullable=False),
+    Column("is_active", SmallInteger, nullable=False, server_default="1"),
+    # WHERE is_active = 1 ORDER BY name (delivery grid, cash reconciliation)
+    Index("ix_delivery_boys_active_name", "is_active", "name"),
+    Index("ix_delivery_boys_mobile", "mobile"),
+)
+
+Table(
+    "cylinder_types", metadata,
+    Column("cylinder_type_id", Integer, primary_key=True, autoincrement=True),
+    Column("code", String(20), nullable=False),
+    Column("category", String(30)),
+    Index("ux_cylinder_types_code", "code", unique=True),
+    Index("ix_cylinder_types_category_code", "category", "code"),
+)
+
+Table(
+    "price_nc_components", metadata,
+    Column("price_id", Integer, primary_key=True, autoincrement=True),
+    Column("cylinder_type_id", Integer, nullable=False),
+    Column("deposit_amount", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("refill_amount", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("document_charge", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("installation_charge", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("regulator_charge", Numeric(10, 2)),
+    Index("ux_price_nc_components_type", "cylinder_type_id", unique=True),
+)
+
+Table(
+    "daily_stock_summary", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=False),
+    Column("cylinder_type_id", Integer, primary_key=True, autoincrement=False),
+    Column("opening_filled", Integer),
+    Column("opening_empty", Integer),
+    Column("defective_empty_vehicle", Integer, nullable=False, server_default="0"),
+    Column("item_receipt", Integer, nullable=False, server_default="0"),
+    Column("item_return", Integer, nullable=False, server_default="0"),
+    Column("iocl_no_movement", SmallInteger, nullable=False, server_default="0"),
+    Column("sales_regular", Integer, nullable=False, server_default="0"),
+    Column("nc_qty", Integer, nullable=False, server_default="0"),
+    Column("dbc_qty", Integer, nullable=False, server_default="0"),
+    Column("tv_out_qty", Integer, nullable=False, server_default="0"),
+    Column("closing_filled", Integer),
+    Column("closing_empty", Integer),
+    Column("total_stock", Integer),
+    Column("is_reconciled", SmallInteger, nullable=False, server_default="0"),
+    # PK (stock_day_id, cylinder_type_id) serves every per-day lookup and the upserts
+)
+
+Table(
+    "delivery_issues", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=False),
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("cylinder_type_id", Integer, primary_key=True, autoincrement=False),
+    Column("regular_qty", Integer, nullable=False, server_default="0"),
+    Column("nc_qty", Integer, nullable=False, server_default="0"),
+    Column("dbc_qty", Integer, nullable=False, server_default="0"),
+    Column("tv_out_qty", Integer, nullable=False, server_default="0"),
+    Column("delivery_source", String(20), nullable=False, server_default="DELIVERY_BOY"),
+    # GROUP BY cylinder_type_id for one day (closing stock, tv_out totals)
+    Index("ix_delivery_issues_day_type", "stock_day_id", "cylinder_type_id"),
+)
+
+Table(
+    "delivery_vehicle_empty_stock", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=False),
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("cylinder_type_id", Integer, primary_key=True, autoincrement=False),
+    Column("empty_qty", Integer, nullable=False, server_default="0"),
+    # Latest / point-in-time balance per (boy, type)
+    Index("ix_vehicle_empty_pair_day", "delivery_boy_id", "cylinder_type_id", "stock_day_id"),
+)
+
+Table(
+    "delivery_expected_amount", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=False),
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("expected_amount", Numeric(12, 2), nullable=False, server_default="0"),
+)
+
+Table(
+    "delivery_cash_deposit", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=False),
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("cash_amount", Numeric(12, 2), nullable=False, server_default="0"),
+    Column("upi_amount", Numeric(12, 2), nullable=False, server_default="0"),
+    Column("total_deposited", Numeric(12, 2), nullable=False, server_default="0"),
+)
+
+Table(
+    "delivery_cash_balance", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=False),
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("opening_balance", Numeric(12, 2), nullable=False, server_default="0"),
+    Column("today_expected", Numeric(12, 2), nullable=False, server_default="0"),
+    Column("today_deposited", Numeric(12, 2), nullable=False, server_default="0"),
+    Column("closing_balance", Numeric(12, 2), nullable=False, server_default="0"),
+    Column("balance_status", String(10), nullable=False, server_default="PENDING"),
+    # Per-boy cash history (carry-forward rebuild)
+    Index("ix_cash_balance_boy_day", "delivery_boy_id", "stock_day_id"),
+)
+
+
+def upgrade(conn):
+    # Databases set up by hand already have most tables: create what is missing, then add any missing index
+    metadata.create_all(conn, checkfirst=True)
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            ensure_index(conn, index)
@@ -0,0 +1,98 @@
+from sqlalchemy import MetaData, Table, Column, Integer, SmallInteger, Numeric, DateTime, func, text
+
+DESCRIPTION = "Maintained state tables (dashboard workflow, vehicle balances, cash carry-forward) and backfill"
+
+metadata = MetaData()
+
+Table(
+    "day_workflow_state", metadata,
+    Column("stock_day_id", Integer, primary_key=True, autoincrement=False),
+    Column("opening_stock", SmallInteger, nullable=False, server_default="0"),
+    Column("iocl_movements", SmallInteger, nullable=False, server_default="0"),
+    Column("deliveries", SmallInteger, nullable=False, server_default="0"),
+    Column("finalized_stock", SmallInteger, nullable=False, server_default="0"),
+    Column("expected_cash", SmallInteger, nullable=False, server_default="0"),
+    Column("cash_collection", SmallInteger, nullable=False, server_default="0"),
+    Column("reconciled_cash", SmallInteger, nullable=False, server_default="0"),
+    Column("updated_at", DateTime, server_default=func.now()),
+)
+
+Table(
+    "delivery_vehicle_balance", metadata,
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("cylinder_type_id", Integer, primary_key=True, autoincrement=False),
+    Column("stock_day_id", Integer, nullable=False),
+    Column("empty_qty", Integer, nullable=False, server_default="0"),
+    Column("prev_empty_qty", Integer, nullable=False, server_default="0"),
+)
+
+Table(
+    "delivery_cash_carry_forward", metadata,
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("opening_balance", Numeric(12, 2), nullable=False, server_default="0"),
+    Column("stock_day_id", Integer, nullable=False),
+)
+
+
+# Backfill SQL is frozen here as of this version; the services that maintain these tables may change later.
+WORKFLOW_BACKFILL = """
+    INSERT INTO day_workflow_state (stock_day_id, opening_stock, iocl_movements, deliveries, finalized_stock,
+                                    expected_cash, cash_collection, reconciled_cash)
+    SELECT sd.stock_day_id,
+        EXISTS (SELECT 1 FROM daily_stock_summary
+                WHERE stock_day_id = sd.stock_day_id AND opening_filled IS NOT NULL),
+        COALESCE((SELECT (COALESCE(SUM(item_receipt + item_return), 0) > 0)
+                         OR (COALESCE(MAX(iocl_no_movement), 0) = 1)
+                  FROM daily_stock_summary WHERE stock_day_id = sd.stock_day_id), 0),
+        (EXISTS (SELECT 1 FROM delivery_issues WHERE stock_day_id = sd.stock_day_id)
+         OR COALESCE(sd.delivery_no_movement, 0) = 1),
+        COALESCE((SELECT MAX(is_reconciled) FROM daily_stock_summary
+                  WHERE stock_day_id = sd.stock_day_id), 0) = 1,
+        EXISTS (SELECT 1 FROM delivery_expected_amount WHERE stock_day_id = sd.stock_day_id),
+        EXISTS (SELECT 1 FROM delivery_cash_deposit WHERE stock_day_id = sd.stock_day_id),
+        EXISTS (SELECT 1 FROM delivery_cash_balance WHERE stock_day_id = sd.stock_day_id)
+    FROM stock_days sd
+"""
+
+VEHICLE_BALANCE_BACKFILL = """
+    INSERT INTO delivery_vehicle_balance (delivery_boy_id, cylinder_type_id, stock_day_id, empty_qty, prev_empty_qty)
+    SELECT v.delivery_boy_id, v.cylinder_type_id, v.stock_day_id, COALESCE(v.empty_qty, 0),
+           COALESCE((
+               SELECT p.empty_qty FROM delivery_vehicle_empty_stock p
+               WHERE p.delivery_boy_id = v.delivery_boy_id AND p.cylinder_type_id = v.cylinder_type_id
+                 AND p.stock_day_id < v.stock_day_id
+               ORDER BY p.stock_day_id DESC LIMIT 1
+           ), 0)
+    FROM delivery_vehicle_empty_stock v
+    JOIN (
+        SELECT delivery_boy_id, cylinder_type_id, MAX(stock_day_id) AS last_day_id
+        FROM delivery_vehicle_empty_stock
+        GROUP BY delivery_boy_id, cylinder_type_id
+    ) l ON l.delivery_boy_id = v.delivery_boy_id
+       AND l.cylinder_type_id = v.cylinder_type_id
+       AND l.last_day_id = v.stock_day_id
+"""
+
+CARRY_FORWARD_BACKFILL = """
+    INSERT INTO delivery_cash_carry_forward (delivery_boy_id, opening_balance, stock_day_id)
+    SELECT dcb.delivery_boy_id, COALESCE(dcb.closing_balance, 0), dcb.stock_day_id
+    FROM delivery_cash_balance dcb
+    JOIN stock_days sd ON sd.stock_day_id = dcb.stock_day_id
+    JOIN (
+        SELECT dcb2.delivery_boy_id, MAX(sd2.stock_date) AS last_date
+        FROM delivery_cash_balance dcb2
+        JOIN stock_days sd2 ON sd2.stock_day_id = dcb2.stock_day_id
+        WHERE sd2.status = 'CLOSED'
+        GROUP BY dcb2.delivery_boy_id
+    ) l ON l.delivery_boy_id = dcb.delivery_boy_id AND l.last_date = sd.stock_date
+    WHERE sd.status = 'CLOSED'
+"""
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+    for table, backfill in (("day_workflow_state", WORKFLOW_BACKFILL),
+                            ("delivery_vehicle_balance", VEHICLE_BALANCE_BACKFILL),
+                            ("delivery_cash_carry_forward", CARRY_FORWARD_BACKFILL)):
+        conn.execute(text(f"DELETE FROM {table}"))
+        conn.execute(text(backfill))
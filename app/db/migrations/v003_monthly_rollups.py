@@ -0,0 +1,88 @@
+from datetime import date
+from sqlalchemy import MetaData, Table, Column, Integer, Date, Numeric, text
+
+DESCRIPTION = "Monthly stock and cash rollups folded in at day close, backfilled from history"
+
+metadata = MetaData()
+
+Table(
+    "monthly_stock_rollup", metadata,
+    Column("month_start", Date, primary_key=True),
+    Column("cylinder_type_id", Integer, primary_key=True, autoincrement=False),
+    Column("sales_regular", Integer, nullable=False, server_default="0"),
+    Column("nc_qty", Integer, nullable=False, server_default="0"),
+    Column("dbc_qty", Integer, nullable=False, server_default="0"),
+    Column("tv_out_qty", Integer, nullable=False, server_default="0"),
+    Column("item_receipt", Integer, nullable=False, server_default="0"),
+    Column("item_return", Integer, nullable=False, server_default="0"),
+    Column("days", Integer, nullable=False, server_default="0"),
+)
+
+Table(
+    "monthly_cash_rollup", metadata,
+    Column("month_start", Date, primary_key=True),
+    Column("delivery_boy_id", Integer, primary_key=True, autoincrement=False),
+    Column("expected", Numeric(14, 2), nullable=False, server_default="0"),
+    Column("deposited", Numeric(14, 2), nullable=False, server_default="0"),
+    # Closing balance on the last closed day of the month
+    Column("outstanding", Numeric(14, 2), nullable=False, server_default="0"),
+    Column("days", Integer, nullable=False, server_default="0"),
+)
+
+
+# Backfill SQL is frozen here as of this version; app.services.rollups maintains the tables afterwards.
+STOCK_MONTH_SQL = """
+    INSERT INTO monthly_stock_rollup
+        (month_start, cylinder_type_id, sales_regular, nc_qty, dbc_qty, tv_out_qty, item_receipt, item_return, days)
+    SELECT :m, s.cylinder_type_id, SUM(COALESCE(s.sales_regular, 0)), SUM(COALESCE(s.nc_qty, 0)),
+           SUM(COALESCE(s.dbc_qty, 0)), SUM(COALESCE(s.tv_out_qty, 0)), SUM(COALESCE(s.item_receipt, 0)),
+           SUM(COALESCE(s.item_return, 0)), COUNT(*)
+    FROM daily_stock_summary s
+    JOIN stock_days sd ON sd.stock_day_id = s.stock_day_id
+    WHERE sd.status = 'CLOSED' AND sd.stock_date >= :m AND sd.stock_date < :end
+    GROUP BY s.cylinder_type_id
+"""
+
+CASH_MONTH_SQL = """
+    INSERT INTO monthly_cash_rollup (month_start, delivery_boy_id, expected, deposited, outstanding, days)
+    SELECT :m, c.delivery_boy_id, SUM(COALESCE(c.today_expected, 0)), SUM(COALESCE(c.today_deposited, 0)),
+           COALESCE((
+               SELECT c2.closing_balance FROM delivery_cash_balance c2
+               JOIN stock_days sd2 ON sd2.stock_day_id = c2.stock_day_id
+               WHERE c2.delivery_boy_id = c.delivery_boy_id AND sd2.status = 'CLOSED'
+                 AND sd2.stock_date >= :m AND sd2.stock_date < :end
+               ORDER BY sd2.stock_date DESC LIMIT 1
+           ), 0),
+           COUNT(*)
+    FROM delivery_cash_balance c
+    JOIN stock_days sd ON sd.stock_day_id = c.stock_day_id
+    WHERE sd.status = 'CLOSED' AND sd.stock_date >= :m AND sd.stock_date < :end
+    GROUP BY c.delivery_boy_id
+"""
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _next_month(m):
+    return date(m.year + (m.month == 12), m.month % 12 + 1, 1)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+    bounds = conn.execute(text(
+        "SELECT MIN(stock_date) AS first_date, MAX(stock_date) AS last_date FROM stock_days WHERE status = 'CLOSED'"
+    )).fetchone()
+    if not bounds or bounds.first_date is None:
+        return
+
+    conn.execute(text("DELETE FROM monthly_stock_rollup"))
+    conn.execute(text("DELETE FROM monthly_cash_rollup"))
+    m = _as_date(bounds.first_date).replace(day=1)
+    last = _as_date(bounds.last_date).replace(day=1)
+    while m <= last:
+        params = {"m": m, "end": _next_month(m)}
+        conn.execute(text(STOCK_MONTH_SQL), params)
+        conn.execute(text(CASH_MONTH_SQL), params)
+        m = _next_month(m)
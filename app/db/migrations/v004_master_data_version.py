@@ -0,0 +1,17 @@
+from sqlalchemy import MetaData, Table, Column, Integer, text
+
+DESCRIPTION = "Version stamp for the in-process master data cache"
+
+metadata = MetaData()
+
+Table(
+    "master_data_version", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("version", Integer, nullable=False, server_default="1"),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+    if conn.execute(text("SELECT COUNT(*) FROM master_data_version")).scalar() == 0:
+        conn.execute(text("INSERT INTO master_data_version (id, version) VALUES (1, 1)"))
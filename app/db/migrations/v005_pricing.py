@@ -0,0 +1,33 @@
+from sqlalchemy import MetaData, Table, Column, Index, Integer, Date, Numeric
+from app.db.migrations import add_column
+
+DESCRIPTION = "Effective-dated price revisions and stored expected-cash breakdown"
+
+metadata = MetaData()
+
+Table(
+    "price_nc_revisions", metadata,
+    Column("revision_id", Integer, primary_key=True, autoincrement=True),
+    Column("cylinder_type_id", Integer, nullable=False),
+    Column("effective_from", Date, nullable=False),
+    Column("deposit_amount", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("refill_amount", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("document_charge", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("installation_charge", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("regulator_charge", Numeric(10, 2)),
+    Index("ux_price_nc_revisions_type_date", "cylinder_type_id", "effective_from", unique=True),
+)
+
+# Breakdown shown on the settlement page, so saved days are never recomputed
+BREAKDOWN_COLUMNS = [
+    Column("regular_amt", Numeric(12, 2)),
+    Column("nc_amt", Numeric(12, 2)),
+    Column("dbc_amt", Numeric(12, 2)),
+    Column("tv_refund", Numeric(12, 2)),
+]
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+    for column in BREAKDOWN_COLUMNS:
+        add_column(conn, "delivery_expected_amount", column)
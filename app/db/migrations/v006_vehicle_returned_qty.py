@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, text
+from app.db.migrations import add_column
+
+DESCRIPTION = "Store the empties actually returned per vehicle row, so later corrections can be replayed"
+
+RETURNED_QTY = Column("returned_qty", Integer)
+
+
+def backfill_returned_qty(conn):
+    """returned = previous vehicle balance + yesterday's regular issues - recorded balance, per pair and day."""
+    days = [r.stock_day_id for r in conn.execute(text("SELECT stock_day_id FROM stock_days ORDER BY stock_date"))]
+    prev_day = dict(zip(days[1:], days))
+    expected = {(r.stock_day_id, r.delivery_boy_id, r.cylinder_type_id): int(r.regular_qty or 0)
+                for r in conn.execute(text(
+                    "SELECT stock_day_id, delivery_boy_id, cylinder_type_id, regular_qty FROM delivery_issues"))}
+
+    latest = {}
+    rows = []
+    for r in conn.execute(text("""
+        SELECT v.stock_day_id, v.delivery_boy_id, v.cylinder_type_id, COALESCE(v.empty_qty, 0) AS empty_qty
+        FROM delivery_vehicle_empty_stock v
+        JOIN stock_days sd ON sd.stock_day_id = v.stock_day_id
+        ORDER BY sd.stock_date
+    """)):
+        pair = (r.delivery_boy_id, r.cylinder_type_id)
+        exp = expected.get((prev_day.get(r.stock_day_id), *pair), 0)
+        rows.append({"s_id": r.stock_day_id, "b_id": pair[0], "t_id": pair[1],
+                     "returned": latest.get(pair, 0) + exp - r.empty_qty})
+        latest[pair] = r.empty_qty
+
+    if rows:
+        # Plain keyed UPDATEs (executemany), so the migration does not depend on the live bulk/upsert helpers
+        conn.execute(text("""
+            UPDATE delivery_vehicle_empty_stock SET returned_qty = :returned
+            WHERE stock_day_id = :s_id AND delivery_boy_id = :b_id AND cylinder_type_id = :t_id
+        """), rows)
+
+
+def upgrade(conn):
+    add_column(conn, "delivery_vehicle_empty_stock", RETURNED_QTY)
+    backfill_returned_qty(conn)
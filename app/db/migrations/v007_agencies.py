@@ -0,0 +1,60 @@
+from sqlalchemy import MetaData, Table, Column, Index, Integer, SmallInteger, String, Date, text
+from app.db.migrations import add_column, drop_unique, ensure_index
+
+DESCRIPTION = "Agencies: agency_id on users, stock days and master data, with agency-keyed indexes"
+
+metadata = MetaData()
+
+Table(
+    "agencies", metadata,
+    Column("agency_id", Integer, primary_key=True, autoincrement=True),
+    Column("code", String(20), nullable=False),
+    Column("name", String(100), nullable=False),
+    Index("ux_agencies_code", "code", unique=True),
+)
+
+# Existing rows all belong to the first agency. Every other table hangs off a stock day, delivery boy
+# or cylinder type, so it is partitioned by joining through those: day tables via stock_days.agency_id,
+# the per-boy balance / carry-forward / rollup tables via delivery_boys or cylinder_types. On a shared
+# database, reads of those tables must add that join - their own keys do not carry the agency.
+AGENCY_ID = Column("agency_id", Integer, nullable=False, server_default="1")
+AGENCY_TABLES = ("users", "stock_days", "delivery_boys", "cylinder_types")
+
+# Index targets on tables created by v001 (only the columns the indexes need)
+_existing = MetaData()
+stock_days = Table("stock_days", _existing, Column("agency_id", Integer), Column("status", String(10)),
+                   Column("stock_date", Date))
+delivery_boys = Table("delivery_boys", _existing, Column("agency_id", Integer), Column("is_active", SmallInteger),
+                      Column("name", String(100)))
+cylinder_types = Table("cylinder_types", _existing, Column("agency_id", Integer), Column("code", String(20)))
+users = Table("users", _existing, Column("agency_id", Integer))
+
+INDEXES = (
+    # One day per agency and date; the OPEN / latest CLOSED lookups every request makes
+    Index("ux_stock_days_agency_date", stock_days.c.agency_id, stock_days.c.stock_date, unique=True),
+    Index("ix_stock_days_agency_status_date", stock_days.c.agency_id, stock_days.c.status, stock_days.c.stock_date),
+    # Master data loads and the cash pages' active-boy lists
+    Index("ix_delivery_boys_agency_active_name", delivery_boys.c.agency_id, delivery_boys.c.is_active,
+          delivery_boys.c.name),
+    Index("ux_cylinder_types_agency_code", cylinder_types.c.agency_id, cylinder_types.c.code, unique=True),
+    Index("ix_users_agency", users.c.agency_id),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+    if conn.execute(text("SELECT COUNT(*) FROM agencies")).scalar() == 0:
+        conn.execute(text("INSERT INTO agencies (agency_id, code, name) VALUES (1, 'MAIN', 'Main agency')"))
+    for table in AGENCY_TABLES:
+        add_column(conn, table, AGENCY_ID)
+    # Dates and cylinder codes are only unique within an agency now
+    drop_unique(conn, "stock_days", ("stock_date",))
+    drop_unique(conn, "cylinder_types", ("code",))
+    for index in INDEXES:
+        ensure_index(conn, index)
+    # master_data_version keeps one row per agency, keyed by agency_id
+    conn.execute(text("""
+        INSERT INTO master_data_version (id, version)
+        SELECT a.agency_id, 1 FROM agencies a
+        WHERE NOT EXISTS (SELECT 1 FROM master_data_version v WHERE v.id = a.agency_id)
+    """))
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, text
+from app.db.migrations import add_column
+
+DESCRIPTION = "Mark the stock days already folded into the monthly rollups, so a day is never added twice"
+
+ROLLED_UP = Column("rolled_up", Integer, nullable=False, server_default="0")
+
+
+def upgrade(conn):
+    add_column(conn, "stock_days", ROLLED_UP)
+    # v003 backfilled the rollups from every CLOSED day and day close folded the rest
+    conn.execute(text("UPDATE stock_days SET rolled_up = 1 WHERE status = 'CLOSED'"))
@@ -1,18 +1,263 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.config.settings import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from app.config import settings
+from app.config.settings import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, APP_ENV
+from app.db.instrumentation import instrument_engine, record_pool_wait
+from app.services.agency import current_agency_id
 
-DATABASE_URL = (
+DATABASE_URL = settings.DATABASE_URL or (
     f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}"
     f"@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(bind=engine)
+# Pool settings per deployment profile (APP_ENV). Echo is only ever on in dev.
+ENGINE_PROFILES = {
+    "dev": {
+        "echo": True, "pool_size": 5, "max_overflow": 5, "pool_timeout": 30,
+        "pool_recycle": 3600, "pool_pre_ping": True, "statement_timeout_ms": 0,
+    },
+    "prod": {
+        "echo": False, "pool_size": 20, "max_overflow": 10, "pool_timeout": 10,
+        "pool_recycle": 1800, "pool_pre_ping": True, "statement_timeout_ms": 15000,
+    },
+    "bench": {
+        "echo": False, "pool_size": 32, "max_overflow": 0, "pool_timeout": 5,
+        "pool_recycle": 1800, "pool_pre_ping": False, "statement_timeout_ms": 60000,
+    },
+}
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.wait_total * 1000, 3),
+                "wait_avg_ms": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+# Across every pool of this process; each InstrumentedQueuePool also keeps its own
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.wait_stats = PoolWaitStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_stats.record(waited, timed_out)
+            pool_wait_stats.record(waited, timed_out)
+            record_pool_wait(waited)
+
+
+def _override(value, cast):
+    return cast(value) if value not in (None, "") else None
+
+
+def get_engine_options(env=APP_ENV, url=DATABASE_URL):
+    profile = dict(ENGINE_PROFILES.get(env, ENGINE_PROFILES["prod"]))
+    overrides = {
+        "pool_size": _override(settings.DB_POOL_SIZE, int),
+        "max_overflow": _override(settings.DB_MAX_OVERFLOW, int),
+        "pool_timeout": _override(settings.DB_POOL_TIMEOUT, float),
+        "pool_recycle": _override(settings.DB_POOL_RECYCLE, int),
+        "statement_timeout_ms": _override(settings.DB_STATEMENT_TIMEOUT_MS, int),
+        "echo": _override(settings.DB_ECHO, lambda v: v.lower() in ("1", "true", "yes")),
+    }
+    profile.update({k: v for k, v in overrides.items() if v is not None})
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return _sqlite_options(profile, url)
+
+    connect_args = {"connect_timeout": 10}
+    timeout_ms = profile.pop("statement_timeout_ms")
+    if timeout_ms:
+        # max_execution_time caps SELECTs server-side; read_timeout guards everything else client-side
+        connect_args["init_command"] = f"SET SESSION max_execution_time = {int(timeout_ms)}"
+        connect_args["read_timeout"] = max(1, int(timeout_ms / 1000) + 5)
+
+    profile["connect_args"] = connect_args
+    profile["poolclass"] = InstrumentedQueuePool
+    return profile
+
+
+def _sqlite_options(profile, url):
+    # No server-side statement timeout in SQLite; busy_timeout bounds lock waits instead
+    profile.pop("statement_timeout_ms")
+    # Raw SQL hands back DATE/DATETIME columns as date objects, as pymysql does
+    profile["native_datetime"] = True
+    profile["connect_args"] = {
+        "check_same_thread": False,
+        "timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "detect_types": sqlite3.PARSE_DECLTYPES,
+    }
+    if url.database in (None, "", ":memory:"):
+        # Every connection to :memory: is a separate empty database: share one connection
+        for key in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping"):
+            profile.pop(key)
+        profile["poolclass"] = StaticPool
+    else:
+        profile["poolclass"] = InstrumentedQueuePool
+    return profile
+
+
+def _register_sqlite_types():
+    # Explicit adapters/converters (the sqlite3 defaults are deprecated); Decimal binds as exact text
+    sqlite3.register_adapter(Decimal, str)
+    sqlite3.register_adapter(date, date.isoformat)
+    sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+    sqlite3.register_converter("DATE", lambda v: date.fromisoformat(v.decode()))
+    for decl in ("DATETIME", "TIMESTAMP"):
+        sqlite3.register_converter(decl, lambda v: datetime.fromisoformat(v.decode()))
+
+
+def _sqlite_on_connect(dbapi_conn, record):
+    cursor = dbapi_conn.cursor()
+    # WAL: readers never block the writer or each other; NORMAL sync is safe under WAL and skips most fsyncs
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
+
+
+def build_engine(url=DATABASE_URL, env=APP_ENV):
+    engine = create_engine(url, **get_engine_options(env, url))
+    if engine.dialect.name == "sqlite":
+        _register_sqlite_types()
+        event.listen(engine, "connect", _sqlite_on_connect)
+    instrument_engine(engine)
+    return engine
+
+
+def _parse_agency_urls(value):
+    urls = {}
+    for item in filter(None, (part.strip() for part in value.split(";"))):
+        agency_id, _, url = item.partition("=")
+        urls[int(agency_id)] = url.strip()
+    return urls
+
+
+# Main database: the agencies and users tables, plus the day data of every agency not routed elsewhere
+engine = build_engine()
+AGENCY_DATABASE_URLS = _parse_agency_urls(settings.AGENCY_DATABASE_URLS)
+_engines_lock = threading.Lock()
+_engines_by_url = {}
+
+
+def engine_for(agency_id):
+    """Engine holding an agency's day data: its own database when AGENCY_DATABASE_URLS lists one."""
+    url = AGENCY_DATABASE_URLS.get(agency_id)
+    if url is None:
+        return engine
+    with _engines_lock:
+        routed = _engines_by_url.get(url)
+        if routed is None:
+            # Built on first use, one pool per distinct URL
+            routed = _engines_by_url[url] = build_engine(url)
+    return routed
+
+
+def all_engines():
+    """The main engine followed by every routed one, each once (migrations run against all of them)."""
+    engines = [engine]
+    for agency_id in sorted(AGENCY_DATABASE_URLS):
+        routed = engine_for(agency_id)
+        if routed not in engines:
+            engines.append(routed)
+    return engines
+
+
+class AgencySession(Session):
+    """Session that sends each statement to the current agency's engine (see app.services.agency)."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        return engine_for(current_agency_id())
+
+
+SessionLocal = sessionmaker(class_=AgencySession)
+# Login, user lookups and the agency list always read the main database
+DirectorySession = sessionmaker(bind=engine)
+
+
+def engine_label(e):
+    """Name of an engine in the pool figures: "main", or the agencies routed to it (agency_2, agency_3_4)."""
+    if e is engine:
+        return "main"
+    return "agency_" + "_".join(str(a) for a in sorted(AGENCY_DATABASE_URLS) if engine_for(a) is e)
+
+
+def _pool_figures(e):
+    pool = e.pool
+    stats = {"engine": engine_label(e), "dialect": e.dialect.name}
+    if isinstance(pool, QueuePool):
+        stats.update(pool_size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                     overflow=pool.overflow())
+    else:
+        # In-memory SQLite: a single shared connection, nothing to count
+        stats.update(pool_size=1, checked_out=0, checked_in=1, overflow=0)
+    stats.update(getattr(pool, "wait_stats", PoolWaitStats()).snapshot())
+    return stats
+
+
+def get_pool_stats():
+    """Live pool counters plus cumulative checkout wait figures for this process.
+
+    The top-level figures are summed over every engine (main and routed agency databases); "engines"
+    holds each one's own.
+    """
+    engines = [_pool_figures(e) for e in all_engines()]
+    stats = {"profile": APP_ENV, "dialect": engine.dialect.name}
+    for key in ("pool_size", "checked_out", "checked_in", "overflow"):
+        stats[key] = sum(e[key] for e in engines)
+    stats.update(pool_wait_stats.snapshot())
+    stats["engines"] = engines
+    return stats
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
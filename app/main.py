@@ -1,7 +1,6 @@
 from flask import Flask
 from flask_login import LoginManager
-from sqlalchemy import text
-from app.db.session import SessionLocal
+from app.config.settings import APP_ENV, SECRET_KEY
 
 # Import the User class from your auth route file
 from app.routes.auth import auth_bp, User
@@ -17,10 +16,24 @@ from app.routes.closing_stock import closing_stock_bp
 from app.routes.cash_settlement import cash_settlement_bp
 from app.routes.cash_collection import cash_collection_bp
 from app.routes.cash_reconciliation import cash_reconciliation_bp
+from app.routes.monitoring import monitoring_bp
+from app.routes.exports import exports_bp
+
+from app.services.workflow_state import rebuild_workflow_state_command
+from app.services.vehicle_stock import rebuild_vehicle_balances_command
+from app.services.cash_balance import rebuild_carry_forward_command
+from app.services.rollups import backfill_rollups_command
+from app.services.pricing import add_price_revision_command, reprice_days_command
+from app.services.user_cache import get_identity, approve_user_command
+from app.services.issue_import import import_issues_command
+from app.services.recompute import recompute_from_command
+from app.services.agency import bind_request_agency, create_agency_command
+from app.db.migrations import schema_cli
+from app.db import instrumentation
 
 def create_app():
     app = Flask(__name__)
-    app.secret_key = "dev-secret-key"
+    app.secret_key = SECRET_KEY
 
     # 1. Initialize Flask-Login
     login_manager = LoginManager()
@@ -31,18 +44,11 @@ def create_app():
     # 2. Define the User Loader
     @login_manager.user_loader
     def load_user(user_id):
-        db = SessionLocal()
-        try:
-            # Query the user by ID
-            row = db.execute(
-                text("SELECT user_id, username FROM users WHERE user_id = :id"),
-                {"id": user_id}
-            ).fetchone()
-            if row:
-                return User(user_id=row.user_id, username=row.username)
-            return None
-        finally:
-            db.close()
+        # Served from the signed session or the per-worker TTL cache; only a miss hits the users table
+        identity = get_identity(user_id)
+        if identity:
+            return User(user_id=identity.user_id, username=identity.username, agency_id=identity.agency_id)
+        return None
 
     # 3. Register Blueprints
     app.register_blueprint(stock_day_bp)
@@ -56,10 +62,31 @@ def create_app():
     app.register_blueprint(cash_collection_bp)
     app.register_blueprint(cash_reconciliation_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(monitoring_bp)
+    app.register_blueprint(exports_bp)
+
+    # 4. Per-request SQL instrumentation (exported at /metrics)
+    instrumentation.init_app(app)
+
+    # 5. Every request outside auth/monitoring needs a signed-in user, and works on (and is routed to) its agency
+    app.before_request(bind_request_agency)
+
+    # 6. CLI Commands
+    app.cli.add_command(rebuild_workflow_state_command)
+    app.cli.add_command(rebuild_vehicle_balances_command)
+    app.cli.add_command(rebuild_carry_forward_command)
+    app.cli.add_command(backfill_rollups_command)
+    app.cli.add_command(reprice_days_command)
+    app.cli.add_command(add_price_revision_command)
+    app.cli.add_command(approve_user_command)
+    app.cli.add_command(import_issues_command)
+    app.cli.add_command(recompute_from_command)
+    app.cli.add_command(create_agency_command)
+    app.cli.add_command(schema_cli)
 
     return app
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=True)
\ No newline at end of file
+    app.run(host="127.0.0.1", port=5000, debug=APP_ENV == "dev")
\ No newline at end of file
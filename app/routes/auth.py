@@ -1,15 +1,19 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
-from app.db.session import SessionLocal
+from app.config.settings import DEFAULT_AGENCY_ID, PASSWORD_HASH_WAIT
+from app.db.session import DirectorySession
 from sqlalchemy import text
+from app.services.user_cache import USER_BY_NAME_SQL, remember_identity, forget_identity
+from app.services.passwords import hash_password, verify_password, HashingBusy
+from app.services.agency import find_agency
 
 auth_bp = Blueprint("auth", __name__)
 
 class User(UserMixin):
-    def __init__(self, user_id, username):
+    def __init__(self, user_id, username, agency_id):
         self.id = str(user_id)
         self.username = username
+        self.agency_id = agency_id
 
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
@@ -17,23 +21,31 @@ def login():
         username = request.form.get("username")
         password = request.form.get("password")
 
-        db = SessionLocal()
+        db = DirectorySession()
         try:
-            result = db.execute(
-                text("SELECT user_id, username, password_hash, full_name, is_approved FROM users WHERE username = :u"),
-                {"u": username}
-            ).fetchone()
+            result = db.execute(USER_BY_NAME_SQL, {"u": username}).fetchone()
 
-            if result and check_password_hash(result.password_hash, password):
+            ok, new_hash = verify_password(result.password_hash, password) if result else (False, None)
+
+            if ok:
+                if new_hash:
+                    # Hash parameters changed since this password was set: upgrade it transparently
+                    db.execute(text("UPDATE users SET password_hash = :p WHERE user_id = :id"),
+                               {"p": new_hash, "id": result.user_id})
+                    db.commit()
                 if result.is_approved == 1:
-                    user_obj = User(user_id=result.user_id, username=result.username)
+                    user_obj = User(user_id=result.user_id, username=result.username, agency_id=result.agency_id)
                     login_user(user_obj)
+                    remember_identity(result.user_id, result.username, result.agency_id)
                     flash(f"Login successful! {result.username}", "success")
                     return redirect(url_for('stock_day.dashboard'))
                 else:
                     flash("Your account is pending administrator approval.", "warning")
             else:
                 flash("Invalid username or password", "danger")
+        except HashingBusy:
+            flash("Too many sign-ins right now. Please try again in a moment.", "warning")
+            return render_template("login.html"), 503, {"Retry-After": str(int(PASSWORD_HASH_WAIT) or 1)}
         finally:
             db.close()
 
@@ -46,24 +58,32 @@ def register():
         username = request.form.get("username")
         password = request.form.get("password")
         confirm_password = request.form.get("confirm_password")
+        agency_code = (request.form.get("agency_code") or "").strip()
 
         if password != confirm_password:
             flash("Passwords do not match. Please try again.", "danger")
             return render_template("register.html")
 
-        db = SessionLocal()
+        db = DirectorySession()
         try:
             exists = db.execute(text("SELECT 1 FROM users WHERE username = :u"), {"u": username}).fetchone()
+            agency = find_agency(db, agency_code) if agency_code else None
             if exists:
                 flash(f"This username is already taken. {username}", "danger")
+            elif agency_code and not agency:
+                flash(f"Unknown agency code. {agency_code}", "danger")
             else:
-                hashed_pw = generate_password_hash(password)
+                hashed_pw = hash_password(password)
                 db.execute(text("""
-                    INSERT INTO users (username, password_hash, full_name, is_approved) 
-                    VALUES (:u, :p, :f, 0)
-                """), {"u": username, "p": hashed_pw, "f": full_name})
+                    INSERT INTO users (username, password_hash, full_name, agency_id, is_approved) 
+                    VALUES (:u, :p, :f, :a, 0)
+                """), {"u": username, "p": hashed_pw, "f": full_name,
+                       "a": agency.agency_id if agency else DEFAULT_AGENCY_ID})
                 db.commit()
                 flash("Registration successful! Your account is now pending approval.", "success")
+        except HashingBusy:
+            flash("The server is busy. Please try again in a moment.", "warning")
+            return render_template("register.html"), 503, {"Retry-After": str(int(PASSWORD_HASH_WAIT) or 1)}
         except Exception as e:
             flash(f"An error occurred: {str(e)}", "danger")
         finally:
@@ -75,5 +95,6 @@ def register():
 @login_required
 def logout():
     logout_user()
+    forget_identity()
     flash("You have been logged out.", "info")
     return redirect(url_for('auth.login'))
\ No newline at end of file
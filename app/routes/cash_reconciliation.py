@@ -1,8 +1,15 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for
 from sqlalchemy import text
+from app.db.dialect import on_conflict_update
 from app.db.session import SessionLocal
-import pandas as pd
-import io
+from app.services.agency import current_agency_id
+from app.services.day_context import OPEN_DAY_SQL, get_day_context, invalidate_day_context
+from app.services.workflow_state import sync_steps
+from app.services.cash_balance import carry_forward_cash
+from app.services.rollups import fold_day_into_rollups
+from app.services.master_data import get_master_data
+from app.services.day_views import load_cash_balances
+from app.services.exports import xlsx_response, stock_report_sql, cash_report_sql
 
 # The name "cash_reconciliation" here must match the prefix in url_for
 cash_reconciliation_bp = Blueprint("cash_reconciliation", __name__)
@@ -13,8 +20,7 @@ def reconciliation_view():
     db = SessionLocal()
     try:
         # 1. Check for an active OPEN day
-        open_day = db.execute(
-            text("SELECT stock_day_id, stock_date FROM stock_days WHERE status = 'OPEN' LIMIT 1")).fetchone()
+        open_day = get_day_context(db).open_day
 
         if not open_day:
             return redirect(url_for('stock_day.dashboard'))
@@ -23,9 +29,10 @@ def reconciliation_view():
 
         # --- POST: Handling Update Balances ---
         if request.method == "POST":
-            boys = db.execute(text("SELECT delivery_boy_id FROM delivery_boys WHERE is_active = 1")).fetchall()
-
-            for b in boys:
+            upsert_sql = on_conflict_update(db, "delivery_cash_balance", {
+                "opening_balance": ":op", "today_expected": ":ex", "today_deposited": ":dp",
+                "closing_balance": ":cl", "balance_status": ":status"})
+            for b in get_master_data(db).active_boys:
                 db_id = b.delivery_boy_id
                 op = float(request.form.get(f"opening_{db_id}", 0))
                 ex = float(request.form.get(f"expected_{db_id}", 0))
@@ -37,14 +44,12 @@ def reconciliation_view():
                 # LOGIC FIX: Status is 'SETTLED' only if closing balance is exactly 0
                 new_status = 'SETTLED' if round(cl, 2) == 0 else 'PENDING'
 
-                db.execute(text("""
+                db.execute(text(f"""
                     INSERT INTO delivery_cash_balance 
                         (stock_day_id, delivery_boy_id, opening_balance, today_expected, today_deposited, closing_balance, balance_status)
                     VALUES 
                         (:s_id, :db_id, :op, :ex, :dp, :cl, :status)
-                    ON DUPLICATE KEY UPDATE 
-                        opening_balance = :op, today_expected = :ex, 
-                        today_deposited = :dp, closing_balance = :cl, balance_status = :status
+                    {upsert_sql}
                 """), {
                     "s_id": s_id,
                     "db_id": db_id,
@@ -55,32 +60,13 @@ def reconciliation_view():
                     "status": new_status
                 })
 
+            sync_steps(db, s_id, "reconciled_cash")
             db.commit()
             flash("Cash balances updated successfully.", "success")
             return redirect(url_for('cash_reconciliation.reconciliation_view'))
 
         # --- GET: Fetching Data for the Display ---
-        query = text("""
-            SELECT 
-                db.delivery_boy_id, db.name,
-                COALESCE((
-                    SELECT dcb2.closing_balance 
-                    FROM delivery_cash_balance dcb2
-                    JOIN stock_days sd ON dcb2.stock_day_id = sd.stock_day_id
-                    WHERE dcb2.delivery_boy_id = db.delivery_boy_id 
-                      AND sd.status = 'CLOSED'
-                    ORDER BY sd.stock_date DESC LIMIT 1
-                ), 0) as opening_bal,
-                COALESCE(dea.expected_amount, 0) as expected_bal,
-                COALESCE(dcd.total_deposited, 0) as deposited_bal,
-                COALESCE(dcb.balance_status, 'PENDING') as balance_status
-            FROM delivery_boys db
-            LEFT JOIN delivery_cash_balance dcb ON db.delivery_boy_id = dcb.delivery_boy_id AND dcb.stock_day_id = :s_id
-            LEFT JOIN delivery_expected_amount dea ON db.delivery_boy_id = dea.delivery_boy_id AND dea.stock_day_id = :s_id
-            LEFT JOIN delivery_cash_deposit dcd ON db.delivery_boy_id = dcd.delivery_boy_id AND dcd.stock_day_id = :s_id
-            WHERE db.is_active = 1
-        """)
-        results = db.execute(query, {"s_id": s_id}).fetchall()
+        results = load_cash_balances(db, s_id)
 
         # Determine if balances have been updated to control button states
         has_updated = db.execute(text("SELECT COUNT(*) FROM delivery_cash_balance WHERE stock_day_id = :s_id"),
@@ -96,13 +82,27 @@ def reconciliation_view():
         db.close()
 
 
-@cash_reconciliation_bp.route("/day-close")
+@cash_reconciliation_bp.route("/day-close", methods=["POST"])
 def day_close():
     db = SessionLocal()
     try:
-        db.execute(text("UPDATE stock_days SET status = 'CLOSED' WHERE status = 'OPEN'"))
+        # Re-read the open day in this transaction: the cached day context can be seconds old, and only the
+        # request whose UPDATE flips it from OPEN may carry it forward and fold it
+        open_day = db.execute(OPEN_DAY_SQL, {"agency": current_agency_id()}).fetchone()
+        closed = open_day is not None and db.execute(
+            text("UPDATE stock_days SET status = 'CLOSED' WHERE stock_day_id = :s_id AND status = 'OPEN'"),
+            {"s_id": open_day.stock_day_id}).rowcount == 1
+        if closed:
+            # Carry each boy's closing balance forward as the next day's opening balance
+            carry_forward_cash(db, open_day.stock_day_id)
+            # Fold the day into the monthly stock and cash rollups
+            fold_day_into_rollups(db, open_day.stock_day_id, open_day.stock_date)
         db.commit()
-        flash("Day closed successfully. Records moved to history.", "success")
+        invalidate_day_context()
+        if closed:
+            flash("Day closed successfully. Records moved to history.", "success")
+        else:
+            flash("There is no open day to close.", "warning")
         return redirect(url_for('stock_day.dashboard'))
     finally:
         db.close()
@@ -110,48 +110,30 @@ def day_close():
 
 @cash_reconciliation_bp.route("/download-stock/<int:day_id>")
 def download_stock(day_id):
+    params = {"agency": current_agency_id(), "id": day_id}
     db = SessionLocal()
     try:
-        day_info = db.execute(text("SELECT stock_date FROM stock_days WHERE stock_day_id = :id"),
-                              {"id": day_id}).fetchone()
+        day_info = db.execute(text("SELECT stock_date FROM stock_days WHERE stock_day_id = :id AND agency_id = :agency"),
+                              params).fetchone()
         report_date = day_info.stock_date if day_info else "Report"
-
-        query = text("""
-            SELECT t.code as Cylinder_Type, s.opening_filled, s.opening_empty, s.item_receipt, s.item_return, s.sales_regular, 
-            s.nc_qty, s.dbc_qty, s.closing_filled, s.closing_empty
-            FROM daily_stock_summary s 
-            JOIN cylinder_types t ON s.cylinder_type_id = t.cylinder_type_id
-            WHERE s.stock_day_id = :id
-        """)
-        df = pd.read_sql(query, db.bind, params={"id": day_id})
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Stock_Report')
-        output.seek(0)
-        return send_file(output, download_name=f"Stock_Report_{report_date}.xlsx", as_attachment=True)
     finally:
         db.close()
 
+    # Rows stream from a server-side cursor into a constant-memory workbook
+    return xlsx_response(f"Stock_Report_{report_date}.xlsx",
+                         [("Stock_Report", stock_report_sql(), params)])
+
 
 @cash_reconciliation_bp.route("/download-cash/<int:day_id>")
 def download_cash(day_id):
+    params = {"agency": current_agency_id(), "id": day_id}
     db = SessionLocal()
     try:
-        day_info = db.execute(text("SELECT stock_date FROM stock_days WHERE stock_day_id = :id"),
-                              {"id": day_id}).fetchone()
+        day_info = db.execute(text("SELECT stock_date FROM stock_days WHERE stock_day_id = :id AND agency_id = :agency"),
+                              params).fetchone()
         report_date = day_info.stock_date if day_info else "Report"
-
-        query = text("""
-            SELECT b.name as Delivery_Boy, c.opening_balance, c.today_expected, c.today_deposited, c.closing_balance, c.balance_status
-            FROM delivery_cash_balance c 
-            JOIN delivery_boys b ON c.delivery_boy_id = b.delivery_boy_id
-            WHERE c.stock_day_id = :id
-        """)
-        df = pd.read_sql(query, db.bind, params={"id": day_id})
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Cash_Report')
-        output.seek(0)
-        return send_file(output, download_name=f"Cash_Report_{report_date}.xlsx", as_attachment=True)
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+    return xlsx_response(f"Cash_Report_{report_date}.xlsx",
+                         [("Cash_Report", cash_report_sql(), params)])
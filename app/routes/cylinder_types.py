@@ -1,8 +1,8 @@
-from flask import Blueprint, render_template, request, Response
-from sqlalchemy import text
+from flask import Blueprint, render_template, request
 from app.db.session import SessionLocal
-import csv
-import io
+from app.services.agency import current_agency_id
+from app.services.exports import csv_response
+from app.services.master_data import get_master_data
 
 cylinder_types_bp = Blueprint("cylinder_types", __name__)
 
@@ -12,13 +12,7 @@ def cylinder_types():
     db = SessionLocal()
     try:
         # Fetching all types by default for the new modern UI
-        cylinder_types = db.execute(
-            text("""
-                SELECT cylinder_type_id, code, category
-                FROM cylinder_types
-                ORDER BY category, code
-            """)
-        ).fetchall()
+        cylinder_types = sorted(get_master_data(db).types, key=lambda t: (t.category or "", t.code))
 
         return render_template("cylinder_types.html", cylinder_types=cylinder_types)
     finally:
@@ -27,20 +21,9 @@ def cylinder_types():
 
 @cylinder_types_bp.route("/cylinder-types/download", methods=["GET"])
 def download_cylinder_types():
-    db = SessionLocal()
-    try:
-        result = db.execute(
-            text("SELECT cylinder_type_id, code, category FROM cylinder_types ORDER BY category, code")).fetchall()
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["ID", "Cylinder Code", "Category"])
-        for row in result:
-            writer.writerow([row.cylinder_type_id, row.code, row.category])
-
-        return Response(
-            output.getvalue(),
-            mimetype="text/csv",
-            headers={"Content-Disposition": "attachment; filename=cylinder_types_report.csv"}
-        )
-    finally:
-        db.close()
\ No newline at end of file
+    return csv_response(
+        "cylinder_types_report.csv",
+        "SELECT cylinder_type_id, code, category FROM cylinder_types WHERE agency_id = :agency ORDER BY category, code",
+        {"agency": current_agency_id()},
+        header=["ID", "Cylinder Code", "Category"]
+    )
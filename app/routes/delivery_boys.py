@@ -1,8 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from sqlalchemy import text
 from app.db.session import SessionLocal
-import csv
-import io
+from app.services.agency import current_agency_id
+from app.services.exports import csv_response
+from app.services.master_data import get_master_data, bump_master_data_version, invalidate_master_data
 
 delivery_boys_bp = Blueprint("delivery_boys", __name__)
 
@@ -24,40 +25,34 @@ def delivery_boys():
                     flash("Enter a valid 10-digit mobile number", "error")
                 else:
                     # Check for duplicates
-                    existing = db.execute(text("SELECT 1 FROM delivery_boys WHERE name=:n OR mobile=:m"),
-                                          {"n": name, "m": mobile}).fetchone()
+                    agency_id = current_agency_id()
+                    existing = db.execute(text(
+                        "SELECT 1 FROM delivery_boys WHERE agency_id=:a AND (name=:n OR mobile=:m)"
+                    ), {"a": agency_id, "n": name, "m": mobile}).fetchone()
                     if existing:
                         flash("Delivery boy or mobile already exists", "error")
                     else:
-                        db.execute(text("INSERT INTO delivery_boys (name, mobile, is_active) VALUES (:n, :m, 1)"),
-                                   {"n": name, "m": mobile})
+                        db.execute(text(
+                            "INSERT INTO delivery_boys (agency_id, name, mobile, is_active) VALUES (:a, :n, :m, 1)"
+                        ), {"a": agency_id, "n": name, "m": mobile})
+                        bump_master_data_version(db)
                         db.commit()
+                        invalidate_master_data()
                         flash(f"Delivery boy '{name}' added successfully", "success")
                 return redirect(url_for("delivery_boys.delivery_boys"))
 
-        # Fetch all delivery boys for the table
-        results = db.execute(
-            text("SELECT delivery_boy_id, name, mobile, is_active FROM delivery_boys ORDER BY name")).fetchall()
-        return render_template("delivery_boys.html", delivery_boys=results)
+        # All delivery boys for the table, from the master data cache
+        return render_template("delivery_boys.html", delivery_boys=get_master_data(db).boys)
     finally:
         db.close()
 
 
 @delivery_boys_bp.route("/delivery-boys/download")
 def download_delivery_boys():
-    db = SessionLocal()
-    try:
-        result = db.execute(text("SELECT name, mobile, is_active FROM delivery_boys ORDER BY name")).fetchall()
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Name", "Mobile", "Status"])
-        for row in result:
-            writer.writerow([row.name, row.mobile, "Active" if row.is_active else "Inactive"])
-
-        return Response(
-            output.getvalue(),
-            mimetype="text/csv",
-            headers={"Content-Disposition": "attachment; filename=delivery_boys_report.csv"}
-        )
-    finally:
-        db.close()
\ No newline at end of file
+    return csv_response(
+        "delivery_boys_report.csv",
+        "SELECT name, mobile, is_active FROM delivery_boys WHERE agency_id = :agency ORDER BY name",
+        {"agency": current_agency_id()},
+        header=["Name", "Mobile", "Status"],
+        row_fn=lambda row: [row.name, row.mobile, "Active" if row.is_active else "Inactive"]
+    )
@@ -1,20 +1,21 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from sqlalchemy import text
 from app.db.session import SessionLocal
+from app.services.day_context import get_day_context
+from app.services.workflow_state import sync_steps
+from app.services.master_data import get_master_data
+from app.services.delivery_issues import parse_issue_form, save_issue_grid, sync_tv_out_totals
+from app.services.day_views import load_delivery_issues
+from app.services.issue_import import import_issues, iter_file_rows
 
 delivery_transactions_bp = Blueprint("delivery_transactions", __name__)
 
-def get_open_day(db):
-    return db.execute(text("""
-        SELECT stock_day_id, stock_date, delivery_no_movement 
-        FROM stock_days WHERE status = 'OPEN' LIMIT 1
-    """)).fetchone()
-
 @delivery_transactions_bp.route("/delivery-transactions", methods=["GET", "POST"])
 def transactions_view():
     db = SessionLocal()
     try:
-        open_day = get_open_day(db)
+        ctx = get_day_context(db)
+        open_day = ctx.open_day
         if not open_day:
             flash("No active OPEN stock day found.", "danger")
             return redirect(url_for("stock_day.dashboard"))
@@ -22,10 +23,7 @@ def transactions_view():
         s_id = open_day.stock_day_id
 
         # UPDATED MASTER LOCK: Check the explicit is_reconciled flag
-        is_finalized = db.execute(text("""
-            SELECT COALESCE(MAX(is_reconciled), 0) FROM daily_stock_summary 
-            WHERE stock_day_id = :s_id
-        """), {"s_id": s_id}).scalar() == 1
+        is_finalized = ctx.is_finalized
 
         if request.method == "POST":
             if is_finalized:
@@ -37,6 +35,7 @@ def transactions_view():
                 db.execute(text("DELETE FROM delivery_issues WHERE stock_day_id = :s_id"), {"s_id": s_id})
                 db.execute(text("UPDATE daily_stock_summary SET tv_out_qty = 0 WHERE stock_day_id = :s_id"), {"s_id": s_id})
                 db.execute(text("UPDATE stock_days SET delivery_no_movement = 0 WHERE stock_day_id = :s_id"), {"s_id": s_id})
+                sync_steps(db, s_id, "deliveries")
                 db.commit()
                 flash("Records cleared successfully.", "info")
                 return redirect(url_for("delivery_transactions.transactions_view"))
@@ -50,56 +49,67 @@ def transactions_view():
                 db.execute(text("DELETE FROM delivery_issues WHERE stock_day_id = :s_id"), {"s_id": s_id})
                 db.execute(text("UPDATE daily_stock_summary SET tv_out_qty = 0 WHERE stock_day_id = :s_id"), {"s_id": s_id})
             else:
-                # 3. PROCESS STANDARD DATA
-                data_map = {}
-                for key, value in request.form.items():
-                    if key.startswith("issue_"):
-                        qty = int(value or 0)
-                        parts = key.split("_")
-                        b_id, t_id, cat = parts[1], parts[2], parts[3]
-                        if (b_id, t_id) not in data_map:
-                            data_map[(b_id, t_id)] = {'r': 0, 'n': 0, 'd': 0, 'tv': 0}
-
-                        mapping = {'REFILL': 'r', 'NC': 'n', 'DBC': 'd', 'TVOUT': 'tv'}
-                        if cat in mapping:
-                            data_map[(b_id, t_id)][mapping[cat]] = qty
-
-                for (b_id, t_id), q in data_map.items():
-                    if q['r'] > 0 or q['n'] > 0 or q['d'] > 0 or q['tv'] > 0:
-                        db.execute(text("""
-                            INSERT INTO delivery_issues 
-                                (stock_day_id, delivery_boy_id, cylinder_type_id, regular_qty, nc_qty, dbc_qty, tv_out_qty, delivery_source)
-                            VALUES (:s_id, :b_id, :t_id, :r, :n, :d, :tv, 'DELIVERY_BOY')
-                            ON DUPLICATE KEY UPDATE 
-                                regular_qty = VALUES(regular_qty), nc_qty = VALUES(nc_qty), 
-                                dbc_qty = VALUES(dbc_qty), tv_out_qty = VALUES(tv_out_qty)
-                        """), {"s_id": s_id, "b_id": b_id, "t_id": t_id, "r": q['r'], "n": q['n'], "d": q['d'], "tv": q['tv']})
+                # 3. PROCESS STANDARD DATA (batched multi-row upserts)
+                master = get_master_data(db)
+                # Only the agency's own boys and types; ids come straight from the form
+                data_map = {k: q for k, q in parse_issue_form(request.form).items()
+                            if k[0] in master.boys_by_id and k[1] in master.types_by_id}
+                save_issue_grid(db, s_id, data_map)
 
                 # 4. SYNC TOTALS TO SUMMARY TABLE
-                db.execute(text("""
-                    UPDATE daily_stock_summary dss
-                    SET tv_out_qty = (
-                        SELECT COALESCE(SUM(tv_out_qty), 0) 
-                        FROM delivery_issues 
-                        WHERE stock_day_id = dss.stock_day_id AND cylinder_type_id = dss.cylinder_type_id
-                    ) WHERE stock_day_id = :s_id
-                """), {"s_id": s_id})
+                sync_tv_out_totals(db, s_id)
 
+            sync_steps(db, s_id, "deliveries")
             db.commit()
             flash("Delivery transactions updated successfully.", "success")
             return redirect(url_for("delivery_transactions.transactions_view"))
 
         # Fetch data for UI
-        boys = db.execute(text("SELECT delivery_boy_id, name FROM delivery_boys WHERE is_active = 1 ORDER BY name")).fetchall()
-        types = db.execute(text("SELECT cylinder_type_id, code FROM cylinder_types ORDER BY code")).fetchall()
-        issues_raw = db.execute(text("SELECT * FROM delivery_issues WHERE stock_day_id = :s_id"), {"s_id": s_id}).fetchall()
+        master = get_master_data(db)
+        boys = master.active_boys
+        types = master.types
+        issues_raw = load_delivery_issues(db, s_id)
         issues = {(r.delivery_boy_id, r.cylinder_type_id): r for r in issues_raw}
 
-        is_saved = (len(issues_raw) > 0 or open_day.delivery_no_movement == 1)
+        is_saved = (len(issues_raw) > 0 or ctx.delivery_no_movement == 1)
 
         return render_template("delivery_transactions.html",
                                boys=boys, types=types, issues=issues,
-                               is_saved=is_saved, no_movement=open_day.delivery_no_movement,
+                               is_saved=is_saved, no_movement=ctx.delivery_no_movement,
                                is_finalized=is_finalized, stock_date=open_day.stock_date)
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@delivery_transactions_bp.route("/delivery-transactions/import", methods=["POST"])
+def import_view():
+    upload = request.files.get("issue_file")
+    if not upload or not upload.filename:
+        flash("Choose a CSV or XLSX file to import.", "danger")
+        return redirect(url_for("delivery_transactions.transactions_view"))
+
+    db = SessionLocal()
+    try:
+        ctx = get_day_context(db)
+        if not ctx.open_day:
+            flash("No active OPEN stock day found.", "danger")
+            return redirect(url_for("stock_day.dashboard"))
+        if ctx.is_finalized:
+            flash("Locked: Reconciliation (Step 4) is complete.", "danger")
+            return redirect(url_for("delivery_transactions.transactions_view"))
+
+        try:
+            report = import_issues(db, ctx.stock_day_id, iter_file_rows(upload.filename, upload.stream))
+        except ValueError as e:
+            flash(f"Import failed: {e}", "danger")
+            return redirect(url_for("delivery_transactions.transactions_view"))
+        db.commit()
+
+        flash(f"Imported {report.pairs} boy/type entries from {report.rows_read} rows.", "success")
+        if report.failed:
+            shown = "; ".join(f"line {n}: {msg}" for n, msg in report.errors[:10])
+            more = f" (+{report.failed - 10} more)" if report.failed > 10 else ""
+            flash(f"{report.failed} rows skipped - {shown}{more}", "danger")
+        return redirect(url_for("delivery_transactions.transactions_view"))
+    finally:
+        db.close()
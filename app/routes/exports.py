@@ -0,0 +1,37 @@
+from datetime import date
+from flask import Blueprint, request, redirect, url_for, flash
+from flask_login import login_required
+from app.services.agency import current_agency_id
+from app.services.exports import csv_response, xlsx_response, stock_report_sql, cash_report_sql
+
+exports_bp = Blueprint("exports", __name__)
+
+REPORTS = {
+    "stock": ("Stock_Report", stock_report_sql),
+    "cash": ("Cash_Report", cash_report_sql),
+}
+
+
+@exports_bp.route("/export/<report_type>")
+@login_required
+def export_range(report_type):
+    if report_type not in REPORTS:
+        return "Unknown report", 404
+
+    try:
+        start = date.fromisoformat(request.args.get("start", ""))
+        end = date.fromisoformat(request.args.get("end", ""))
+    except ValueError:
+        flash("Select a valid start and end date for the export.", "warning")
+        return redirect(url_for("stock_day.dashboard"))
+
+    if start > end:
+        start, end = end, start
+
+    sheet_name, sql_fn = REPORTS[report_type]
+    params = {"agency": current_agency_id(), "start": start, "end": end}
+    filename = f"{sheet_name}_{start}_to_{end}"
+
+    if request.args.get("format") == "csv":
+        return csv_response(f"{filename}.csv", sql_fn(by_range=True), params)
+    return xlsx_response(f"{filename}.xlsx", [(sheet_name, sql_fn(by_range=True), params)])
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from sqlalchemy import text
 from app.db.session import SessionLocal
+from app.services.day_context import get_day_context
+from app.services.day_views import IOCL_MOVEMENTS_SQL
+from app.services.workflow_state import sync_steps
 
 iocl_movements_bp = Blueprint("iocl_movements", __name__)
 
@@ -10,12 +13,8 @@ def iocl_view():
     db = SessionLocal()
     try:
         # 1. Fetch current active OPEN stock day
-        open_day = db.execute(text("""
-            SELECT stock_day_id, stock_date 
-            FROM stock_days 
-            WHERE status = 'OPEN' 
-            ORDER BY stock_date DESC LIMIT 1
-        """)).fetchone()
+        ctx = get_day_context(db)
+        open_day = ctx.open_day
 
         if not open_day:
             flash("No active OPEN stock day found.", "error")
@@ -24,22 +23,13 @@ def iocl_view():
         s_id = open_day.stock_day_id
 
         # 2. MASTER LOCK CHECK: Check the explicit is_reconciled flag
-        is_finalized = db.execute(text("""
-            SELECT COALESCE(MAX(is_reconciled), 0) FROM daily_stock_summary 
-            WHERE stock_day_id = :s_id
-        """), {"s_id": s_id}).scalar() == 1
+        is_finalized = ctx.is_finalized
 
         # 3. Check if "No Movement" flag is set for Step 2
-        current_no_mov = db.execute(text("""
-            SELECT COALESCE(MAX(iocl_no_movement), 0) FROM daily_stock_summary 
-            WHERE stock_day_id = :s_id
-        """), {"s_id": s_id}).scalar() or 0
+        current_no_mov = ctx.iocl_no_movement
 
         # 4. Step 1 Prerequisite Check
-        step1_done = db.execute(text("""
-            SELECT COUNT(*) FROM daily_stock_summary 
-            WHERE stock_day_id = :s_id AND opening_filled IS NOT NULL
-        """), {"s_id": s_id}).scalar() > 0
+        step1_done = ctx.opening_done
 
         is_editable = step1_done and not is_finalized
 
@@ -70,22 +60,13 @@ def iocl_view():
                             WHERE stock_day_id = :s_id AND cylinder_type_id = :c_id
                         """), {"receipt": receipt, "ret": ret, "s_id": s_id, "c_id": c_id})
 
+            sync_steps(db, s_id, "iocl_movements")
             db.commit()
             flash("IOCL Movements updated successfully.", "success")
             return redirect(url_for("iocl_movements.iocl_view"))
 
         # 6. Fetch values for UI
-        rows = db.execute(text("""
-            SELECT 
-                ct.cylinder_type_id,
-                ct.code AS cylinder_type,
-                COALESCE(dss.item_receipt, 0) AS item_receipt,
-                COALESCE(dss.item_return, 0) AS item_return
-            FROM cylinder_types ct
-            JOIN daily_stock_summary dss ON dss.cylinder_type_id = ct.cylinder_type_id
-            WHERE dss.stock_day_id = :s_id
-            ORDER BY ct.cylinder_type_id
-        """), {"s_id": s_id}).fetchall()
+        rows = db.execute(IOCL_MOVEMENTS_SQL, {"s_id": s_id}).fetchall()
 
         total_received = sum(row.item_receipt for row in rows)
         total_returned = sum(row.item_return for row in rows)
@@ -105,15 +86,12 @@ def iocl_view():
 def delete_movements():
     db = SessionLocal()
     try:
-        open_day = db.execute(text("SELECT stock_day_id FROM stock_days WHERE status = 'OPEN' LIMIT 1")).fetchone()
-        if open_day:
-            s_id = open_day.stock_day_id
+        ctx = get_day_context(db)
+        if ctx.open_day:
+            s_id = ctx.stock_day_id
 
             # Master Lock Check
-            is_finalized = db.execute(text("""
-                SELECT COALESCE(MAX(is_reconciled), 0) FROM daily_stock_summary 
-                WHERE stock_day_id = :s_id
-            """), {"s_id": s_id}).scalar() == 1
+            is_finalized = ctx.is_finalized
 
             if is_finalized:
                 flash("Locked: Cannot reset finalized records.", "danger")
@@ -124,6 +102,7 @@ def delete_movements():
                 SET item_receipt = 0, item_return = 0, iocl_no_movement = 0
                 WHERE stock_day_id = :s_id
             """), {"s_id": s_id})
+            sync_steps(db, s_id, "iocl_movements")
             db.commit()
             flash("Records and flags reset successfully.", "info")
         return redirect(url_for("iocl_movements.iocl_view"))
@@ -0,0 +1,30 @@
+import hmac
+from flask import Blueprint, Response, abort, jsonify, request
+from app.config.settings import METRICS_TOKEN
+from app.db.session import get_pool_stats
+from app.db.instrumentation import render_prometheus, slowest_statements
+
+monitoring_bp = Blueprint("monitoring", __name__)
+
+
+@monitoring_bp.before_request
+def require_metrics_token():
+    # Pool state, route timings and raw SQL text are for the scraper only
+    supplied = request.headers.get("Authorization", "")
+    if not METRICS_TOKEN or not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+        abort(401)
+
+
+@monitoring_bp.route("/pool-stats")
+def pool_stats():
+    return jsonify(get_pool_stats())
+
+
+@monitoring_bp.route("/metrics")
+def metrics():
+    return Response(render_prometheus(get_pool_stats()), mimetype="text/plain; version=0.0.4")
+
+
+@monitoring_bp.route("/metrics/slowest")
+def slowest():
+    return jsonify(slowest_statements())
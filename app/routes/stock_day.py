@@ -1,8 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import text
 from datetime import date, timedelta, datetime
 from app.db.session import SessionLocal
+from app.services.agency import current_agency_id
+from app.services.day_context import invalidate_day_context
+from app.services.day_views import LATEST_DAY_SQL
+from app.services.workflow_state import progress_from_state, read_progress
+from app.services.range_report import PERIODS, build_range_report, report_workbook
+from app.services.rollups import load_monthly_summary
 
 stock_day_bp = Blueprint("stock_day", __name__)
 
@@ -13,93 +19,23 @@ stock_day_bp = Blueprint("stock_day", __name__)
 def dashboard():
     db = SessionLocal()
     try:
-        # 1. Fetch the most recent day (OPEN or CLOSED)
-        day = db.execute(text("""
-            SELECT stock_day_id, stock_date, status, delivery_no_movement 
-            FROM stock_days 
-            ORDER BY stock_date DESC 
-            LIMIT 1
-        """)).fetchone()
-
-        # 2. Fetch all CLOSED days for History
-        history = db.execute(text("""
-            SELECT stock_day_id, stock_date 
-            FROM stock_days 
-            WHERE status = 'CLOSED' 
-            ORDER BY stock_date DESC
-        """)).fetchall()
+        # 1. Fetch the most recent day (OPEN or CLOSED) together with its persisted workflow state
+        day = db.execute(LATEST_DAY_SQL, {"agency": current_agency_id()}).fetchone()
 
+        # History is loaded on demand from /history, so render cost does not grow with closed days
         is_day_closed = (day.status.upper() == 'CLOSED') if day else False
 
-        # Initialize progress flags (Sequential Logic)
-        progress = {
-            "opening_stock": False,
-            "iocl_movements": False,
-            "deliveries": False,
-            "finalized_stock": False,
-            "expected_cash": False,
-            "cash_collection": False,
-            "reconciled_cash": False
-        }
+        # Progress flags (Sequential Logic), maintained by the step handlers in day_workflow_state
+        progress = progress_from_state(None)
 
         if day and not is_day_closed:
-            s_id = day.stock_day_id
-
-            # Step 1: Opening Stock
-            progress["opening_stock"] = db.execute(text("""
-                SELECT COUNT(*) FROM daily_stock_summary 
-                WHERE stock_day_id = :s_id AND opening_filled IS NOT NULL
-            """), {"s_id": s_id}).scalar() > 0
-
-            # Step 2: IOCL Movements
-            # Done if receipts exist OR "No Movement" toggle was saved
-            iocl_status = db.execute(text("""
-                SELECT 
-                    (COALESCE(SUM(item_receipt + item_return), 0) > 0) OR 
-                    (MAX(CAST(iocl_no_movement AS UNSIGNED)) = 1)
-                FROM daily_stock_summary 
-                WHERE stock_day_id = :s_id
-            """), {"s_id": s_id}).fetchone()
-
-            has_iocl_logic = bool(iocl_status[0]) if iocl_status else False
-            progress["iocl_movements"] = has_iocl_logic and progress["opening_stock"]
-
-            # Step 3: Delivery Issues
-            # Done if rows exist in delivery_issues OR "delivery_no_movement" flag is set in stock_days
-            has_delivery_data = db.execute(text("""
-                SELECT COUNT(*) FROM delivery_issues WHERE stock_day_id = :s_id
-            """), {"s_id": s_id}).scalar() > 0
-
-            no_delivery_movement = (day.delivery_no_movement == 1)
-            progress["deliveries"] = (has_delivery_data or no_delivery_movement) and progress["iocl_movements"]
-
-            # Step 4: Reconciliation (Closing Stock)
-            # FIXED: We now check the explicit 'is_reconciled' flag.
-            # This allows the step to be "Completed" even if sales_regular is 0.
-            has_finalized = db.execute(text("""
-                SELECT MAX(is_reconciled) 
-                FROM daily_stock_summary 
-                WHERE stock_day_id = :s_id
-            """), {"s_id": s_id}).scalar() == 1
-
-            progress["finalized_stock"] = has_finalized and progress["deliveries"]
-
-            # Steps 5, 6, 7 (Cash Handling)
-            has_exp = db.execute(text("SELECT COUNT(*) FROM delivery_expected_amount WHERE stock_day_id = :s_id"),
-                                 {"s_id": s_id}).scalar() > 0
-            progress["expected_cash"] = has_exp and progress["finalized_stock"]
-
-            has_coll = db.execute(text("SELECT COUNT(*) FROM delivery_cash_deposit WHERE stock_day_id = :s_id"),
-                                  {"s_id": s_id}).scalar() > 0
-            progress["cash_collection"] = has_coll and progress["expected_cash"]
-
-            has_recon = db.execute(text("SELECT COUNT(*) FROM delivery_cash_balance WHERE stock_day_id = :s_id"),
-                                   {"s_id": s_id}).scalar() > 0
-            progress["reconciled_cash"] = has_recon and progress["cash_collection"]
+            if day.state_day_id is not None:
+                progress = progress_from_state(day)
+            else:
+                progress = read_progress(db, day.stock_day_id)
 
         return render_template("dashboard.html",
                                day=day,
-                               history=history,
                                progress=progress,
                                is_day_closed=is_day_closed,
                                user=current_user)
@@ -117,8 +53,8 @@ def generate_report():
 
         record = db.execute(text("""
             SELECT stock_day_id, stock_date FROM stock_days 
-            WHERE stock_date = :sd AND status = 'CLOSED'
-        """), {"sd": selected_date}).fetchone()
+            WHERE agency_id = :agency AND stock_date = :sd AND status = 'CLOSED'
+        """), {"agency": current_agency_id(), "sd": selected_date}).fetchone()
 
         if not record:
             flash(f"No finalized records found for {selected_date}", "warning")
@@ -140,8 +76,11 @@ def generate_report():
 def create_new_day():
     db = SessionLocal()
     try:
+        agency_id = current_agency_id()
         today_val = date.today().isoformat()
-        last_day = db.execute(text("SELECT stock_date FROM stock_days ORDER BY stock_date DESC LIMIT 1")).fetchone()
+        last_day = db.execute(text(
+            "SELECT stock_date FROM stock_days WHERE agency_id = :agency ORDER BY stock_date DESC LIMIT 1"
+        ), {"agency": agency_id}).fetchone()
 
         if last_day:
             last_dt = last_day.stock_date if isinstance(last_day.stock_date, date) else datetime.strptime(
@@ -152,19 +91,106 @@ def create_new_day():
 
         if request.method == "POST":
             selected_date = request.form.get("stock_date")
-            exists = db.execute(text("SELECT 1 FROM stock_days WHERE stock_date = :sd"),
-                                {"sd": selected_date}).fetchone()
+            exists = db.execute(text("SELECT 1 FROM stock_days WHERE agency_id = :agency AND stock_date = :sd"),
+                                {"agency": agency_id, "sd": selected_date}).fetchone()
             if exists:
                 flash(f"Error: Date {selected_date} already exists!", "danger")
                 return redirect(url_for('stock_day.create_new_day'))
 
             # Initialize new day with no_movement flag as 0
             db.execute(
-                text("INSERT INTO stock_days (stock_date, status, delivery_no_movement) VALUES (:sd, 'OPEN', 0)"),
-                {"sd": selected_date})
+                text("INSERT INTO stock_days (agency_id, stock_date, status, delivery_no_movement) "
+                     "VALUES (:agency, :sd, 'OPEN', 0)"),
+                {"agency": agency_id, "sd": selected_date})
             db.commit()
+            invalidate_day_context()
             return redirect(url_for('stock_day.dashboard'))
 
         return render_template("create_stock_day.html", next_available_date=next_available, today=today_val)
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@stock_day_bp.route("/range-report", methods=["POST"])
+@login_required
+def range_report():
+    start = request.form.get("start_date")
+    end = request.form.get("end_date")
+    period = request.form.get("period", "month")
+
+    try:
+        start_dt = date.fromisoformat(start or "")
+        end_dt = date.fromisoformat(end or "")
+    except ValueError:
+        flash("Select a valid date range for the statement.", "warning")
+        return redirect(url_for('stock_day.dashboard'))
+
+    if period not in PERIODS:
+        period = "month"
+    if start_dt > end_dt:
+        start_dt, end_dt = end_dt, start_dt
+
+    db = SessionLocal()
+    try:
+        sheets = build_range_report(db, start_dt, end_dt, period)
+    finally:
+        db.close()
+
+    return send_file(report_workbook(sheets), as_attachment=True,
+                     download_name=f"Statement_{start_dt}_to_{end_dt}.xlsx")
+
+
+@stock_day_bp.route("/monthly-summary")
+@login_required
+def monthly_summary():
+    year = request.args.get("year", type=int) or date.today().year
+    db = SessionLocal()
+    try:
+        # Reads the monthly rollup tables (at most 12 x types/boys rows), never the daily detail
+        months = load_monthly_summary(db, year)
+        return render_template("monthly_summary.html", months=months, year=year)
+    finally:
+        db.close()
+
+
+HISTORY_PAGE_SIZE = 20
+
+
+@stock_day_bp.route("/history")
+@login_required
+def history():
+    # Keyset pagination on (status, stock_date): each page starts strictly before the last date seen
+    limit = min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), 100)
+    filters = ["agency_id = :agency", "status = 'CLOSED'"]
+    params = {"agency": current_agency_id(), "limit": limit + 1}
+    for arg, key, clause in (("before", "before", "stock_date < :before"),
+                             ("from", "from_date", "stock_date >= :from_date"),
+                             ("to", "to_date", "stock_date <= :to_date")):
+        value = request.args.get(arg)
+        if value:
+            try:
+                params[key] = date.fromisoformat(value)
+            except ValueError:
+                return jsonify({"error": f"Invalid date for '{arg}'"}), 400
+            filters.append(clause)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(text(f"""
+            SELECT stock_day_id, stock_date
+            FROM stock_days
+            WHERE {" AND ".join(filters)}
+            ORDER BY stock_date DESC
+            LIMIT :limit
+        """), params).fetchall()
+    finally:
+        db.close()
+
+    page = rows[:limit]
+    items = [{
+        "stock_day_id": r.stock_day_id,
+        "stock_date": str(r.stock_date),
+        "stock_url": url_for('cash_reconciliation.download_stock', day_id=r.stock_day_id),
+        "cash_url": url_for('cash_reconciliation.download_cash', day_id=r.stock_day_id),
+    } for r in page]
+    next_before = str(page[-1].stock_date) if len(rows) > limit else None
+    return jsonify({"items": items, "next_before": next_before})
@@ -0,0 +1,109 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+import click
+from flask import current_app, g, has_request_context, request
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.config.settings import DEFAULT_AGENCY_ID
+from app.db.dialect import constant_source
+
+# Agency the current unit of work belongs to. Requests take it from the signed-in user (bind_request_agency);
+# the JSON API and background work set it with use_agency(); the CLI falls back to DEFAULT_AGENCY_ID.
+# SessionLocal routes on it too (app.db.session), so it must be known before the first query.
+_agency = ContextVar("agency_id", default=None)
+
+# Blueprints served without signing in; they only touch the user directory or process metrics
+PUBLIC_BLUEPRINTS = ("auth", "monitoring")
+
+
+def current_agency_id():
+    agency_id = _agency.get()
+    if agency_id is not None:
+        return agency_id
+    if has_request_context():
+        # A web request never defaults to an agency: only a signed-in user binds one
+        if "agency_id" not in g:
+            raise RuntimeError("No agency is bound to this request")
+        return g.agency_id
+    return DEFAULT_AGENCY_ID
+
+
+@contextmanager
+def use_agency(agency_id):
+    """Scope (and route) everything inside the block to one agency."""
+    token = _agency.set(agency_id)
+    try:
+        yield
+    finally:
+        _agency.reset(token)
+
+
+def agency_option(command):
+    """Give a CLI command an --agency option (default DEFAULT_AGENCY_ID) and run it inside use_agency().
+
+    Put it right under @click.command.
+    """
+    @click.option("--agency", "agency_id", type=int, default=None,
+                  help="Agency id to work on (default: DEFAULT_AGENCY_ID).")
+    @functools.wraps(command)
+    def wrapper(*args, agency_id=None, **kwargs):
+        from app.db.session import DirectorySession
+        agency_id = DEFAULT_AGENCY_ID if agency_id is None else agency_id
+        db = DirectorySession()
+        try:
+            known = db.execute(text("SELECT 1 FROM agencies WHERE agency_id = :a"), {"a": agency_id}).fetchone()
+        finally:
+            db.close()
+        if not known:
+            raise click.BadParameter(f"No agency with id {agency_id}", param_hint="--agency")
+        with use_agency(agency_id):
+            return command(*args, **kwargs)
+    return wrapper
+
+
+def bind_request_agency():
+    """before_request hook: the request works on the signed-in user's agency; signed out, only the
+    PUBLIC_BLUEPRINTS (and static files) are served and everything else goes to the login page."""
+    from flask_login import current_user
+    if current_user.is_authenticated:
+        g.agency_id = current_user.agency_id
+    elif request.blueprint not in PUBLIC_BLUEPRINTS and request.endpoint != "static":
+        return current_app.login_manager.unauthorized()
+
+
+def find_agency(db, code):
+    return db.execute(text("SELECT agency_id, code, name FROM agencies WHERE code = :c"),
+                      {"c": code.strip().upper()}).fetchone()
+
+
+@click.command("create-agency")
+@click.argument("code")
+@click.argument("name")
+@with_appcontext
+def create_agency_command(code, name):
+    """Register an agency. Its day data stays on the main database unless AGENCY_DATABASE_URLS routes it."""
+    from app.db.session import DirectorySession, SessionLocal
+    db = DirectorySession()
+    try:
+        if find_agency(db, code):
+            raise click.ClickException(f"Agency {code} already exists")
+        db.execute(text("INSERT INTO agencies (code, name) VALUES (:c, :n)"), {"c": code.strip().upper(), "n": name})
+        agency_id = find_agency(db, code).agency_id
+        db.commit()
+    finally:
+        db.close()
+
+    # Its master data version row lives wherever its data does
+    with use_agency(agency_id):
+        db = SessionLocal()
+        try:
+            db.execute(text(f"""
+                INSERT INTO master_data_version (id, version)
+                SELECT :a, 1 {constant_source(db)}
+                WHERE NOT EXISTS (SELECT 1 FROM master_data_version WHERE id = :a)
+            """), {"a": agency_id})
+            db.commit()
+        finally:
+            db.close()
+    click.echo(f"Agency {code.upper()} created with id {agency_id}.")
@@ -0,0 +1,54 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.db.dialect import on_conflict_update
+from app.db.session import SessionLocal
+from app.services.agency import agency_option, current_agency_id
+
+
+def carry_forward_cash(db, s_id):
+    """Fold a closing day's per-boy closing balances into the next day's opening balances. Call before commit."""
+    db.execute(text(f"""
+        INSERT INTO delivery_cash_carry_forward (delivery_boy_id, opening_balance, stock_day_id)
+        SELECT delivery_boy_id, COALESCE(closing_balance, 0), stock_day_id
+        FROM delivery_cash_balance
+        WHERE stock_day_id = :s_id
+        {on_conflict_update(db, "delivery_cash_carry_forward", ("opening_balance", "stock_day_id"))}
+    """), {"s_id": s_id})
+
+
+def rebuild_carry_forward(db):
+    """Recompute the current agency's carried-forward balances from each boy's latest CLOSED day."""
+    params = {"agency": current_agency_id()}
+    db.execute(text("""
+        DELETE FROM delivery_cash_carry_forward
+        WHERE delivery_boy_id IN (SELECT delivery_boy_id FROM delivery_boys WHERE agency_id = :agency)
+    """), params)
+    db.execute(text("""
+        INSERT INTO delivery_cash_carry_forward (delivery_boy_id, opening_balance, stock_day_id)
+        SELECT dcb.delivery_boy_id, COALESCE(dcb.closing_balance, 0), dcb.stock_day_id
+        FROM delivery_cash_balance dcb
+        JOIN stock_days sd ON sd.stock_day_id = dcb.stock_day_id
+        JOIN (
+            SELECT dcb2.delivery_boy_id, MAX(sd2.stock_date) AS last_date
+            FROM delivery_cash_balance dcb2
+            JOIN stock_days sd2 ON sd2.stock_day_id = dcb2.stock_day_id
+            WHERE sd2.status = 'CLOSED' AND sd2.agency_id = :agency
+            GROUP BY dcb2.delivery_boy_id
+        ) l ON l.delivery_boy_id = dcb.delivery_boy_id AND l.last_date = sd.stock_date
+        WHERE sd.status = 'CLOSED' AND sd.agency_id = :agency
+    """), params)
+    db.commit()
+
+
+@click.command("rebuild-cash-carry-forward")
+@agency_option
+@with_appcontext
+def rebuild_carry_forward_command():
+    """Rebuild delivery boys' carried-forward cash balances from history."""
+    db = SessionLocal()
+    try:
+        rebuild_carry_forward(db)
+        click.echo("Cash carry-forward rebuilt.")
+    finally:
+        db.close()
@@ -0,0 +1,110 @@
+import numpy as np
+from sqlalchemy import text
+from app.db.dialect import is_sqlite
+
+# Issue categories in the order compute_closing expects them on the last axis
+ISSUE_FIELDS = ("total_reg", "total_nc", "total_dbc", "total_tv")
+
+
+def compute_closing(opening_filled, opening_empty, defective, item_receipt, item_return, issues):
+    """Step 4 reconciliation formulas over arrays of any matching shape (one day's types, or days x types).
+
+    issues carries one more trailing axis of 4: regular, NC, DBC and TV-out quantities. NULL inputs
+    should be passed as NaN or 0; both count as 0.
+    """
+    opening_filled, opening_empty, defective, item_receipt, item_return = (
+        np.nan_to_num(np.asarray(a, dtype=float))
+        for a in (opening_filled, opening_empty, defective, item_receipt, item_return))
+    issues = np.nan_to_num(np.asarray(issues, dtype=float))
+    reg, nc, dbc, tv = np.moveaxis(issues, -1, 0)
+
+    closing_filled = opening_filled + item_receipt - (reg + nc + dbc)
+    closing_empty = opening_empty + reg + tv - item_return
+    return {
+        "closing_filled": closing_filled,
+        "closing_empty": closing_empty,
+        "total_stock": closing_filled + closing_empty + defective,
+    }
+
+
+def closing_rows(summary_rows, issue_totals):
+    """One day's closing-stock grid from daily_stock_summary rows and per-type delivery totals."""
+    if not summary_rows:
+        return []
+    issues = np.array([[getattr(issue_totals.get(s.cylinder_type_id), f, 0) or 0 for f in ISSUE_FIELDS]
+                       for s in summary_rows], dtype=float)
+    col = lambda name: np.array([getattr(s, name) or 0 for s in summary_rows], dtype=float)
+    defective = col("defective_empty_vehicle")
+    closing = compute_closing(col("opening_filled"), col("opening_empty"), defective,
+                              col("item_receipt"), col("item_return"), issues)
+
+    return [{
+        'cylinder_type_id': s.cylinder_type_id,
+        'code': s.code,
+        'opening': {'f': s.opening_filled, 'e': s.opening_empty},
+        'iocl': {'in': s.item_receipt, 'out': s.item_return},
+        'issues': {'reg': int(issues[i, 0]), 'nc': int(issues[i, 1]), 'dbc': int(issues[i, 2])},
+        'tv': int(issues[i, 3]),
+        'defective_v': int(defective[i]),
+        'closing': {'f': int(closing["closing_filled"][i]), 'e': int(closing["closing_empty"][i])},
+        'total_stock': int(closing["total_stock"][i]),
+    } for i, s in enumerate(summary_rows)]
+
+
+# Step 4 closing figures per summary row s against its aggregated issues i (compute_closing in SQL)
+CLOSING_FILLED_SQL = ("COALESCE(s.opening_filled, 0) + COALESCE(s.item_receipt, 0)"
+                      " - (COALESCE(i.reg, 0) + COALESCE(i.nc, 0) + COALESCE(i.dbc, 0))")
+CLOSING_EMPTY_SQL = "COALESCE(s.opening_empty, 0) + COALESCE(i.reg, 0) + COALESCE(i.tv, 0) - COALESCE(s.item_return, 0)"
+
+# total_stock repeats the expressions rather than reading the new closing columns: MySQL's multi-table
+# UPDATE does not promise which assignments an expression sees
+FINALIZE_SET = (
+    ("closing_filled", CLOSING_FILLED_SQL),
+    ("closing_empty", CLOSING_EMPTY_SQL),
+    ("total_stock", f"({CLOSING_FILLED_SQL}) + ({CLOSING_EMPTY_SQL}) + COALESCE(s.defective_empty_vehicle, 0)"),
+    ("sales_regular", "COALESCE(i.reg, 0)"),
+    ("nc_qty", "COALESCE(i.nc, 0)"),
+    ("dbc_qty", "COALESCE(i.dbc, 0)"),
+    ("tv_out_qty", "COALESCE(i.tv, 0)"),
+    ("is_reconciled", "1"),
+)
+
+
+def finalize_day(db, s_id):
+    """Lock a day's stock: closing figures and sales totals for every type in one UPDATE ... JOIN.
+
+    Same formulas as compute_closing, evaluated by the database against the day's aggregated issues.
+    SQLite has no multi-table UPDATE, so there the aggregate is joined with UPDATE ... FROM instead,
+    left-joined from the summary rows so types without issues are still locked. Call before commit.
+    """
+    if is_sqlite(db):
+        set_sql = ", ".join(f"{c} = {expr}" for c, expr in FINALIZE_SET)
+        sql = f"""
+            UPDATE daily_stock_summary AS s
+            SET {set_sql}
+            FROM (
+                SELECT t.cylinder_type_id, SUM(d.regular_qty) AS reg, SUM(d.nc_qty) AS nc,
+                       SUM(d.dbc_qty) AS dbc, SUM(d.tv_out_qty) AS tv
+                FROM daily_stock_summary t
+                LEFT JOIN delivery_issues d
+                    ON d.stock_day_id = t.stock_day_id AND d.cylinder_type_id = t.cylinder_type_id
+                WHERE t.stock_day_id = :s_id
+                GROUP BY t.cylinder_type_id
+            ) i
+            WHERE s.stock_day_id = :s_id AND i.cylinder_type_id = s.cylinder_type_id
+        """
+    else:
+        set_sql = ", ".join(f"s.{c} = {expr}" for c, expr in FINALIZE_SET)
+        sql = f"""
+            UPDATE daily_stock_summary s
+            LEFT JOIN (
+                SELECT cylinder_type_id,
+                       SUM(regular_qty) AS reg, SUM(nc_qty) AS nc, SUM(dbc_qty) AS dbc, SUM(tv_out_qty) AS tv
+                FROM delivery_issues
+                WHERE stock_day_id = :s_id
+                GROUP BY cylinder_type_id
+            ) i ON i.cylinder_type_id = s.cylinder_type_id
+            SET {set_sql}
+            WHERE s.stock_day_id = :s_id
+        """
+    db.execute(text(sql), {"s_id": s_id})
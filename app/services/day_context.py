@@ -0,0 +1,118 @@
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import text
+from app.config.settings import DAY_CONTEXT_TTL
+from app.services.agency import current_agency_id
+
+# Process-level copy of each agency's OPEN / previous CLOSED day, {agency_id: (days, loaded_at)}.
+# Only create_new_day and day_close move these, and both call invalidate_day_context(), which only reaches
+# this process: another worker can serve a stale copy for up to the TTL. That is fine for pages, but a
+# write must never land on a day that has since been closed, so non-GET requests always re-read the days.
+_lock = threading.Lock()
+_cached_days = {}
+
+OPEN_DAY_SQL = text("""
+    SELECT stock_day_id, stock_date FROM stock_days
+    WHERE agency_id = :agency AND status = 'OPEN' ORDER BY stock_date DESC LIMIT 1
+""")
+
+PREV_DAY_SQL = text("""
+    SELECT stock_day_id, stock_date FROM stock_days
+    WHERE agency_id = :agency AND status = 'CLOSED' ORDER BY stock_date DESC LIMIT 1
+""")
+
+DAY_FLAGS_SQL = text("""
+    SELECT sd.delivery_no_movement,
+           COALESCE(MAX(dss.is_reconciled), 0) AS is_reconciled,
+           COALESCE(MAX(dss.iocl_no_movement), 0) AS iocl_no_movement,
+           COUNT(dss.opening_filled) AS opening_rows
+    FROM stock_days sd
+    LEFT JOIN daily_stock_summary dss ON dss.stock_day_id = sd.stock_day_id
+    WHERE sd.stock_day_id = :s_id
+    GROUP BY sd.stock_day_id, sd.delivery_no_movement
+""")
+
+
+class DayContext:
+    def __init__(self, db, open_day, prev_day):
+        self._db = db
+        self._flags = None
+        self.open_day = open_day
+        self.prev_day = prev_day
+
+    @property
+    def stock_day_id(self):
+        return self.open_day.stock_day_id if self.open_day else None
+
+    @property
+    def prev_day_id(self):
+        return self.prev_day.stock_day_id if self.prev_day else 0
+
+    @property
+    def stock_date(self):
+        return self.open_day.stock_date if self.open_day else None
+
+    @property
+    def flags(self):
+        # Lock flags change with every step save, so they are resolved once per request, never cached per process
+        if self._flags is None and self.open_day:
+            self._flags = self._db.execute(DAY_FLAGS_SQL, {"s_id": self.stock_day_id}).fetchone()
+        return self._flags
+
+    @property
+    def delivery_no_movement(self):
+        return (self.flags.delivery_no_movement or 0) if self.flags else 0
+
+    @property
+    def is_finalized(self):
+        return bool(self.flags and self.flags.is_reconciled == 1)
+
+    @property
+    def iocl_no_movement(self):
+        return (self.flags.iocl_no_movement or 0) if self.flags else 0
+
+    @property
+    def opening_done(self):
+        return bool(self.flags and self.flags.opening_rows > 0)
+
+
+def _load_days(db, agency_id):
+    params = {"agency": agency_id}
+    open_day = db.execute(OPEN_DAY_SQL, params).fetchone()
+    prev_day = db.execute(PREV_DAY_SQL, params).fetchone()
+    return open_day, prev_day
+
+
+def _get_days(db, fresh=False):
+    agency_id = current_agency_id()
+    if not fresh:
+        with _lock:
+            cached = _cached_days.get(agency_id)
+            if cached is not None and time.monotonic() - cached[1] < DAY_CONTEXT_TTL:
+                return cached[0]
+    days = _load_days(db, agency_id)
+    with _lock:
+        _cached_days[agency_id] = (days, time.monotonic())
+    return days
+
+
+def get_day_context(db):
+    """Return the open day, previous closed day and lock flags, resolved once per request."""
+    if has_request_context() and "day_context" in g:
+        return g.day_context
+
+    writing = has_request_context() and request.method not in ("GET", "HEAD")
+    open_day, prev_day = _get_days(db, fresh=writing)
+    ctx = DayContext(db, open_day, prev_day)
+    if has_request_context():
+        g.day_context = ctx
+    return ctx
+
+
+def invalidate_day_context():
+    """Drop the current agency's cached day state after a day is created or closed."""
+    with _lock:
+        _cached_days.pop(current_agency_id(), None)
+    if has_request_context():
+        g.pop("day_context", None)
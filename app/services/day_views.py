@@ -0,0 +1,112 @@
+from sqlalchemy import text
+from app.services.agency import current_agency_id
+
+# Read queries shared by the Flask pages and the JSON read API (app.api)
+
+STOCK_SUMMARY_SQL = text("""
+    SELECT s.*, t.code
+    FROM daily_stock_summary s
+    JOIN cylinder_types t ON s.cylinder_type_id = t.cylinder_type_id
+    WHERE s.stock_day_id = :s_id
+    ORDER BY t.cylinder_type_id
+""")
+
+ISSUE_TOTALS_SQL = text("""
+    SELECT cylinder_type_id,
+           SUM(regular_qty) as total_reg,
+           SUM(nc_qty) as total_nc,
+           SUM(dbc_qty) as total_dbc,
+           SUM(tv_out_qty) as total_tv
+    FROM delivery_issues
+    WHERE stock_day_id = :s_id
+    GROUP BY cylinder_type_id
+""")
+
+DELIVERY_ISSUES_SQL = text("SELECT * FROM delivery_issues WHERE stock_day_id = :s_id")
+
+# Working balances for the open day: opening comes from the maintained carry-forward
+CASH_BALANCES_SQL = text("""
+    SELECT
+        db.delivery_boy_id, db.name,
+        COALESCE(cf.opening_balance, 0) as opening_bal,
+        COALESCE(dea.expected_amount, 0) as expected_bal,
+        COALESCE(dcd.total_deposited, 0) as deposited_bal,
+        COALESCE(dcb.balance_status, 'PENDING') as balance_status
+    FROM delivery_boys db
+    LEFT JOIN delivery_cash_carry_forward cf ON db.delivery_boy_id = cf.delivery_boy_id
+    LEFT JOIN delivery_cash_balance dcb ON db.delivery_boy_id = dcb.delivery_boy_id AND dcb.stock_day_id = :s_id
+    LEFT JOIN delivery_expected_amount dea ON db.delivery_boy_id = dea.delivery_boy_id AND dea.stock_day_id = :s_id
+    LEFT JOIN delivery_cash_deposit dcd ON db.delivery_boy_id = dcd.delivery_boy_id AND dcd.stock_day_id = :s_id
+    WHERE db.agency_id = :agency AND db.is_active = 1
+""")
+
+# Saved balances of any day (closed days keep their own opening)
+SAVED_CASH_BALANCES_SQL = text("""
+    SELECT b.delivery_boy_id, db.name, b.opening_balance, b.today_expected, b.today_deposited,
+           b.closing_balance, b.balance_status
+    FROM delivery_cash_balance b
+    JOIN delivery_boys db ON db.delivery_boy_id = b.delivery_boy_id
+    WHERE b.stock_day_id = :s_id
+    ORDER BY db.name
+""")
+
+# Dashboard: the most recent day (OPEN or CLOSED) with its persisted workflow state
+LATEST_DAY_SQL = text("""
+    SELECT sd.stock_day_id, sd.stock_date, sd.status, sd.delivery_no_movement,
+           w.stock_day_id AS state_day_id, w.opening_stock, w.iocl_movements, w.deliveries,
+           w.finalized_stock, w.expected_cash, w.cash_collection, w.reconciled_cash
+    FROM stock_days sd
+    LEFT JOIN day_workflow_state w ON w.stock_day_id = sd.stock_day_id
+    WHERE sd.agency_id = :agency
+    ORDER BY sd.stock_date DESC
+    LIMIT 1
+""")
+
+# Opening stock summary: the day's own rows, falling back to the previous day's closing
+OPENING_SUMMARY_SQL = text("""
+    SELECT ct.code AS cylinder_type,
+        COALESCE(ods.opening_filled, pds.closing_filled, 0) AS opening_filled,
+        COALESCE(ods.opening_empty, pds.closing_empty, 0) AS opening_empty,
+        COALESCE(ods.defective_empty_vehicle, pds.defective_empty_vehicle, 0) AS defective_empty_vehicle,
+        (COALESCE(ods.opening_filled, pds.closing_filled, 0) +
+         COALESCE(ods.opening_empty, pds.closing_empty, 0) +
+         COALESCE(ods.defective_empty_vehicle, pds.defective_empty_vehicle, 0)) AS total_stock
+    FROM cylinder_types ct
+    LEFT JOIN daily_stock_summary ods ON ods.cylinder_type_id = ct.cylinder_type_id AND ods.stock_day_id = :open_id
+    LEFT JOIN daily_stock_summary pds ON pds.cylinder_type_id = ct.cylinder_type_id AND pds.stock_day_id = :prev_id
+    WHERE ct.agency_id = :agency
+    ORDER BY ct.code
+""")
+
+IOCL_MOVEMENTS_SQL = text("""
+    SELECT ct.cylinder_type_id, ct.code AS cylinder_type,
+           COALESCE(dss.item_receipt, 0) AS item_receipt,
+           COALESCE(dss.item_return, 0) AS item_return
+    FROM cylinder_types ct
+    JOIN daily_stock_summary dss ON dss.cylinder_type_id = ct.cylinder_type_id
+    WHERE dss.stock_day_id = :s_id
+    ORDER BY ct.cylinder_type_id
+""")
+
+CASH_DEPOSITS_SQL = text("SELECT * FROM delivery_cash_deposit WHERE stock_day_id = :s_id")
+
+
+def load_stock_summary(db, s_id):
+    return db.execute(STOCK_SUMMARY_SQL, {"s_id": s_id}).fetchall()
+
+
+def load_issue_totals(db, s_id):
+    """Day's delivery totals per cylinder type: {type_id: row(total_reg, total_nc, total_dbc, total_tv)}."""
+    return {r.cylinder_type_id: r for r in db.execute(ISSUE_TOTALS_SQL, {"s_id": s_id}).fetchall()}
+
+
+def load_delivery_issues(db, s_id):
+    return db.execute(DELIVERY_ISSUES_SQL, {"s_id": s_id}).fetchall()
+
+
+def load_cash_balances(db, s_id):
+    return db.execute(CASH_BALANCES_SQL, {"agency": current_agency_id(), "s_id": s_id}).fetchall()
+
+
+def load_saved_cash_balances(db, s_id):
+    return db.execute(SAVED_CASH_BALANCES_SQL, {"s_id": s_id}).fetchall()
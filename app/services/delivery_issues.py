@@ -0,0 +1,60 @@
+from sqlalchemy import text
+from app.db.bulk import bulk_upsert
+from app.services.day_views import load_issue_totals
+
+ISSUE_COLUMNS = ("stock_day_id", "delivery_boy_id", "cylinder_type_id",
+                 "regular_qty", "nc_qty", "dbc_qty", "tv_out_qty", "delivery_source")
+ISSUE_UPDATE_COLUMNS = ("regular_qty", "nc_qty", "dbc_qty", "tv_out_qty")
+
+# Form category suffix -> quantity key
+CATEGORY_MAP = {'REFILL': 'r', 'NC': 'n', 'DBC': 'd', 'TVOUT': 'tv'}
+
+
+def parse_issue_form(form):
+    """Collect issue_{boy}_{type}_{cat} fields into {(boy_id, type_id): {'r', 'n', 'd', 'tv'}}."""
+    data_map = {}
+    for key, value in form.items():
+        if key.startswith("issue_"):
+            parts = key.split("_")
+            b_id, t_id, cat = int(parts[1]), int(parts[2]), parts[3]
+            q = data_map.setdefault((b_id, t_id), {'r': 0, 'n': 0, 'd': 0, 'tv': 0})
+            if cat in CATEGORY_MAP:
+                q[CATEGORY_MAP[cat]] = int(value or 0)
+    return data_map
+
+
+def save_issue_grid(db, s_id, data_map, source="DELIVERY_BOY"):
+    """Persist a grid for a day with batched upserts; pairs submitted as all zero are skipped."""
+    rows = []
+    for (b_id, t_id), q in data_map.items():
+        if q['r'] > 0 or q['n'] > 0 or q['d'] > 0 or q['tv'] > 0:
+            rows.append({
+                "stock_day_id": s_id, "delivery_boy_id": b_id, "cylinder_type_id": t_id,
+                "regular_qty": q['r'], "nc_qty": q['n'], "dbc_qty": q['d'], "tv_out_qty": q['tv'],
+                "delivery_source": source,
+            })
+
+    if rows:
+        bulk_upsert(db, "delivery_issues", ISSUE_COLUMNS, rows, ISSUE_UPDATE_COLUMNS)
+    return len(rows)
+
+
+def sync_tv_out_totals(db, s_id):
+    """Re-total tv_out per type over all of the day's delivery_issues and write them to daily_stock_summary.
+
+    The totals come from one GROUP BY, so rows not on the submitted grid (inactive boys, imported rows)
+    still count.
+    """
+    tv_totals = {t_id: int(r.total_tv or 0) for t_id, r in load_issue_totals(db, s_id).items()}
+    params = {"s_id": s_id}
+    cases = []
+    for i, (t_id, total) in enumerate(tv_totals.items()):
+        cases.append(f"WHEN :t{i} THEN :v{i}")
+        params[f"t{i}"] = t_id
+        params[f"v{i}"] = total
+
+    tv_expr = f"CASE cylinder_type_id {' '.join(cases)} ELSE 0 END" if cases else "0"
+    db.execute(text(f"""
+        UPDATE daily_stock_summary SET tv_out_qty = {tv_expr}
+        WHERE stock_day_id = :s_id
+    """), params)
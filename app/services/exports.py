@@ -0,0 +1,146 @@
+import csv
+import io
+import os
+import tempfile
+import xlsxwriter
+from flask import Response, stream_with_context
+from sqlalchemy import text
+from app.db.session import SessionLocal
+
+# Rows fetched per round trip from the server-side cursor, and rows per CSV chunk sent to the client
+FETCH_SIZE = 1000
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def stream_rows(sql, params=None, fetch_size=FETCH_SIZE):
+    """Yield (column_names, batch_of_rows) from a server-side cursor; holds its own session until exhausted.
+
+    An empty result still yields one empty batch, so callers can write the column names.
+    """
+    db = SessionLocal()
+    try:
+        conn = db.connection().execution_options(stream_results=True, yield_per=fetch_size)
+        result = conn.execute(text(sql), params or {})
+        columns = list(result.keys())
+        empty = True
+        for batch in result.partitions():
+            empty = False
+            yield columns, batch
+        if empty:
+            yield columns, []
+    finally:
+        db.close()
+
+
+def _csv_chunks(sql, params, header, row_fn):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    wrote_header = False
+    for columns, batch in stream_rows(sql, params):
+        if not wrote_header:
+            writer.writerow(header or columns)
+            wrote_header = True
+        for row in batch:
+            writer.writerow(row_fn(row) if row_fn else row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def csv_response(filename, sql, params=None, header=None, row_fn=None):
+    """Stream a query as CSV, one chunk per fetched batch."""
+    # The request context stays up while streaming so the cursor's session routes to the request's agency
+    return Response(
+        stream_with_context(_csv_chunks(sql, params, header, row_fn)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+def _file_chunks(path):
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def xlsx_response(filename, sheets):
+    """Build a workbook in constant-memory mode on disk and stream it back.
+
+    sheets is a list of (sheet_name, sql, params). Rows go straight from the server-side cursor to the
+    worksheet, so memory stays flat however many rows are exported; only the finished file is on disk.
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+        for sheet_name, sql, params in sheets:
+            worksheet = workbook.add_worksheet(sheet_name)
+            row_idx = 0
+            for columns, batch in stream_rows(sql, params):
+                if row_idx == 0:
+                    worksheet.write_row(0, 0, columns)
+                    row_idx = 1
+                for row in batch:
+                    worksheet.write_row(row_idx, 0, list(row))
+                    row_idx += 1
+        workbook.close()
+    except Exception:
+        os.remove(path)
+        raise
+
+    return Response(
+        _file_chunks(path),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename={filename}",
+                 "Content-Length": str(os.path.getsize(path))}
+    )
+
+
+STOCK_REPORT_SQL = """
+    SELECT {date_col}t.code as Cylinder_Type, s.opening_filled, s.opening_empty, s.item_receipt, s.item_return,
+    s.sales_regular, s.nc_qty, s.dbc_qty, s.closing_filled, s.closing_empty
+    FROM daily_stock_summary s
+    JOIN cylinder_types t ON s.cylinder_type_id = t.cylinder_type_id
+    {join}
+    WHERE {where}
+    ORDER BY {order}t.cylinder_type_id
+"""
+
+CASH_REPORT_SQL = """
+    SELECT {date_col}b.name as Delivery_Boy, c.opening_balance, c.today_expected, c.today_deposited,
+    c.closing_balance, c.balance_status
+    FROM delivery_cash_balance c
+    JOIN delivery_boys b ON c.delivery_boy_id = b.delivery_boy_id
+    {join}
+    WHERE {where}
+    ORDER BY {order}b.name
+"""
+
+
+def _report_parts(alias, by_range):
+    # Always through stock_days, so a report never reads another agency's day
+    join = f"JOIN stock_days sd ON sd.stock_day_id = {alias}.stock_day_id"
+    if by_range:
+        return {
+            "date_col": "sd.stock_date as Stock_Date, ",
+            "join": join,
+            "where": "sd.agency_id = :agency AND sd.stock_date BETWEEN :start AND :end",
+            "order": "sd.stock_date, ",
+        }
+    return {"date_col": "", "join": join, "where": f"sd.agency_id = :agency AND {alias}.stock_day_id = :id", "order": ""}
+
+
+def stock_report_sql(by_range=False):
+    """Stock report of an agency (:agency) for one day (:id) or a date range (:start, :end) with a Stock_Date column."""
+    return STOCK_REPORT_SQL.format(**_report_parts("s", by_range))
+
+
+def cash_report_sql(by_range=False):
+    """Cash report of an agency (:agency) for one day (:id) or a date range (:start, :end) with a Stock_Date column."""
+    return CASH_REPORT_SQL.format(**_report_parts("c", by_range))
@@ -0,0 +1,266 @@
+import csv
+import io
+import os
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import ParseError, iterparse
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.db.session import SessionLocal
+from app.services.agency import agency_option
+from app.services.day_context import get_day_context
+from app.services.delivery_issues import save_issue_grid, sync_tv_out_totals
+from app.services.master_data import get_master_data
+from app.services.workflow_state import sync_steps
+
+# Accepted header spellings (lower-cased, spaces -> underscores) for each import column
+COLUMN_ALIASES = {
+    "boy": ("boy", "delivery_boy", "delivery_boy_id", "boy_name", "mobile"),
+    "type": ("type", "cylinder_type", "cylinder_type_id", "code", "type_code"),
+    "r": ("regular", "regular_qty", "refill"),
+    "n": ("nc", "nc_qty"),
+    "d": ("dbc", "dbc_qty"),
+    "tv": ("tv_out", "tv_out_qty", "tvout"),
+}
+QTY_KEYS = ("r", "n", "d", "tv")
+MAX_REPORTED_ERRORS = 200
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.pairs = 0
+        self.failed = 0
+        self.errors = []   # [(line_no, message)], first MAX_REPORTED_ERRORS only
+
+    def error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, message))
+
+
+def _csv_rows(stream):
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for line_no, cells in enumerate(reader, start=1):
+        yield line_no, cells
+
+
+def _col_index(ref):
+    letters = re.match(r"[A-Z]+", ref).group()
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index - 1
+
+
+def _first_sheet_path(book):
+    """Zip path of the workbook's first sheet (in tab order), resolved through xl/workbook.xml and its rels."""
+    with book.open("xl/workbook.xml") as f:
+        sheet = next((el for _, el in iterparse(f) if el.tag == f"{_XLSX_NS}sheet"), None)
+    if sheet is None:
+        raise ValueError("The workbook has no worksheets")
+    rel_id = sheet.get(f"{_REL_NS}id")
+    with book.open("xl/_rels/workbook.xml.rels") as f:
+        target = next((el.get("Target") for _, el in iterparse(f)
+                       if el.tag == f"{_PKG_REL_NS}Relationship" and el.get("Id") == rel_id), None)
+    if target is None:
+        raise ValueError("The workbook's first sheet could not be found")
+    # Targets are relative to xl/ unless absolute within the package
+    return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+
+
+def _xlsx_rows(stream):
+    """Rows of the first worksheet; a damaged or non-xlsx file is reported as a ValueError like any bad input."""
+    try:
+        yield from _read_xlsx(stream)
+    except (zipfile.BadZipFile, KeyError, IndexError, ParseError):
+        raise ValueError("Not a valid .xlsx workbook") from None
+
+
+def _read_xlsx(stream):
+    """Rows of the first worksheet, parsed incrementally from the zip (no full workbook in memory)."""
+    with zipfile.ZipFile(stream) as book:
+        shared = []
+        if "xl/sharedStrings.xml" in book.namelist():
+            with book.open("xl/sharedStrings.xml") as f:
+                for _, el in iterparse(f):
+                    if el.tag == f"{_XLSX_NS}si":
+                        shared.append("".join(t.text or "" for t in el.iter(f"{_XLSX_NS}t")))
+                        el.clear()
+
+        with book.open(_first_sheet_path(book)) as f:
+            for _, el in iterparse(f):
+                if el.tag != f"{_XLSX_NS}row":
+                    continue
+                cells = []
+                for c in el.iter(f"{_XLSX_NS}c"):
+                    idx = _col_index(c.get("r")) if c.get("r") else len(cells)
+                    cells.extend([""] * (idx - len(cells)))
+                    kind = c.get("t")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in c.iter(f"{_XLSX_NS}t"))
+                    else:
+                        v = c.find(f"{_XLSX_NS}v")
+                        value = v.text if v is not None and v.text is not None else ""
+                        if kind == "s" and value:
+                            value = shared[int(value)]
+                    cells.append(value)
+                yield int(el.get("r") or 0), cells
+                el.clear()
+
+
+def iter_file_rows(filename, stream):
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".csv":
+        return _csv_rows(stream)
+    if ext == ".xlsx":
+        return _xlsx_rows(stream)
+    raise ValueError("Only .csv and .xlsx files can be imported")
+
+
+def _header_map(cells):
+    normalized = [re.sub(r"\s+", "_", str(c).strip().lower()) for c in cells]
+    mapping = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for i, name in enumerate(normalized):
+            if name in aliases:
+                mapping[key] = i
+                break
+    missing = [k for k in ("boy", "type") if k not in mapping]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return mapping
+
+
+def _quantity(raw):
+    raw = str(raw).strip()
+    if raw == "":
+        return 0
+    value = float(raw)
+    if value < 0 or value != int(value):
+        raise ValueError
+    return int(value)
+
+
+def _lookup(maps, key):
+    """First match for key across maps in precedence order; the last map is matched case-insensitively."""
+    for i, m in enumerate(maps):
+        value = m.get(key.casefold() if i == len(maps) - 1 else key)
+        if value is not None:
+            return value
+    return None
+
+
+def collect_issues(rows, master, report):
+    """Validate streamed rows and fold them into {(boy_id, type_id): {'r', 'n', 'd', 'tv'}}.
+
+    Only active boys are accepted. A boy matches by id first, then mobile, then name (case-insensitive);
+    a type by id first, then code. Repeated pairs are summed, so a file may carry one line per trip.
+    """
+    boy_maps = (
+        {str(b.delivery_boy_id): b.delivery_boy_id for b in master.active_boys},
+        {str(b.mobile).strip(): b.delivery_boy_id for b in master.active_boys if b.mobile},
+        {b.name.strip().casefold(): b.delivery_boy_id for b in master.active_boys},
+    )
+    inactive = {str(b.delivery_boy_id) for b in master.boys if b.is_active != 1}
+    inactive.update(b.name.strip().casefold() for b in master.boys if b.is_active != 1)
+    type_maps = (
+        {str(t.cylinder_type_id): t.cylinder_type_id for t in master.types},
+        {t.code.strip().casefold(): t.cylinder_type_id for t in master.types},
+    )
+
+    data_map = {}
+    header = None
+    for line_no, cells in rows:
+        if header is None:
+            header = _header_map(cells)
+            continue
+        if not any(str(c).strip() for c in cells):
+            continue
+        report.rows_read += 1
+
+        def cell(key):
+            i = header.get(key)
+            return cells[i] if i is not None and i < len(cells) else ""
+
+        boy_key, type_key = str(cell("boy")).strip(), str(cell("type")).strip()
+        b_id = _lookup(boy_maps, boy_key)
+        t_id = _lookup(type_maps, type_key)
+        if b_id is None:
+            if boy_key.casefold() in inactive:
+                report.error(line_no, f"Delivery boy '{boy_key}' is inactive")
+            else:
+                report.error(line_no, f"Unknown delivery boy '{boy_key}'")
+            continue
+        if t_id is None:
+            report.error(line_no, f"Unknown cylinder type '{type_key}'")
+            continue
+        try:
+            qty = {k: _quantity(cell(k)) for k in QTY_KEYS}
+        except (ValueError, OverflowError):
+            report.error(line_no, "Quantities must be whole numbers of 0 or more")
+            continue
+
+        q = data_map.setdefault((b_id, t_id), {k: 0 for k in QTY_KEYS})
+        for k in QTY_KEYS:
+            q[k] += qty[k]
+
+    if header is None:
+        raise ValueError("The file is empty")
+    report.pairs = len(data_map)
+    return data_map
+
+
+def import_issues(db, s_id, rows, source="IMPORT", dry_run=False):
+    """Stream-validate rows and upsert the valid pairs for the day. The caller commits.
+
+    Pairs not in the file are left as they are; an all-zero pair is skipped, as on the grid.
+    """
+    report = ImportReport()
+    data_map = collect_issues(rows, get_master_data(db), report)
+    if dry_run or not data_map:
+        return report
+
+    save_issue_grid(db, s_id, data_map, source)
+    db.execute(text("UPDATE stock_days SET delivery_no_movement = 0 WHERE stock_day_id = :s_id"), {"s_id": s_id})
+
+    sync_tv_out_totals(db, s_id)
+    sync_steps(db, s_id, "deliveries")
+    return report
+
+
+@click.command("import-issues")
+@agency_option
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry-run", is_flag=True, help="Validate and report without writing.")
+@with_appcontext
+def import_issues_command(path, dry_run):
+    """Import delivery issues for the OPEN day from a CSV or XLSX file."""
+    db = SessionLocal()
+    try:
+        ctx = get_day_context(db)
+        if not ctx.open_day:
+            raise click.ClickException("No OPEN stock day.")
+        if ctx.is_finalized:
+            raise click.ClickException("The open day is already finalized.")
+
+        with open(path, "rb") as f:
+            try:
+                report = import_issues(db, ctx.stock_day_id, iter_file_rows(path, f), dry_run=dry_run)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+        if not dry_run:
+            db.commit()
+
+        for line_no, message in report.errors:
+            click.echo(f"line {line_no}: {message}", err=True)
+        click.echo(f"{report.rows_read} rows read, {report.pairs} boy/type pairs "
+                   f"{'validated' if dry_run else 'saved'}, {report.failed} rows rejected.")
+    finally:
+        db.close()
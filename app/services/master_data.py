@@ -0,0 +1,95 @@
+import threading
+import time
+from sqlalchemy import text
+from app.config.settings import MASTER_DATA_CHECK_INTERVAL
+from app.services.agency import current_agency_id
+from app.services.pricing import PriceBook
+
+# Process-level copy of each agency's delivery boys, cylinder types and prices, {agency_id: (data, checked_at)},
+# tagged with the agency's master_data_version stamp it was loaded at. Writers call bump_master_data_version()
+# before committing; other workers notice the new stamp on their next check.
+_lock = threading.Lock()
+_cache = {}
+
+
+class MasterData:
+    def __init__(self, version, boys, types, prices, price_revisions):
+        self.version = version
+        self.boys = boys
+        self.types = types
+        self.prices = prices
+        self.price_revisions = price_revisions
+        self._price_book = None
+        self.active_boys = [b for b in boys if b.is_active == 1]
+        self.boys_by_id = {b.delivery_boy_id: b for b in boys}
+        self.types_by_id = {t.cylinder_type_id: t for t in types}
+        self.types_by_code = {t.code: t for t in types}
+
+    @property
+    def price_book(self):
+        if self._price_book is None:
+            self._price_book = PriceBook(self.types, self.prices, self.price_revisions)
+        return self._price_book
+
+
+def _current_version(db, agency_id):
+    # One version row per agency, keyed by agency_id
+    return db.execute(text("SELECT version FROM master_data_version WHERE id = :agency"),
+                      {"agency": agency_id}).scalar() or 0
+
+
+def _load(db, agency_id, version):
+    params = {"agency": agency_id}
+    boys = db.execute(text(
+        "SELECT delivery_boy_id, name, mobile, is_active FROM delivery_boys WHERE agency_id = :agency ORDER BY name"
+    ), params).fetchall()
+    types = db.execute(text(
+        "SELECT cylinder_type_id, code, category FROM cylinder_types WHERE agency_id = :agency ORDER BY code"
+    ), params).fetchall()
+    # Prices hang off the agency's cylinder types
+    prices = db.execute(text("""
+        SELECT p.cylinder_type_id, p.deposit_amount, p.refill_amount, p.document_charge,
+               p.installation_charge, p.regulator_charge
+        FROM price_nc_components p
+        JOIN cylinder_types t ON t.cylinder_type_id = p.cylinder_type_id
+        WHERE t.agency_id = :agency
+    """), params).fetchall()
+    revisions = db.execute(text("""
+        SELECT r.cylinder_type_id, r.effective_from, r.deposit_amount, r.refill_amount, r.document_charge,
+               r.installation_charge, r.regulator_charge
+        FROM price_nc_revisions r
+        JOIN cylinder_types t ON t.cylinder_type_id = r.cylinder_type_id
+        WHERE t.agency_id = :agency
+        ORDER BY r.effective_from
+    """), params).fetchall()
+    return MasterData(version, boys, types, {p.cylinder_type_id: p for p in prices}, revisions)
+
+
+def get_master_data(db):
+    """The current agency's cached master data; reloads only when its master_data_version has moved on."""
+    agency_id = current_agency_id()
+    now = time.monotonic()
+    with _lock:
+        cache, checked_at = _cache.get(agency_id, (None, 0.0))
+        if cache is not None and now - checked_at < MASTER_DATA_CHECK_INTERVAL:
+            return cache
+
+    version = _current_version(db, agency_id)
+    if cache is None or cache.version != version:
+        cache = _load(db, agency_id, version)
+
+    with _lock:
+        _cache[agency_id] = (cache, now)
+    return cache
+
+
+def bump_master_data_version(db):
+    """Mark the current agency's master data as changed. Call in the same transaction as the edit, before commit."""
+    db.execute(text("UPDATE master_data_version SET version = version + 1 WHERE id = :agency"),
+               {"agency": current_agency_id()})
+
+
+def invalidate_master_data():
+    """Drop this process's copy of the current agency's master data (e.g. right after committing an edit)."""
+    with _lock:
+        _cache.pop(current_agency_id(), None)
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.config.settings import (
+    PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, PASSWORD_HASH_WAIT,
+)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated; the caller should ask the user to retry."""
+
+
+# A small thread pool bounds how many hashes burn CPU at once, and the semaphore caps how many requests
+# can queue behind it. This is admission control, not async I/O: under WSGI the request thread still waits
+# (idle, without the GIL) for its own hash, so a login occupies its worker for the hash time plus any queueing.
+# What the pool buys is that a login burst cannot run more than PASSWORD_HASH_WORKERS hashes in parallel
+# and starve the other pages of CPU, and that excess logins fail fast with a 503.
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+_method_lock = threading.Lock()
+_current_method = None
+
+
+def _run(fn, *args):
+    """Run fn on the hashing pool and wait for it; HashingBusy when no slot and result within PASSWORD_HASH_WAIT."""
+    # One budget for queueing and hashing together
+    deadline = time.monotonic() + PASSWORD_HASH_WAIT
+    if not _slots.acquire(timeout=PASSWORD_HASH_WAIT):
+        raise HashingBusy()
+    try:
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except (FutureTimeout, TimeoutError):
+        # The hash still finishes (and frees its slot) in the background; this request gives up
+        raise HashingBusy()
+
+
+def current_method():
+    """The configured method with werkzeug's defaults filled in, as it appears in stored hashes."""
+    global _current_method
+    if _current_method is None:
+        with _method_lock:
+            if _current_method is None:
+                _current_method = generate_password_hash("", method=PASSWORD_HASH_METHOD).split("$", 1)[0]
+    return _current_method
+
+
+def needs_rehash(stored_hash):
+    return stored_hash.split("$", 1)[0] != current_method()
+
+
+def _hash(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def _verify(stored_hash, password):
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    return True, _hash(password) if needs_rehash(stored_hash) else None
+
+
+def hash_password(password):
+    return _run(_hash, password)
+
+
+def verify_password(stored_hash, password):
+    """(ok, new_hash): new_hash is set when the stored hash used outdated parameters."""
+    return _run(_verify, stored_hash, password)
@@ -0,0 +1,263 @@
+import logging
+from collections import namedtuple
+from datetime import date
+import click
+import numpy as np
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.db.bulk import bulk_upsert
+from app.db.dialect import on_conflict_update
+from app.db.session import SessionLocal
+from app.services.agency import agency_option, current_agency_id
+
+log = logging.getLogger(__name__)
+
+COMPONENTS = ("deposit_amount", "refill_amount", "document_charge", "installation_charge", "regulator_charge")
+
+# How much of each price component is charged per issued cylinder, by issue category.
+# Columns: regular refill, new connection (NC), double bottle connection (DBC), TV-out refund.
+COMPONENT_WEIGHTS = np.array([
+    [0, 1, 1, 1],  # deposit
+    [1, 1, 1, 0],  # refill
+    [0, 1, 1, 0],  # document charge
+    [0, 1, 1, 0],  # installation charge
+    [0, 1, 0, 0],  # regulator (NC only)
+], dtype=float)
+
+ExpectedCash = namedtuple("ExpectedCash", "delivery_boy delivery_boy_id regular_amt nc_amt dbc_amt tv_refund final_expected")
+
+EXPECTED_COLUMNS = ("stock_day_id", "delivery_boy_id", "expected_amount", "regular_amt", "nc_amt", "dbc_amt", "tv_refund")
+
+
+def _components(row):
+    return [float(getattr(row, c) or 0) for c in COMPONENTS]
+
+
+class PriceBook:
+    """Per-type price component matrix with effective-dated revisions applied on top of price_nc_components.
+
+    A type is priced on a date when it has a price_nc_components row or a revision effective by then;
+    issues of unpriced types are left out of expected cash, as the old inner join on prices did.
+    """
+
+    def __init__(self, types, prices, revisions=()):
+        self.type_index = {t.cylinder_type_id: i for i, t in enumerate(types)}
+        self.base = np.zeros((len(types), len(COMPONENTS)))
+        self.base_priced = np.zeros(len(types), dtype=bool)
+        for type_id, row in prices.items():
+            if type_id in self.type_index:
+                self.base[self.type_index[type_id]] = _components(row)
+                self.base_priced[self.type_index[type_id]] = True
+        self.revisions = [(r.effective_from, self.type_index[r.cylinder_type_id], _components(r))
+                          for r in revisions if r.cylinder_type_id in self.type_index]
+        self._unit_cache = {}
+
+    def _priced_on(self, on_date):
+        key = str(on_date) if on_date is not None else None
+        if key not in self._unit_cache:
+            matrix = self.base.copy()
+            priced = self.base_priced.copy()
+            if on_date is not None:
+                for effective_from, idx, components in self.revisions:
+                    if str(effective_from) <= key:
+                        matrix[idx] = components
+                        priced[idx] = True
+            self._unit_cache[key] = (matrix @ COMPONENT_WEIGHTS, priced)
+        return self._unit_cache[key]
+
+    def unit_prices(self, on_date=None):
+        """(n_types, 4) matrix of amounts per cylinder for each category, as priced on the given date."""
+        return self._priced_on(on_date)[0]
+
+    def is_priced(self, type_ids, on_date=None):
+        """Boolean mask over type_ids: which types have a price on the given date."""
+        priced = self._priced_on(on_date)[1]
+        return np.array([t in self.type_index and priced[self.type_index[t]] for t in type_ids], dtype=bool)
+
+    def price_issues(self, type_ids, quantities, on_date=None):
+        """Amount per category for each issue row: quantities is (n_rows, 4), type_ids (n_rows,)."""
+        index = np.array([self.type_index.get(t, -1) for t in type_ids], dtype=int)
+        units = self.unit_prices(on_date)
+        row_units = np.where((index >= 0)[:, None], units[np.maximum(index, 0)], 0.0)
+        return quantities * row_units
+
+
+ISSUES_SQL = """
+    SELECT di.stock_day_id, sd.stock_date, di.delivery_boy_id, di.cylinder_type_id,
+           di.regular_qty, di.nc_qty, di.dbc_qty, di.tv_out_qty
+    FROM delivery_issues di
+    JOIN stock_days sd ON sd.stock_day_id = di.stock_day_id
+    WHERE sd.agency_id = :agency AND {where}
+"""
+DAY_ISSUES_WHERE = "di.stock_day_id = :s_id"
+
+
+def _load_issues(db, where, params):
+    params = {**params, "agency": current_agency_id()}
+    return db.execute(text(ISSUES_SQL.format(where=where)), params).fetchall()
+
+
+def _totals_by_key(issues, master, key_fn):
+    """Price every issue row in one vectorized pass and sum the category amounts per key.
+
+    Rows whose cylinder type has no price on their day are skipped (and logged), so a key with only
+    such rows gets no total at all.
+    """
+    if not issues:
+        return {}
+    quantities = np.array([[r.regular_qty or 0, r.nc_qty or 0, r.dbc_qty or 0, r.tv_out_qty or 0]
+                           for r in issues], dtype=float)
+    amounts = np.zeros_like(quantities)
+    priced = np.ones(len(issues), dtype=bool)
+    by_date = {}
+    for i, r in enumerate(issues):
+        by_date.setdefault(str(r.stock_date), []).append(i)
+    for on_date, rows in by_date.items():
+        rows = np.array(rows)
+        type_ids = [issues[i].cylinder_type_id for i in rows]
+        amounts[rows] = master.price_book.price_issues(type_ids, quantities[rows], on_date)
+        priced[rows] = master.price_book.is_priced(type_ids, on_date)
+
+    if not priced.all():
+        missing = sorted({issues[i].cylinder_type_id for i in np.flatnonzero(~priced)})
+        log.warning("No price for cylinder type(s) %s: their issues are left out of expected cash", missing)
+        issues = [r for r, ok in zip(issues, priced) if ok]
+        amounts = amounts[priced]
+        if not issues:
+            return {}
+
+    keys = [key_fn(r) for r in issues]
+    unique_keys = list(dict.fromkeys(keys))
+    key_index = {k: i for i, k in enumerate(unique_keys)}
+    totals = np.zeros((len(unique_keys), 4))
+    np.add.at(totals, np.array([key_index[k] for k in keys]), amounts)
+    return {k: totals[key_index[k]] for k in unique_keys}
+
+
+def _expected_row(master, boy_id, amounts):
+    reg, nc, dbc, tv = (round(float(a), 2) for a in amounts)
+    boy = master.boys_by_id.get(boy_id)
+    return ExpectedCash(boy.name if boy else str(boy_id), boy_id, reg, nc, dbc, tv, round(reg + nc + dbc - tv, 2))
+
+
+def compute_expected(db, s_id, master):
+    """Expected cash per delivery boy for one day, priced in Python from the cached price book."""
+    issues = _load_issues(db, DAY_ISSUES_WHERE, {"s_id": s_id})
+    totals = _totals_by_key(issues, master, lambda r: r.delivery_boy_id)
+    rows = [_expected_row(master, boy_id, amounts) for boy_id, amounts in totals.items()]
+    return sorted(rows, key=lambda r: r.delivery_boy)
+
+
+SAVED_EXPECTED_SQL = text("""
+    SELECT b.name AS delivery_boy, dea.delivery_boy_id, dea.regular_amt, dea.nc_amt, dea.dbc_amt,
+           dea.tv_refund, dea.expected_amount AS final_expected
+    FROM delivery_expected_amount dea
+    JOIN delivery_boys b ON b.delivery_boy_id = dea.delivery_boy_id
+    WHERE dea.stock_day_id = :s_id
+    ORDER BY b.name
+""")
+
+
+def load_saved_expected(db, s_id):
+    """Saved expected amounts and breakdown for a day (breakdown is NULL on rows saved before it was stored)."""
+    rows = db.execute(SAVED_EXPECTED_SQL, {"s_id": s_id}).fetchall()
+    return rows
+
+
+def save_expected(db, s_id, rows):
+    bulk_upsert(db, "delivery_expected_amount", EXPECTED_COLUMNS, [{
+        "stock_day_id": s_id, "delivery_boy_id": r.delivery_boy_id, "expected_amount": r.final_expected,
+        "regular_amt": r.regular_amt, "nc_amt": r.nc_amt, "dbc_amt": r.dbc_amt, "tv_refund": r.tv_refund,
+    } for r in rows], EXPECTED_COLUMNS[2:])
+
+
+def load_issues_between(db, start, end=None):
+    """Issue rows (with their stock_date) for every day from start, up to end when given."""
+    if end is None:
+        return _load_issues(db, "sd.stock_date >= :start", {"start": start})
+    return _load_issues(db, "sd.stock_date BETWEEN :start AND :end", {"start": start, "end": end})
+
+
+def expected_rows_by_day(issues, master):
+    """delivery_expected_amount rows keyed by (stock_day_id, boy_id), priced from already-loaded issues."""
+    totals = _totals_by_key(issues, master, lambda r: (r.stock_day_id, r.delivery_boy_id))
+    rows = {}
+    for (s_id, boy_id), amounts in totals.items():
+        r = _expected_row(master, boy_id, amounts)
+        rows[(s_id, boy_id)] = {"stock_day_id": s_id, "delivery_boy_id": boy_id, "expected_amount": r.final_expected,
+                                "regular_amt": r.regular_amt, "nc_amt": r.nc_amt, "dbc_amt": r.dbc_amt,
+                                "tv_refund": r.tv_refund}
+    return rows
+
+
+def reprice_days(db, master, start, end):
+    """Re-price every day in [start, end] that already has expected amounts, in one read and one batched write."""
+    issues = _load_issues(db, """sd.stock_date BETWEEN :start AND :end AND di.stock_day_id IN (
+        SELECT stock_day_id FROM delivery_expected_amount)""", {"start": start, "end": end})
+    rows = list(expected_rows_by_day(issues, master).values())
+    if rows:
+        bulk_upsert(db, "delivery_expected_amount", EXPECTED_COLUMNS, rows, EXPECTED_COLUMNS[2:])
+    db.commit()
+    return len({r["stock_day_id"] for r in rows})
+
+
+@click.command("reprice-days")
+@agency_option
+@click.option("--start", required=True, help="First stock date (YYYY-MM-DD).")
+@click.option("--end", required=True, help="Last stock date (YYYY-MM-DD).")
+@with_appcontext
+def reprice_days_command(start, end):
+    """Recompute saved expected cash for a date range with the prices effective on each day."""
+    from app.services.master_data import get_master_data
+    db = SessionLocal()
+    try:
+        days = reprice_days(db, get_master_data(db), date.fromisoformat(start), date.fromisoformat(end))
+        click.echo(f"Re-priced {days} day(s).")
+    finally:
+        db.close()
+
+
+def save_price_revision(db, type_code, effective_from, amounts):
+    """Insert (or replace) a type's prices effective from a date and bump master data in the same transaction.
+
+    amounts maps component name -> amount; components left out are stored as 0 (regulator as NULL).
+    """
+    from app.services.master_data import bump_master_data_version
+    type_id = db.execute(text("SELECT cylinder_type_id FROM cylinder_types WHERE agency_id = :agency AND code = :c"),
+                         {"agency": current_agency_id(), "c": type_code.strip().upper()}).scalar()
+    if type_id is None:
+        raise ValueError(f"Unknown cylinder type '{type_code}'")
+    values = {c: amounts.get(c, None if c == "regulator_charge" else 0) for c in COMPONENTS}
+    db.execute(text(f"""
+        INSERT INTO price_nc_revisions (cylinder_type_id, effective_from, {", ".join(COMPONENTS)})
+        VALUES (:t, :f, {", ".join(":" + c for c in COMPONENTS)})
+        {on_conflict_update(db, "price_nc_revisions", COMPONENTS)}
+    """), {"t": type_id, "f": effective_from, **values})
+    bump_master_data_version(db)
+    db.commit()
+    return type_id
+
+
+@click.command("add-price-revision")
+@agency_option
+@click.argument("type_code")
+@click.option("--from", "effective_from", required=True, help="First stock date the prices apply to (YYYY-MM-DD).")
+@click.option("--deposit", type=float, default=0, help="Deposit amount.")
+@click.option("--refill", type=float, default=0, help="Refill amount.")
+@click.option("--document", type=float, default=0, help="Document charge.")
+@click.option("--installation", type=float, default=0, help="Installation charge.")
+@click.option("--regulator", type=float, default=None, help="Regulator charge (NC only).")
+@with_appcontext
+def add_price_revision_command(type_code, effective_from, deposit, refill, document, installation, regulator):
+    """Record new prices for a cylinder type from a date on; saved days keep their amounts until reprice-days."""
+    from app.services.master_data import invalidate_master_data
+    amounts = dict(zip(COMPONENTS, (deposit, refill, document, installation, regulator)))
+    db = SessionLocal()
+    try:
+        save_price_revision(db, type_code, date.fromisoformat(effective_from), amounts)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        db.close()
+    invalidate_master_data()
+    click.echo(f"{type_code.upper()} priced from {effective_from}; run reprice-days to update saved days.")
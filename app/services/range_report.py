@@ -0,0 +1,125 @@
+import io
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from app.services.agency import current_agency_id
+
+# Period -> pandas Grouper frequency; weeks run Monday to Sunday and are labelled by their Monday
+PERIODS = {"day": "D", "week": "W-MON", "month": "MS", "year": "YS"}
+
+STOCK_MOVEMENT_COLS = ["item_receipt", "item_return", "sales_regular", "nc_qty", "dbc_qty", "tv_out_qty"]
+CASH_FLOW_COLS = ["today_expected", "today_deposited"]
+
+
+def load_stock_frame(db, start, end):
+    """Every daily_stock_summary row in the range, in one query."""
+    return pd.read_sql(text("""
+        SELECT sd.stock_date, t.code AS cylinder_type,
+               COALESCE(s.opening_filled, 0) AS opening_filled, COALESCE(s.opening_empty, 0) AS opening_empty,
+               s.item_receipt, s.item_return, s.sales_regular, s.nc_qty, s.dbc_qty, s.tv_out_qty,
+               COALESCE(s.closing_filled, 0) AS closing_filled, COALESCE(s.closing_empty, 0) AS closing_empty
+        FROM daily_stock_summary s
+        JOIN stock_days sd ON sd.stock_day_id = s.stock_day_id
+        JOIN cylinder_types t ON t.cylinder_type_id = s.cylinder_type_id
+        WHERE sd.agency_id = :agency AND sd.stock_date BETWEEN :start AND :end AND sd.status = 'CLOSED'
+    """), db.connection(), params={"agency": current_agency_id(), "start": start, "end": end}, parse_dates=["stock_date"])
+
+
+def load_cash_frame(db, start, end):
+    """Every delivery_cash_balance row in the range, in one query."""
+    return pd.read_sql(text("""
+        SELECT sd.stock_date, b.name AS delivery_boy,
+               c.opening_balance, c.today_expected, c.today_deposited, c.closing_balance
+        FROM delivery_cash_balance c
+        JOIN stock_days sd ON sd.stock_day_id = c.stock_day_id
+        JOIN delivery_boys b ON b.delivery_boy_id = c.delivery_boy_id
+        WHERE sd.agency_id = :agency AND sd.stock_date BETWEEN :start AND :end AND sd.status = 'CLOSED'
+    """), db.connection(), params={"agency": current_agency_id(), "start": start, "end": end}, parse_dates=["stock_date"])
+
+
+def _period_grouper(period):
+    if period == "week":
+        return pd.Grouper(key="stock_date", freq=PERIODS[period], label="left", closed="left")
+    return pd.Grouper(key="stock_date", freq=PERIODS[period])
+
+
+def _with_totals(df):
+    df = df.copy()
+    df["total_sales"] = np.add.reduce([df["sales_regular"].to_numpy(), df["nc_qty"].to_numpy(),
+                                       df["dbc_qty"].to_numpy()])
+    return df
+
+
+def aggregate_stock(stock, period="month"):
+    """Per cylinder type over the whole range, per period x type, and day totals across types."""
+    stock = stock.sort_values(["stock_date", "cylinder_type"])
+    for col in STOCK_MOVEMENT_COLS:
+        stock[col] = stock[col].fillna(0).astype("int64")
+
+    by_type = stock.groupby("cylinder_type").agg(
+        opening_filled=("opening_filled", "first"),
+        opening_empty=("opening_empty", "first"),
+        **{col: (col, "sum") for col in STOCK_MOVEMENT_COLS},
+        closing_filled=("closing_filled", "last"),
+        closing_empty=("closing_empty", "last"),
+        days=("stock_date", "nunique"),
+    ).reset_index()
+    by_type = _with_totals(by_type)
+
+    by_period = (stock.groupby([_period_grouper(period), "cylinder_type"])
+                 [STOCK_MOVEMENT_COLS].sum().reset_index()
+                 .rename(columns={"stock_date": "period_start"}))
+    by_period = _with_totals(by_period)
+
+    daily = _with_totals(stock.groupby("stock_date")[STOCK_MOVEMENT_COLS].sum().reset_index())
+    return by_type, by_period, daily
+
+
+def aggregate_cash(cash, period="month"):
+    """Per delivery boy over the whole range, and per period x boy."""
+    cash = cash.sort_values(["stock_date", "delivery_boy"])
+    for col in ["opening_balance", "closing_balance"] + CASH_FLOW_COLS:
+        cash[col] = cash[col].astype("float64").fillna(0.0)
+
+    by_boy = cash.groupby("delivery_boy").agg(
+        opening_balance=("opening_balance", "first"),
+        today_expected=("today_expected", "sum"),
+        today_deposited=("today_deposited", "sum"),
+        closing_balance=("closing_balance", "last"),
+        days=("stock_date", "nunique"),
+    ).reset_index().rename(columns={"today_expected": "expected", "today_deposited": "deposited"})
+    expected, deposited = by_boy["expected"].to_numpy(), by_boy["deposited"].to_numpy()
+    # Blank (NaN) for boys with nothing expected, without dividing by zero
+    by_boy["collection_rate"] = np.divide(deposited, expected, out=np.full(len(by_boy), np.nan), where=expected > 0)
+
+    grouped = cash.groupby([_period_grouper(period), "delivery_boy"])
+    by_period = grouped.agg(
+        expected=("today_expected", "sum"),
+        deposited=("today_deposited", "sum"),
+        closing_balance=("closing_balance", "last"),
+    ).reset_index().rename(columns={"stock_date": "period_start"})
+    return by_boy, by_period
+
+
+def build_range_report(db, start, end, period="month"):
+    """Return {sheet_name: DataFrame} for a date-range statement."""
+    stock_by_type, stock_by_period, daily_totals = aggregate_stock(load_stock_frame(db, start, end), period)
+    cash_by_boy, cash_by_period = aggregate_cash(load_cash_frame(db, start, end), period)
+
+    return {
+        "Stock_By_Type": stock_by_type,
+        f"Stock_By_{period.title()}": stock_by_period,
+        "Daily_Totals": daily_totals,
+        "Cash_By_Boy": cash_by_boy,
+        f"Cash_By_{period.title()}": cash_by_period,
+    }
+
+
+def report_workbook(sheets):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter", date_format="yyyy-mm-dd",
+                        datetime_format="yyyy-mm-dd") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, index=False, sheet_name=name)
+    output.seek(0)
+    return output
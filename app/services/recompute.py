@@ -0,0 +1,455 @@
+"""Cascade recompute after a correction to a past stock day.
+
+Every table that chains from one day to the next (opening stock, vehicle empties, cash balances and
+their maintained current-state tables) is loaded once from the start day onwards into (day, boy, type)
+arrays, replayed day by day in memory with the same formulas the step pages use, diffed against what
+is stored, and written back in one batch of upserts.
+"""
+import math
+import time
+from collections import namedtuple
+from datetime import date
+import click
+import numpy as np
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.db.bulk import bulk_upsert
+from app.db.session import SessionLocal
+from app.services.agency import agency_option, current_agency_id
+from app.services.closing_stock import compute_closing
+from app.services.master_data import get_master_data
+from app.services.pricing import EXPECTED_COLUMNS, load_issues_between, expected_rows_by_day
+from app.services.rollups import month_start, rebuild_month
+from app.services.vehicle_stock import VEHICLE_COLUMNS, BALANCE_COLUMNS, get_balances_as_of
+
+Change = namedtuple("Change", "table key column old new")
+
+SUMMARY_COLUMNS = ("opening_filled", "opening_empty", "defective_empty_vehicle", "item_receipt", "item_return",
+                   "sales_regular", "nc_qty", "dbc_qty", "tv_out_qty", "closing_filled", "closing_empty",
+                   "total_stock", "is_reconciled")
+# Columns the replay may change (inputs like IOCL receipts are left alone)
+SUMMARY_WRITE_COLUMNS = ("opening_filled", "opening_empty", "defective_empty_vehicle", "sales_regular", "nc_qty",
+                         "dbc_qty", "tv_out_qty", "closing_filled", "closing_empty", "total_stock")
+CASH_COLUMNS = ("opening_balance", "today_expected", "today_deposited", "closing_balance")
+CASH_WRITE_COLUMNS = ("stock_day_id", "delivery_boy_id") + CASH_COLUMNS + ("balance_status",)
+CARRY_COLUMNS = ("delivery_boy_id", "opening_balance", "stock_day_id")
+AMOUNT_KEYS = ("regular_amt", "nc_amt", "dbc_amt", "tv_refund")
+
+
+class Chain:
+    """Stored state from the day before `start` through the latest day, as dense arrays.
+
+    Axis 0 is the day (position 0 is the seed day before start when there is one), then boy, then type.
+    Missing rows are NaN; `has_*` masks say which rows exist.
+    """
+
+    def __init__(self, days, first, boys, types):
+        self.days = days
+        self.first = first
+        self.day_index = {d.stock_day_id: i for i, d in enumerate(days)}
+        self.boy_ids = [b.delivery_boy_id for b in boys]
+        self.type_ids = [t.cylinder_type_id for t in types]
+        self.boy_index = {b: i for i, b in enumerate(self.boy_ids)}
+        self.type_index = {t: i for i, t in enumerate(self.type_ids)}
+        n, nb, nt = len(days), len(boys), len(types)
+
+        self.summary = {c: np.full((n, nt), np.nan) for c in SUMMARY_COLUMNS}
+        self.issues = np.zeros((n, nb, nt, 4))
+        self.empty = np.full((n, nb, nt), np.nan)
+        self.returned = np.full((n, nb, nt), np.nan)
+        self.cash = {c: np.full((n, nb), np.nan) for c in CASH_COLUMNS}
+        self.status = np.full((n, nb), None, dtype=object)
+        self.expected = np.full((n, nb, 4), np.nan)
+        self.expected_total = np.full((n, nb), np.nan)
+        self.deposited = np.zeros((n, nb))
+        self.vehicle_start = np.zeros((nb, nt))
+        self.cash_start = np.zeros(nb)
+
+    @property
+    def has_summary(self):
+        return ~np.isnan(self.summary["item_receipt"])
+
+    @property
+    def has_vehicle(self):
+        return ~np.isnan(self.empty)
+
+    @property
+    def has_cash(self):
+        return ~np.isnan(self.cash["closing_balance"])
+
+    @property
+    def has_expected(self):
+        return ~np.isnan(self.expected_total)
+
+
+def _value(v):
+    return np.nan if v is None else float(v)
+
+
+def load_chain(db, start, master):
+    agency_id = current_agency_id()
+    days = db.execute(text("""
+        SELECT stock_day_id, stock_date, status FROM stock_days
+        WHERE agency_id = :agency AND stock_date >= COALESCE(
+            (SELECT MAX(stock_date) FROM stock_days WHERE agency_id = :agency AND stock_date < :start), :start)
+        ORDER BY stock_date
+    """), {"agency": agency_id, "start": start}).fetchall()
+    if not days:
+        return None
+    first = 1 if str(days[0].stock_date) < str(start) else 0
+    chain = Chain(days, first, master.boys, master.types)
+    since = days[0].stock_date
+    params = {"agency": agency_id, "since": since}
+
+    for r in db.execute(text("""
+        SELECT s.* FROM daily_stock_summary s JOIN stock_days sd ON sd.stock_day_id = s.stock_day_id
+        WHERE sd.agency_id = :agency AND sd.stock_date >= :since
+    """), params):
+        t = chain.type_index.get(r.cylinder_type_id)
+        if t is not None:
+            i = chain.day_index[r.stock_day_id]
+            for c in SUMMARY_COLUMNS:
+                chain.summary[c][i, t] = _value(getattr(r, c))
+
+    chain.issue_rows = load_issues_between(db, since)
+    for r in chain.issue_rows:
+        b, t = chain.boy_index.get(r.delivery_boy_id), chain.type_index.get(r.cylinder_type_id)
+        if b is not None and t is not None:
+            chain.issues[chain.day_index[r.stock_day_id], b, t] = [
+                r.regular_qty or 0, r.nc_qty or 0, r.dbc_qty or 0, r.tv_out_qty or 0]
+
+    for r in db.execute(text("""
+        SELECT v.stock_day_id, v.delivery_boy_id, v.cylinder_type_id, v.empty_qty, v.returned_qty
+        FROM delivery_vehicle_empty_stock v JOIN stock_days sd ON sd.stock_day_id = v.stock_day_id
+        WHERE sd.agency_id = :agency AND sd.stock_date >= :since
+    """), params):
+        b, t = chain.boy_index.get(r.delivery_boy_id), chain.type_index.get(r.cylinder_type_id)
+        if b is not None and t is not None:
+            i = chain.day_index[r.stock_day_id]
+            chain.empty[i, b, t] = r.empty_qty or 0
+            chain.returned[i, b, t] = _value(r.returned_qty)
+
+    for r in db.execute(text("""
+        SELECT c.* FROM delivery_cash_balance c JOIN stock_days sd ON sd.stock_day_id = c.stock_day_id
+        WHERE sd.agency_id = :agency AND sd.stock_date >= :since
+    """), params):
+        b = chain.boy_index.get(r.delivery_boy_id)
+        if b is not None:
+            i = chain.day_index[r.stock_day_id]
+            for c in CASH_COLUMNS:
+                chain.cash[c][i, b] = _value(getattr(r, c))
+            chain.status[i, b] = r.balance_status
+
+    for r in db.execute(text("""
+        SELECT e.* FROM delivery_expected_amount e JOIN stock_days sd ON sd.stock_day_id = e.stock_day_id
+        WHERE sd.agency_id = :agency AND sd.stock_date >= :since
+    """), params):
+        b = chain.boy_index.get(r.delivery_boy_id)
+        if b is not None:
+            i = chain.day_index[r.stock_day_id]
+            chain.expected[i, b] = [_value(getattr(r, k)) for k in AMOUNT_KEYS]
+            chain.expected_total[i, b] = float(r.expected_amount or 0)
+
+    for r in db.execute(text("""
+        SELECT d.stock_day_id, d.delivery_boy_id, d.total_deposited
+        FROM delivery_cash_deposit d JOIN stock_days sd ON sd.stock_day_id = d.stock_day_id
+        WHERE sd.agency_id = :agency AND sd.stock_date >= :since
+    """), params):
+        b = chain.boy_index.get(r.delivery_boy_id)
+        if b is not None:
+            chain.deposited[chain.day_index[r.stock_day_id], b] = float(r.total_deposited or 0)
+
+    if first:
+        seed_id = days[0].stock_day_id
+        # Vehicle balances as they stood after the seed day (its own rows are in the arrays as well)
+        for (b_id, t_id), qty in get_balances_as_of(db, seed_id).items():
+            b, t = chain.boy_index.get(b_id), chain.type_index.get(t_id)
+            if b is not None and t is not None:
+                chain.vehicle_start[b, t] = qty
+        # Each boy's last CLOSED closing balance on or before the seed day
+        for r in db.execute(text("""
+            SELECT c.delivery_boy_id, c.closing_balance
+            FROM delivery_cash_balance c
+            JOIN stock_days sd ON sd.stock_day_id = c.stock_day_id
+            JOIN (
+                SELECT c2.delivery_boy_id, MAX(sd2.stock_date) AS last_date
+                FROM delivery_cash_balance c2
+                JOIN stock_days sd2 ON sd2.stock_day_id = c2.stock_day_id
+                WHERE sd2.agency_id = :agency AND sd2.status = 'CLOSED' AND sd2.stock_date <= :since
+                GROUP BY c2.delivery_boy_id
+            ) l ON l.delivery_boy_id = c.delivery_boy_id AND l.last_date = sd.stock_date
+            WHERE sd.agency_id = :agency
+        """), params):
+            b = chain.boy_index.get(r.delivery_boy_id)
+            if b is not None:
+                chain.cash_start[b] = float(r.closing_balance or 0)
+    return chain
+
+
+class Replay:
+    """Recomputed copies of the chain's arrays plus the end-of-chain state tables."""
+
+    def __init__(self, chain):
+        self.summary = {c: a.copy() for c, a in chain.summary.items()}
+        self.empty = chain.empty.copy()
+        self.returned = chain.returned.copy()
+        self.cash = {c: a.copy() for c, a in chain.cash.items()}
+        self.status = chain.status.copy()
+        self.expected = chain.expected.copy()
+        self.expected_total = chain.expected_total.copy()
+        nb, nt = chain.empty.shape[1:]
+        self.vehicle = chain.vehicle_start.copy()
+        self.vehicle_prev = np.zeros((nb, nt))
+        self.vehicle_day = np.full((nb, nt), -1)
+        self.carry = chain.cash_start.copy()
+        self.carry_day = np.full(nb, -1)
+
+
+def _reprice(chain, replay, master):
+    # Only days whose expected cash was already saved are re-priced (as reprice-days does)
+    priced = expected_rows_by_day([r for r in chain.issue_rows
+                                   if chain.day_index[r.stock_day_id] >= chain.first], master)
+    days_with_expected = chain.has_expected.any(axis=1)
+    for i in range(chain.first, len(chain.days)):
+        if not days_with_expected[i]:
+            continue
+        s_id = chain.days[i].stock_day_id
+        for b, boy_id in enumerate(chain.boy_ids):
+            row = priced.get((s_id, boy_id))
+            if row is None and not chain.has_expected[i, b]:
+                continue
+            replay.expected[i, b] = [row[k] for k in AMOUNT_KEYS] if row else 0.0
+            replay.expected_total[i, b] = row["expected_amount"] if row else 0.0
+
+
+def replay_chain(chain, master):
+    r = Replay(chain)
+    _reprice(chain, r, master)
+    s = r.summary
+    has_summary = chain.has_summary
+    has_vehicle = chain.has_vehicle
+    has_cash = chain.has_cash
+    old_vehicle = chain.vehicle_start.copy()
+
+    for i in range(len(chain.days)):
+        if i < chain.first:
+            continue
+        prev = i - 1
+
+        # 1. Vehicle empties: new balance = previous balance + yesterday's regular issues - returned
+        vm = has_vehicle[i]
+        if vm.any():
+            expected = chain.issues[prev, :, :, 0] if prev >= 0 else np.zeros_like(r.vehicle)
+            # Rows saved before returned_qty existed fall back to what the stored chain implies
+            returned = np.where(np.isnan(chain.returned[i]), old_vehicle + expected - chain.empty[i], chain.returned[i])
+            new = r.vehicle + expected - returned
+            r.empty[i][vm] = new[vm]
+            r.returned[i][vm] = returned[vm]
+            r.vehicle_prev[vm] = r.vehicle[vm]
+            r.vehicle[vm] = new[vm]
+            r.vehicle_day[vm] = i
+            old_vehicle[vm] = chain.empty[i][vm]
+
+        # 2. Opening stock from the previous day's closing (reconcile_view / confirm_all_returned)
+        if prev >= 0:
+            tm = has_summary[i] & has_summary[prev] & ~np.isnan(s["closing_filled"][prev])
+            vsum = np.where(vm, r.empty[i], 0).sum(axis=0)
+            prev_empty = s["closing_empty"][prev] + s["defective_empty_vehicle"][prev]
+            s["opening_filled"][i][tm] = s["closing_filled"][prev][tm]
+            if vm.any():
+                s["defective_empty_vehicle"][i][tm] = vsum[tm]
+                s["opening_empty"][i][tm] = (prev_empty - vsum)[tm]
+            else:
+                s["defective_empty_vehicle"][i][tm] = s["defective_empty_vehicle"][prev][tm]
+                s["opening_empty"][i][tm] = s["closing_empty"][prev][tm]
+
+        # 3. Closing stock on finalized rows (closing_stock.closing_view formulas)
+        cm = has_summary[i] & (chain.summary["is_reconciled"][i] == 1)
+        if cm.any():
+            totals = chain.issues[i].sum(axis=0)
+            closing = compute_closing(s["opening_filled"][i], s["opening_empty"][i], s["defective_empty_vehicle"][i],
+                                      s["item_receipt"][i], s["item_return"][i], totals)
+            closing.update(zip(("sales_regular", "nc_qty", "dbc_qty", "tv_out_qty"), totals.T))
+            for col, value in closing.items():
+                s[col][i][cm] = value[cm]
+
+        # 4. Cash: opening = last closed closing, closing = opening + expected - deposited
+        bm = has_cash[i]
+        if bm.any():
+            expected = np.nan_to_num(r.expected_total[i])
+            closing = np.round(r.carry + expected - chain.deposited[i], 2)
+            r.cash["opening_balance"][i][bm] = r.carry[bm]
+            r.cash["today_expected"][i][bm] = expected[bm]
+            r.cash["today_deposited"][i][bm] = chain.deposited[i][bm]
+            r.cash["closing_balance"][i][bm] = closing[bm]
+            r.status[i][bm] = np.where(closing[bm] == 0, "SETTLED", "PENDING")
+            if chain.days[i].status == "CLOSED":
+                r.carry[bm] = closing[bm]
+                r.carry_day[bm] = i
+    return r
+
+
+def _differs(old, new):
+    if old is None or new is None:
+        return (old is None) != (new is None)
+    if isinstance(old, float) and math.isnan(old):
+        return not (isinstance(new, float) and math.isnan(new))
+    if isinstance(old, float) or isinstance(new, float):
+        return round(float(old) - float(new), 2) != 0
+    return old != new
+
+
+def _out(v):
+    if isinstance(v, (float, np.floating)):
+        v = float(v)
+        if math.isnan(v):
+            return None
+        return int(v) if v.is_integer() else round(v, 2)
+    return v
+
+
+def diff_chain(db, chain, replay):
+    """Compare the replay with the stored rows. Returns (changes, {table: [row dicts to upsert]})."""
+    changes, writes = [], {}
+    day_ids = [d.stock_day_id for d in chain.days]
+
+    def collect(table, key, columns, old_values, new_values, row):
+        changed = False
+        for col, old, new in zip(columns, old_values, new_values):
+            if _differs(old, new):
+                changes.append(Change(table, key, col, _out(old), _out(new)))
+                changed = True
+        if changed:
+            writes.setdefault(table, []).append(row)
+
+    for i, t in zip(*np.nonzero(chain.has_summary)):
+        if i < chain.first:
+            continue
+        key = (day_ids[i], chain.type_ids[t])
+        row = {"stock_day_id": key[0], "cylinder_type_id": key[1]}
+        row.update({c: _out(replay.summary[c][i, t]) for c in SUMMARY_COLUMNS})
+        collect("daily_stock_summary", key, SUMMARY_WRITE_COLUMNS,
+                [float(chain.summary[c][i, t]) for c in SUMMARY_WRITE_COLUMNS],
+                [float(replay.summary[c][i, t]) for c in SUMMARY_WRITE_COLUMNS], row)
+
+    for i, b, t in zip(*np.nonzero(chain.has_vehicle)):
+        if i < chain.first:
+            continue
+        key = (day_ids[i], chain.boy_ids[b], chain.type_ids[t])
+        row = dict(zip(VEHICLE_COLUMNS, key + (_out(replay.empty[i, b, t]), _out(replay.returned[i, b, t]))))
+        collect("delivery_vehicle_empty_stock", key, ("empty_qty", "returned_qty"),
+                [float(chain.empty[i, b, t]), float(chain.returned[i, b, t])],
+                [float(replay.empty[i, b, t]), float(replay.returned[i, b, t])], row)
+
+    for i, b in zip(*np.nonzero(~np.isnan(replay.expected_total))):
+        if i < chain.first:
+            continue
+        key = (day_ids[i], chain.boy_ids[b])
+        row = dict(zip(EXPECTED_COLUMNS, key + (_out(replay.expected_total[i, b]),)
+                       + tuple(_out(v) for v in replay.expected[i, b])))
+        collect("delivery_expected_amount", key, ("expected_amount",) + AMOUNT_KEYS,
+                [float(chain.expected_total[i, b])] + [float(v) for v in chain.expected[i, b]],
+                [float(replay.expected_total[i, b])] + [float(v) for v in replay.expected[i, b]], row)
+
+    for i, b in zip(*np.nonzero(chain.has_cash)):
+        if i < chain.first:
+            continue
+        key = (day_ids[i], chain.boy_ids[b])
+        row = dict(zip(CASH_WRITE_COLUMNS, key + tuple(_out(replay.cash[c][i, b]) for c in CASH_COLUMNS)
+                       + (replay.status[i, b],)))
+        collect("delivery_cash_balance", key, CASH_COLUMNS + ("balance_status",),
+                [float(chain.cash[c][i, b]) for c in CASH_COLUMNS] + [chain.status[i, b]],
+                [float(replay.cash[c][i, b]) for c in CASH_COLUMNS] + [replay.status[i, b]], row)
+
+    # Maintained current-state tables, for the pairs / boys whose last row lies in the replayed range
+    agency = {"agency": current_agency_id()}
+    stored = {(r.delivery_boy_id, r.cylinder_type_id): r for r in db.execute(text("""
+        SELECT vb.* FROM delivery_vehicle_balance vb
+        JOIN delivery_boys db ON db.delivery_boy_id = vb.delivery_boy_id
+        WHERE db.agency_id = :agency
+    """), agency)}
+    for b, t in zip(*np.nonzero(replay.vehicle_day >= 0)):
+        key = (chain.boy_ids[b], chain.type_ids[t])
+        new = (day_ids[replay.vehicle_day[b, t]], _out(replay.vehicle[b, t]), _out(replay.vehicle_prev[b, t]))
+        old = stored.get(key)
+        old = (old.stock_day_id, old.empty_qty, old.prev_empty_qty) if old else (None, None, None)
+        collect("delivery_vehicle_balance", key, BALANCE_COLUMNS[2:], old, new,
+                dict(zip(BALANCE_COLUMNS, key + new)))
+
+    stored = {r.delivery_boy_id: r for r in db.execute(text("""
+        SELECT cf.* FROM delivery_cash_carry_forward cf
+        JOIN delivery_boys db ON db.delivery_boy_id = cf.delivery_boy_id
+        WHERE db.agency_id = :agency
+    """), agency)}
+    for b in np.nonzero(replay.carry_day >= 0)[0]:
+        boy_id = chain.boy_ids[b]
+        new = (_out(replay.carry[b]), day_ids[replay.carry_day[b]])
+        old = stored.get(boy_id)
+        old = (float(old.opening_balance), old.stock_day_id) if old else (None, None)
+        collect("delivery_cash_carry_forward", (boy_id,), CARRY_COLUMNS[1:], old, new,
+                dict(zip(CARRY_COLUMNS, (boy_id,) + new)))
+
+    return changes, writes
+
+
+WRITE_PLAN = (
+    ("daily_stock_summary", ("stock_day_id", "cylinder_type_id") + SUMMARY_COLUMNS, SUMMARY_WRITE_COLUMNS),
+    ("delivery_vehicle_empty_stock", VEHICLE_COLUMNS, VEHICLE_COLUMNS[3:]),
+    ("delivery_expected_amount", EXPECTED_COLUMNS, EXPECTED_COLUMNS[2:]),
+    ("delivery_cash_balance", CASH_WRITE_COLUMNS, CASH_WRITE_COLUMNS[2:]),
+    ("delivery_vehicle_balance", BALANCE_COLUMNS, BALANCE_COLUMNS[2:]),
+    ("delivery_cash_carry_forward", CARRY_COLUMNS, CARRY_COLUMNS[1:]),
+)
+
+
+def recompute_from(db, start, dry_run=False):
+    """Replay every day from `start` to the latest and write the differences in one transaction.
+
+    Returns (changes, days replayed). With dry_run nothing is written.
+    """
+    master = get_master_data(db)
+    chain = load_chain(db, start, master)
+    if chain is None:
+        return [], 0
+    replay = replay_chain(chain, master)
+    changes, writes = diff_chain(db, chain, replay)
+
+    if not dry_run and writes:
+        for table, columns, update_columns in WRITE_PLAN:
+            if writes.get(table):
+                bulk_upsert(db, table, columns, writes[table], update_columns)
+        # Closed months touched by the replay are re-summed from the corrected days
+        changed_days = {c.key[0] for c in changes if c.table in ("daily_stock_summary", "delivery_cash_balance")}
+        months = {month_start(date.fromisoformat(str(d.stock_date))) for d in chain.days
+                  if d.stock_day_id in changed_days and d.status == "CLOSED"}
+        for m in sorted(months):
+            rebuild_month(db, m)
+        db.commit()
+    return changes, len(chain.days) - chain.first
+
+
+@click.command("recompute-from")
+@agency_option
+@click.argument("start")
+@click.option("--dry-run", is_flag=True, help="Print the differences without writing them.")
+@click.option("--limit", default=50, show_default=True, help="Changes to print.")
+@with_appcontext
+def recompute_from_command(start, dry_run, limit):
+    """Replay stock, vehicle and cash chains from START (YYYY-MM-DD) through the latest day."""
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        changes, days = recompute_from(db, date.fromisoformat(start), dry_run=dry_run)
+        elapsed = time.perf_counter() - t0
+        for c in changes[:limit]:
+            click.echo(f"{c.table} {c.key} {c.column}: {c.old} -> {c.new}")
+        if len(changes) > limit:
+            click.echo(f"... {len(changes) - limit} more")
+        counts = {}
+        for c in changes:
+            counts[c.table] = counts.get(c.table, 0) + 1
+        summary = ", ".join(f"{t}: {n}" for t, n in counts.items()) or "no differences"
+        click.echo(f"{days} day(s) replayed in {elapsed:.2f}s - {summary}"
+                   f"{' (dry run, nothing written)' if dry_run else ''}.")
+    finally:
+        db.close()
@@ -0,0 +1,167 @@
+from datetime import date
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.db.dialect import inserted, on_conflict_update
+from app.db.session import SessionLocal
+from app.services.agency import agency_option, current_agency_id
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return date(day.year + (day.month == 12), day.month % 12 + 1, 1)
+
+
+def fold_day_into_rollups(db, s_id, stock_date):
+    """Add a closing day's stock and cash figures to its month's rollup rows. Call before commit.
+
+    The day's rolled_up marker is claimed first, so a day is only ever added once; returns False when
+    it was already folded (or rebuilt into its month).
+    """
+    claimed = db.execute(text("UPDATE stock_days SET rolled_up = 1 WHERE stock_day_id = :s_id AND rolled_up = 0"),
+                         {"s_id": s_id}).rowcount
+    if claimed != 1:
+        return False
+    m = month_start(_as_date(stock_date))
+    stock_sums = {c: f"{c} + {inserted(db, c)}"
+                  for c in ("sales_regular", "nc_qty", "dbc_qty", "tv_out_qty", "item_receipt", "item_return")}
+    db.execute(text(f"""
+        INSERT INTO monthly_stock_rollup
+            (month_start, cylinder_type_id, sales_regular, nc_qty, dbc_qty, tv_out_qty, item_receipt, item_return, days)
+        SELECT :m, cylinder_type_id, COALESCE(sales_regular, 0), COALESCE(nc_qty, 0), COALESCE(dbc_qty, 0),
+               COALESCE(tv_out_qty, 0), COALESCE(item_receipt, 0), COALESCE(item_return, 0), 1
+        FROM daily_stock_summary
+        WHERE stock_day_id = :s_id
+        {on_conflict_update(db, "monthly_stock_rollup", {**stock_sums, "days": "days + 1"})}
+    """), {"m": m, "s_id": s_id})
+    cash_sums = {"expected": f"expected + {inserted(db, 'expected')}",
+                 "deposited": f"deposited + {inserted(db, 'deposited')}",
+                 "outstanding": inserted(db, "outstanding"), "days": "days + 1"}
+    db.execute(text(f"""
+        INSERT INTO monthly_cash_rollup (month_start, delivery_boy_id, expected, deposited, outstanding, days)
+        SELECT :m, delivery_boy_id, COALESCE(today_expected, 0), COALESCE(today_deposited, 0),
+               COALESCE(closing_balance, 0), 1
+        FROM delivery_cash_balance
+        WHERE stock_day_id = :s_id
+        {on_conflict_update(db, "monthly_cash_rollup", cash_sums)}
+    """), {"m": m, "s_id": s_id})
+    return True
+
+
+def rebuild_month(db, m):
+    """Recompute the current agency's rollup rows for one month from its CLOSED days in that month."""
+    params = {"m": m, "start": m, "end": next_month(m), "agency": current_agency_id()}
+    # Rollup rows carry no agency: they belong to it through their cylinder type / delivery boy
+    db.execute(text("""
+        DELETE FROM monthly_stock_rollup
+        WHERE month_start = :m
+          AND cylinder_type_id IN (SELECT cylinder_type_id FROM cylinder_types WHERE agency_id = :agency)
+    """), params)
+    db.execute(text("""
+        DELETE FROM monthly_cash_rollup
+        WHERE month_start = :m
+          AND delivery_boy_id IN (SELECT delivery_boy_id FROM delivery_boys WHERE agency_id = :agency)
+    """), params)
+    db.execute(text("""
+        INSERT INTO monthly_stock_rollup
+            (month_start, cylinder_type_id, sales_regular, nc_qty, dbc_qty, tv_out_qty, item_receipt, item_return, days)
+        SELECT :m, s.cylinder_type_id, SUM(COALESCE(s.sales_regular, 0)), SUM(COALESCE(s.nc_qty, 0)),
+               SUM(COALESCE(s.dbc_qty, 0)), SUM(COALESCE(s.tv_out_qty, 0)), SUM(COALESCE(s.item_receipt, 0)),
+               SUM(COALESCE(s.item_return, 0)), COUNT(*)
+        FROM daily_stock_summary s
+        JOIN stock_days sd ON sd.stock_day_id = s.stock_day_id
+        WHERE sd.agency_id = :agency AND sd.status = 'CLOSED' AND sd.stock_date >= :start AND sd.stock_date < :end
+        GROUP BY s.cylinder_type_id
+    """), params)
+    db.execute(text("""
+        INSERT INTO monthly_cash_rollup (month_start, delivery_boy_id, expected, deposited, outstanding, days)
+        SELECT :m, c.delivery_boy_id, SUM(COALESCE(c.today_expected, 0)), SUM(COALESCE(c.today_deposited, 0)),
+               COALESCE((
+                   SELECT c2.closing_balance FROM delivery_cash_balance c2
+                   JOIN stock_days sd2 ON sd2.stock_day_id = c2.stock_day_id
+                   WHERE c2.delivery_boy_id = c.delivery_boy_id AND sd2.status = 'CLOSED'
+                     AND sd2.stock_date >= :start AND sd2.stock_date < :end
+                   ORDER BY sd2.stock_date DESC LIMIT 1
+               ), 0),
+               COUNT(*)
+        FROM delivery_cash_balance c
+        JOIN stock_days sd ON sd.stock_day_id = c.stock_day_id
+        WHERE sd.agency_id = :agency AND sd.status = 'CLOSED' AND sd.stock_date >= :start AND sd.stock_date < :end
+        GROUP BY c.delivery_boy_id
+    """), params)
+    db.execute(text("""
+        UPDATE stock_days SET rolled_up = 1
+        WHERE agency_id = :agency AND status = 'CLOSED' AND stock_date >= :start AND stock_date < :end
+    """), params)
+
+
+def backfill_rollups(db, start=None, end=None):
+    """Rebuild every month of the current agency (or those between start and end). Returns the months rebuilt."""
+    bounds = db.execute(text("""
+        SELECT MIN(stock_date) AS first_date, MAX(stock_date) AS last_date
+        FROM stock_days WHERE agency_id = :agency AND status = 'CLOSED'
+    """), {"agency": current_agency_id()}).fetchone()
+    if not bounds or bounds.first_date is None:
+        return []
+
+    m = month_start(_as_date(start or bounds.first_date))
+    last = month_start(_as_date(end or bounds.last_date))
+    months = []
+    while m <= last:
+        rebuild_month(db, m)
+        db.commit()
+        months.append(m)
+        m = next_month(m)
+    return months
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def load_monthly_summary(db, year):
+    """One row per month of the year, totalled across the agency's cylinder types and delivery boys."""
+    params = {"agency": current_agency_id(), "start": date(year, 1, 1), "end": date(year + 1, 1, 1)}
+    stock = db.execute(text("""
+        SELECT r.month_start, SUM(r.sales_regular) AS sales_regular, SUM(r.nc_qty) AS nc_qty,
+               SUM(r.dbc_qty) AS dbc_qty, SUM(r.tv_out_qty) AS tv_out_qty,
+               SUM(r.item_receipt) AS item_receipt, SUM(r.item_return) AS item_return
+        FROM monthly_stock_rollup r
+        JOIN cylinder_types t ON t.cylinder_type_id = r.cylinder_type_id
+        WHERE t.agency_id = :agency AND r.month_start >= :start AND r.month_start < :end
+        GROUP BY r.month_start
+    """), params).fetchall()
+    cash = db.execute(text("""
+        SELECT r.month_start, SUM(r.expected) AS expected, SUM(r.deposited) AS deposited,
+               SUM(r.outstanding) AS outstanding
+        FROM monthly_cash_rollup r
+        JOIN delivery_boys b ON b.delivery_boy_id = r.delivery_boy_id
+        WHERE b.agency_id = :agency AND r.month_start >= :start AND r.month_start < :end
+        GROUP BY r.month_start
+    """), params).fetchall()
+
+    cash_map = {_as_date(r.month_start): r for r in cash}
+    months = []
+    for r in stock:
+        m = _as_date(r.month_start)
+        months.append({"month": m, "stock": r, "cash": cash_map.pop(m, None)})
+    months.extend({"month": m, "stock": None, "cash": c} for m, c in cash_map.items())
+    return sorted(months, key=lambda x: x["month"])
+
+
+@click.command("backfill-rollups")
+@agency_option
+@click.option("--start", default=None, help="First month to rebuild (YYYY-MM-DD).")
+@click.option("--end", default=None, help="Last month to rebuild (YYYY-MM-DD).")
+@with_appcontext
+def backfill_rollups_command(start, end):
+    """Rebuild the monthly stock and cash rollups from daily history."""
+    db = SessionLocal()
+    try:
+        months = backfill_rollups(db, start, end)
+        click.echo(f"Rebuilt {len(months)} month(s).")
+    finally:
+        db.close()
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+import click
+from flask import session
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.config.settings import USER_CACHE_TTL, USER_CACHE_SIZE, USER_SESSION_EMBED, USER_VERSION_CHECK_INTERVAL
+from app.db.session import DirectorySession
+
+Identity = namedtuple("Identity", "user_id username agency_id")
+
+_MISSING = object()
+SESSION_KEY = "identity"
+
+USER_BY_ID_SQL = text("SELECT user_id, username, agency_id, is_approved FROM users WHERE user_id = :id")
+USER_BY_NAME_SQL = text(
+    "SELECT user_id, username, agency_id, password_hash, full_name, is_approved FROM users WHERE username = :u")
+
+
+class TTLCache:
+    """Small LRU with per-entry expiry, safe to share between request threads."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_users = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Last user_directory_version this worker has seen, and when it last looked
+_version_lock = threading.Lock()
+_version = None
+_version_checked_at = 0.0
+
+
+def _directory_version():
+    """Current user_directory_version, re-read at most every USER_VERSION_CHECK_INTERVAL.
+
+    A new stamp means some user's approval changed in another process, so the whole cache is dropped.
+    """
+    global _version, _version_checked_at
+    now = time.monotonic()
+    with _version_lock:
+        if _version is not None and now - _version_checked_at < USER_VERSION_CHECK_INTERVAL:
+            return _version
+
+    db = DirectorySession()
+    try:
+        version = db.execute(text("SELECT version FROM user_directory_version WHERE id = 1")).scalar() or 0
+    finally:
+        db.close()
+
+    with _version_lock:
+        if version != _version:
+            _users.clear()
+        _version = version
+        _version_checked_at = now
+    return version
+
+
+def _fetch_identity(user_id):
+    db = DirectorySession()
+    try:
+        row = db.execute(USER_BY_ID_SQL, {"id": user_id}).fetchone()
+    finally:
+        db.close()
+    # Unapproved (or revoked) accounts do not resolve to a logged-in user
+    return Identity(row.user_id, row.username, row.agency_id) if row and row.is_approved == 1 else None
+
+
+def get_identity(user_id):
+    """Identity for a session's user id: from the signed session, the TTL cache, or one DB read.
+
+    Both copies are only trusted while user_directory_version is unchanged.
+    """
+    user_id = str(user_id)
+    version = _directory_version()
+
+    if USER_SESSION_EMBED:
+        embedded = session.get(SESSION_KEY)
+        # Cookies signed before agencies or version stamps existed fall through to a lookup
+        if (embedded and embedded.get("id") == user_id and "agency" in embedded
+                and embedded.get("ver") == version and time.time() - embedded.get("ts", 0) < USER_CACHE_TTL):
+            return Identity(embedded["id"], embedded["username"], embedded["agency"])
+
+    cached = _users.get(user_id)
+    if cached is _MISSING:
+        cached = (_fetch_identity(user_id), time.time())
+        _users.put(user_id, cached)
+    identity, fetched_at = cached
+
+    if USER_SESSION_EMBED and identity:
+        # Keep the original fetch time, so re-embedding never extends an identity past USER_CACHE_TTL
+        remember_identity(identity.user_id, identity.username, identity.agency_id, fetched_at)
+    return identity
+
+
+def remember_identity(user_id, username, agency_id, fetched_at=None):
+    """Embed the identity fields in the signed session cookie (when USER_SESSION_EMBED is on)."""
+    if USER_SESSION_EMBED:
+        session[SESSION_KEY] = {"id": str(user_id), "username": username, "agency": agency_id,
+                                "ver": _directory_version(), "ts": fetched_at or time.time()}
+
+
+def forget_identity():
+    session.pop(SESSION_KEY, None)
+
+
+def bump_user_directory_version(db):
+    """Mark users as changed for every worker. Call in the same transaction as the edit, before commit."""
+    db.execute(text("UPDATE user_directory_version SET version = version + 1 WHERE id = 1"))
+
+
+def invalidate_user(user_id):
+    """Drop a cached user from this process; other workers follow the version stamp."""
+    _users.pop(str(user_id))
+
+
+@click.command("approve-user")
+@click.argument("username")
+@click.option("--revoke", is_flag=True, help="Withdraw approval instead of granting it.")
+@with_appcontext
+def approve_user_command(username, revoke):
+    """Grant (or revoke) a registered user's approval."""
+    db = DirectorySession()
+    try:
+        row = db.execute(text("SELECT user_id FROM users WHERE username = :u"), {"u": username}).fetchone()
+        if not row:
+            raise click.ClickException(f"No such user: {username}")
+        db.execute(text("UPDATE users SET is_approved = :a WHERE user_id = :id"),
+                   {"a": 0 if revoke else 1, "id": row.user_id})
+        bump_user_directory_version(db)
+        db.commit()
+        invalidate_user(row.user_id)
+        click.echo(f"{username} {'revoked' if revoke else 'approved'}.")
+    finally:
+        db.close()
@@ -0,0 +1,195 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.db.session import SessionLocal
+from app.db.bulk import bulk_upsert
+from app.services.agency import agency_option, current_agency_id
+
+VEHICLE_COLUMNS = ("stock_day_id", "delivery_boy_id", "cylinder_type_id", "empty_qty", "returned_qty")
+BALANCE_COLUMNS = ("delivery_boy_id", "cylinder_type_id", "stock_day_id", "empty_qty", "prev_empty_qty")
+
+# The balance tables are keyed by boy and type only; they are scoped to an agency through its delivery boys.
+
+
+EXPECTED_EMPTIES_SQL = text("""
+    SELECT delivery_boy_id, cylinder_type_id, COALESCE(SUM(regular_qty), 0) AS expected
+    FROM delivery_issues
+    WHERE stock_day_id = :p
+    GROUP BY delivery_boy_id, cylinder_type_id
+""")
+
+
+def load_expected_empties(db, prev_id):
+    """Regular refills issued on the previous day per (boy, type) - the empties each boy should bring back."""
+    rows = db.execute(EXPECTED_EMPTIES_SQL, {"p": prev_id}).fetchall()
+    return {(r.delivery_boy_id, r.cylinder_type_id): int(r.expected or 0) for r in rows}
+
+
+PREV_VEHICLE_EMPTIES_SQL = text("""
+    SELECT vb.delivery_boy_id, vb.cylinder_type_id,
+           CASE WHEN vb.stock_day_id < :o THEN vb.empty_qty ELSE vb.prev_empty_qty END AS empty_qty
+    FROM delivery_vehicle_balance vb
+    JOIN delivery_boys db ON db.delivery_boy_id = vb.delivery_boy_id
+    WHERE db.agency_id = :agency
+""")
+
+
+def load_prev_vehicle_empties(db, open_id):
+    """Vehicle empty balance per (boy, type) as it stood before the open day, read from the balance table."""
+    rows = db.execute(PREV_VEHICLE_EMPTIES_SQL, {"o": open_id, "agency": current_agency_id()}).fetchall()
+    return {(r.delivery_boy_id, r.cylinder_type_id): int(r.empty_qty or 0) for r in rows}
+
+
+CURRENT_BALANCES_SQL = text("""
+    SELECT vb.delivery_boy_id, vb.cylinder_type_id, vb.empty_qty
+    FROM delivery_vehicle_balance vb
+    JOIN delivery_boys db ON db.delivery_boy_id = vb.delivery_boy_id
+    WHERE db.agency_id = :agency
+""")
+
+
+def get_current_balances(db):
+    """Every current vehicle empty balance of the agency in one read: {(boy_id, type_id): empty_qty}."""
+    rows = db.execute(CURRENT_BALANCES_SQL, {"agency": current_agency_id()}).fetchall()
+    return {(r.delivery_boy_id, r.cylinder_type_id): int(r.empty_qty or 0) for r in rows}
+
+
+BALANCES_AS_OF_SQL = text("""
+    SELECT v.delivery_boy_id, v.cylinder_type_id, COALESCE(v.empty_qty, 0) AS empty_qty
+    FROM delivery_vehicle_empty_stock v
+    JOIN (
+        SELECT delivery_boy_id, cylinder_type_id, MAX(stock_day_id) AS last_day_id
+        FROM delivery_vehicle_empty_stock
+        WHERE stock_day_id <= :d
+        GROUP BY delivery_boy_id, cylinder_type_id
+    ) l ON l.delivery_boy_id = v.delivery_boy_id
+       AND l.cylinder_type_id = v.cylinder_type_id
+       AND l.last_day_id = v.stock_day_id
+    JOIN delivery_boys db ON db.delivery_boy_id = v.delivery_boy_id
+    WHERE db.agency_id = :agency
+""")
+
+
+def get_balances_as_of(db, stock_day_id):
+    """Point-in-time balances: the latest vehicle row on or before the given stock day, per (boy, type)."""
+    rows = db.execute(BALANCES_AS_OF_SQL, {"d": stock_day_id, "agency": current_agency_id()}).fetchall()
+    return {(r.delivery_boy_id, r.cylinder_type_id): int(r.empty_qty or 0) for r in rows}
+
+
+def parse_actual_form(form):
+    """Collect actual_{boy}_{type} fields into {(boy_id, type_id): actual_returned}."""
+    actuals = {}
+    for key, value in form.items():
+        if key.startswith("actual_"):
+            parts = key.split("_")
+            actuals[(int(parts[1]), int(parts[2]))] = int(value or 0)
+    return actuals
+
+
+def save_vehicle_balances(db, open_id, prev_id, actuals):
+    """Compute new vehicle empties (previous + expected - actual) for every pair and write them in one batch."""
+    expected = load_expected_empties(db, prev_id)
+    prev_vehicle = load_prev_vehicle_empties(db, open_id)
+
+    rows = [{
+        "stock_day_id": open_id,
+        "delivery_boy_id": b_id,
+        "cylinder_type_id": c_id,
+        "empty_qty": (prev_vehicle.get((b_id, c_id), 0) + expected.get((b_id, c_id), 0)) - actual,
+        "returned_qty": actual,
+    } for (b_id, c_id), actual in actuals.items()]
+
+    if rows:
+        # returned_qty is kept so a later correction can replay this day (app.services.recompute)
+        bulk_upsert(db, "delivery_vehicle_empty_stock", VEHICLE_COLUMNS, rows, VEHICLE_COLUMNS[3:])
+        # Keep the current-balance table in step; prev_empty_qty is what the pair held before this day
+        bulk_upsert(db, "delivery_vehicle_balance", BALANCE_COLUMNS, [
+            dict(r, prev_empty_qty=prev_vehicle.get((r["delivery_boy_id"], r["cylinder_type_id"]), 0))
+            for r in rows
+        ], BALANCE_COLUMNS[2:])
+    return rows
+
+
+RECONCILE_GRID_SQL = text("""
+    WITH expected AS (
+        SELECT delivery_boy_id, cylinder_type_id, COALESCE(SUM(regular_qty), 0) AS expected_empty
+        FROM delivery_issues
+        WHERE stock_day_id = :p
+        GROUP BY delivery_boy_id, cylinder_type_id
+    ),
+    latest AS (
+        SELECT vb.delivery_boy_id, vb.cylinder_type_id,
+               CASE WHEN vb.stock_day_id < :o THEN vb.empty_qty ELSE vb.prev_empty_qty END AS empty_qty
+        FROM delivery_vehicle_balance vb
+        JOIN delivery_boys b ON b.delivery_boy_id = vb.delivery_boy_id
+        WHERE b.agency_id = :agency
+    ),
+    pairs AS (
+        SELECT delivery_boy_id, cylinder_type_id FROM expected
+        UNION
+        SELECT delivery_boy_id, cylinder_type_id FROM latest WHERE empty_qty > 0
+    )
+    SELECT db.delivery_boy_id, db.name AS delivery_boy, ct.cylinder_type_id, ct.code AS cylinder_type,
+           COALESCE(e.expected_empty, 0) AS expected_empty,
+           COALESCE(lt.empty_qty, 0) AS prev_vehicle_empty
+    FROM pairs pr
+    JOIN delivery_boys db ON db.delivery_boy_id = pr.delivery_boy_id
+    JOIN cylinder_types ct ON ct.cylinder_type_id = pr.cylinder_type_id
+    LEFT JOIN expected e ON e.delivery_boy_id = pr.delivery_boy_id AND e.cylinder_type_id = pr.cylinder_type_id
+    LEFT JOIN latest lt ON lt.delivery_boy_id = pr.delivery_boy_id AND lt.cylinder_type_id = pr.cylinder_type_id
+    WHERE db.agency_id = :agency AND ct.agency_id = :agency
+    ORDER BY db.name, ct.code
+""")
+
+
+def load_reconcile_grid(db, open_id, prev_id):
+    """Rows for the opening-stock vehicle reconciliation screen.
+
+    Each input is pre-aggregated once in a derived table (yesterday's issues, the maintained balance
+    per pair) and joined, instead of four correlated subqueries per boy x type.
+    """
+    return db.execute(RECONCILE_GRID_SQL, {"p": prev_id, "o": open_id, "agency": current_agency_id()}).fetchall()
+
+
+def rebuild_vehicle_balances(db):
+    """Recompute the current agency's delivery_vehicle_balance rows from delivery_vehicle_empty_stock history."""
+    params = {"agency": current_agency_id()}
+    db.execute(text("""
+        DELETE FROM delivery_vehicle_balance
+        WHERE delivery_boy_id IN (SELECT delivery_boy_id FROM delivery_boys WHERE agency_id = :agency)
+    """), params)
+    db.execute(text("""
+        INSERT INTO delivery_vehicle_balance
+            (delivery_boy_id, cylinder_type_id, stock_day_id, empty_qty, prev_empty_qty)
+        SELECT v.delivery_boy_id, v.cylinder_type_id, v.stock_day_id, COALESCE(v.empty_qty, 0),
+               COALESCE((
+                   SELECT p.empty_qty FROM delivery_vehicle_empty_stock p
+                   WHERE p.delivery_boy_id = v.delivery_boy_id AND p.cylinder_type_id = v.cylinder_type_id
+                     AND p.stock_day_id < v.stock_day_id
+                   ORDER BY p.stock_day_id DESC LIMIT 1
+               ), 0)
+        FROM delivery_vehicle_empty_stock v
+        JOIN (
+            SELECT delivery_boy_id, cylinder_type_id, MAX(stock_day_id) AS last_day_id
+            FROM delivery_vehicle_empty_stock
+            GROUP BY delivery_boy_id, cylinder_type_id
+        ) l ON l.delivery_boy_id = v.delivery_boy_id
+           AND l.cylinder_type_id = v.cylinder_type_id
+           AND l.last_day_id = v.stock_day_id
+        JOIN delivery_boys b ON b.delivery_boy_id = v.delivery_boy_id
+        WHERE b.agency_id = :agency
+    """), params)
+    db.commit()
+
+
+@click.command("rebuild-vehicle-balances")
+@agency_option
+@with_appcontext
+def rebuild_vehicle_balances_command():
+    """Rebuild the current vehicle empty balances from history."""
+    db = SessionLocal()
+    try:
+        rebuild_vehicle_balances(db)
+        click.echo("Vehicle balances rebuilt.")
+    finally:
+        db.close()
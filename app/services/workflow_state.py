@@ -0,0 +1,98 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.db.dialect import constant_source, on_conflict_update
+from app.db.session import SessionLocal
+from app.services.agency import agency_option, current_agency_id
+
+# Dashboard steps in workflow order; each card unlocks only when the previous one is done
+STEPS = (
+    "opening_stock",
+    "iocl_movements",
+    "deliveries",
+    "finalized_stock",
+    "expected_cash",
+    "cash_collection",
+    "reconciled_cash",
+)
+
+# Raw completion test per step, evaluated against the source tables.
+# {day} is either the :s_id bind (single day) or sd.stock_day_id (rebuild over stock_days sd).
+STEP_SQL = {
+    "opening_stock": """EXISTS (SELECT 1 FROM daily_stock_summary
+        WHERE stock_day_id = {day} AND opening_filled IS NOT NULL)""",
+    "iocl_movements": """COALESCE((SELECT (COALESCE(SUM(item_receipt + item_return), 0) > 0)
+                               OR (COALESCE(MAX(iocl_no_movement), 0) = 1)
+        FROM daily_stock_summary WHERE stock_day_id = {day}), 0)""",
+    "deliveries": """(EXISTS (SELECT 1 FROM delivery_issues WHERE stock_day_id = {day})
+        OR COALESCE((SELECT delivery_no_movement FROM stock_days WHERE stock_day_id = {day}), 0) = 1)""",
+    "finalized_stock": """COALESCE((SELECT MAX(is_reconciled) FROM daily_stock_summary
+        WHERE stock_day_id = {day}), 0) = 1""",
+    "expected_cash": "EXISTS (SELECT 1 FROM delivery_expected_amount WHERE stock_day_id = {day})",
+    "cash_collection": "EXISTS (SELECT 1 FROM delivery_cash_deposit WHERE stock_day_id = {day})",
+    "reconciled_cash": "EXISTS (SELECT 1 FROM delivery_cash_balance WHERE stock_day_id = {day})",
+}
+
+def _upsert_sql(db, steps, day, source):
+    cols = ", ".join(steps)
+    exprs = ", ".join(STEP_SQL[s].format(day=day) for s in steps)
+    return f"""
+        INSERT INTO day_workflow_state (stock_day_id, {cols})
+        SELECT {day}, {exprs} {source}
+        {on_conflict_update(db, "day_workflow_state", steps)}
+    """
+
+
+def sync_steps(db, s_id, *steps):
+    """Re-evaluate the given steps for one day in a single upsert. Call before the handler commits."""
+    steps = steps or STEPS
+    db.execute(text(_upsert_sql(db, steps, ":s_id", constant_source(db))), {"s_id": s_id})
+
+
+def read_progress(db, s_id):
+    """Dashboard progress flags for a day, with the sequential unlock applied.
+
+    Read-only, so it is safe on GET: a day with no saved state (it predates the state table, or no step
+    has been saved yet) is evaluated on the fly; the next step save seeds its row through sync_steps.
+    """
+    state = db.execute(text("SELECT * FROM day_workflow_state WHERE stock_day_id = :s_id"),
+                       {"s_id": s_id}).fetchone()
+    if state is None:
+        exprs = ", ".join(f"{STEP_SQL[s].format(day=':s_id')} AS {s}" for s in STEPS)
+        state = db.execute(text(f"SELECT {exprs} {constant_source(db)}"), {"s_id": s_id}).fetchone()
+    return progress_from_state(state)
+
+
+def progress_from_state(state):
+    progress = {}
+    prev_done = True
+    for step in STEPS:
+        done = bool(state and getattr(state, step)) and prev_done
+        progress[step] = done
+        prev_done = done
+    return progress
+
+
+def rebuild_workflow_state(db, s_id=None):
+    """Recompute workflow state from the source tables for one day, or for every day of the current agency."""
+    if s_id is not None:
+        sync_steps(db, s_id)
+    else:
+        # The WHERE also keeps SQLite from reading the upsert's ON as a join constraint
+        db.execute(text(_upsert_sql(db, STEPS, "sd.stock_day_id", "FROM stock_days sd WHERE sd.agency_id = :agency")),
+                   {"agency": current_agency_id()})
+    db.commit()
+
+
+@click.command("rebuild-workflow-state")
+@agency_option
+@click.option("--day-id", type=int, default=None, help="Rebuild a single stock day only.")
+@with_appcontext
+def rebuild_workflow_state_command(day_id):
+    """Recompute the dashboard workflow state from the source tables."""
+    db = SessionLocal()
+    try:
+        rebuild_workflow_state(db, day_id)
+        click.echo("Workflow state rebuilt.")
+    finally:
+        db.close()
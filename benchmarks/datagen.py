@@ -0,0 +1,218 @@
+"""Synthetic agency history for benchmarks: every table the app reads, internally consistent.
+
+Days are simulated in order with the app's own formulas (vehicle empties, closing stock, pricing,
+cash carry-forward), so each step page sees data shaped like production. All days but the last are
+CLOSED and fully settled; the last is OPEN with its opening stock, IOCL movements and delivery issues
+entered, ready for Steps 4-7. Derived tables are then rebuilt with the usual rebuild helpers.
+
+The target database is wiped first. Run it only against a scratch database:
+
+    APP_ENV=bench DB_NAME=gas_agency_bench python -m benchmarks.datagen --days 365 --boys 40 --types 8
+"""
+import argparse
+import random
+import sys
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+from app.config.settings import APP_ENV, PASSWORD_HASH_METHOD
+from app.db.migrations import upgrade
+from app.services.cash_balance import rebuild_carry_forward
+from app.services.closing_stock import compute_closing
+from app.services.master_data import MasterData
+from app.services.pricing import expected_rows_by_day
+from app.services.rollups import backfill_rollups
+from app.services.vehicle_stock import rebuild_vehicle_balances
+from app.services.workflow_state import rebuild_workflow_state
+
+BENCH_USER = ("bench", "bench-password")
+
+# Child tables first so the wipe never trips a reference
+WIPE_ORDER = (
+    "monthly_cash_rollup", "monthly_stock_rollup", "delivery_cash_carry_forward", "delivery_vehicle_balance",
+    "day_workflow_state", "delivery_cash_balance", "delivery_cash_deposit", "delivery_expected_amount",
+    "delivery_vehicle_empty_stock", "delivery_issues", "daily_stock_summary", "price_nc_revisions",
+    "price_nc_components", "stock_days", "cylinder_types", "delivery_boys", "users",
+)
+
+Boy = namedtuple("Boy", "delivery_boy_id name mobile is_active")
+CylinderType = namedtuple("CylinderType", "cylinder_type_id code category")
+Price = namedtuple("Price", "cylinder_type_id deposit_amount refill_amount document_charge "
+                            "installation_charge regulator_charge")
+Issue = namedtuple("Issue", "stock_day_id stock_date delivery_boy_id cylinder_type_id "
+                            "regular_qty nc_qty dbc_qty tv_out_qty")
+
+# Dataset handle returned to the benchmark: ids it needs to build form posts
+Dataset = namedtuple("Dataset", "days open_day_id prev_day_id first_date last_date boy_ids type_ids open_issues "
+                                 "open_returns")
+
+
+def _insert(conn, sql, rows):
+    if rows:
+        conn.execute(text(sql), rows)
+
+
+def generate(engine, days=90, boys=20, types=6, density=0.4, seed=7):
+    """Wipe and fill the database behind `engine`. Returns a Dataset."""
+    rng = random.Random(seed)
+    upgrade(engine)
+    start = date.today() - timedelta(days=days - 1)
+    boy_rows = [Boy(b, f"Boy {b:03d}", f"9{b:09d}", 1) for b in range(1, boys + 1)]
+    type_rows = [CylinderType(t, f"T{t:02d}", "DOMESTIC" if t % 3 else "COMMERCIAL") for t in range(1, types + 1)]
+    prices = {t.cylinder_type_id: Price(t.cylinder_type_id, 1500 + 100 * t.cylinder_type_id,
+                                        800 + 50 * t.cylinder_type_id, 50, 100, 150 if t.category == "DOMESTIC" else 0)
+              for t in type_rows}
+    master = MasterData(1, boy_rows, type_rows, prices, [])
+
+    with engine.begin() as conn:
+        for table in WIPE_ORDER:
+            conn.execute(text(f"DELETE FROM {table}"))
+        _insert(conn, "INSERT INTO users (username, password_hash, full_name, is_approved) VALUES (:u, :p, :f, 1)",
+                [{"u": BENCH_USER[0], "p": generate_password_hash(BENCH_USER[1], method=PASSWORD_HASH_METHOD),
+                  "f": "Benchmark User"}])
+        _insert(conn, "INSERT INTO delivery_boys (delivery_boy_id, name, mobile, is_active) VALUES (:i, :n, :m, 1)",
+                [{"i": b.delivery_boy_id, "n": b.name, "m": b.mobile} for b in boy_rows])
+        _insert(conn, "INSERT INTO cylinder_types (cylinder_type_id, code, category) VALUES (:i, :c, :g)",
+                [{"i": t.cylinder_type_id, "c": t.code, "g": t.category} for t in type_rows])
+        _insert(conn, """INSERT INTO price_nc_components (cylinder_type_id, deposit_amount, refill_amount,
+                document_charge, installation_charge, regulator_charge) VALUES (:t, :d, :r, :dc, :ic, :rc)""",
+                [{"t": p.cylinder_type_id, "d": p.deposit_amount, "r": p.refill_amount, "dc": p.document_charge,
+                  "ic": p.installation_charge, "rc": p.regulator_charge} for p in prices.values()])
+        _insert(conn, "INSERT INTO stock_days (stock_day_id, stock_date, status, delivery_no_movement) "
+                      "VALUES (:i, :d, :s, 0)",
+                [{"i": d, "d": start + timedelta(days=d - 1), "s": "OPEN" if d == days else "CLOSED"}
+                 for d in range(1, days + 1)])
+
+        closing_filled = np.full(types, 500.0)
+        closing_empty = np.full(types, 120.0)
+        defective = np.zeros(types)
+        vehicle = np.zeros((boys, types))
+        prev_regular = np.zeros((boys, types))
+        cash = np.zeros(boys)
+        open_issues, open_returns = {}, {}
+
+        for d in range(1, days + 1):
+            stock_date = start + timedelta(days=d - 1)
+            is_open = d == days
+
+            # Opening-stock reconciliation: each pair holding empties returns most of them
+            held = vehicle + prev_regular
+            rows_mask = held > 0
+            returned = np.where(rows_mask, np.floor(held * np.array(
+                [[rng.uniform(0.7, 1.0) for _ in range(types)] for _ in range(boys)])), 0)
+            vehicle = np.where(rows_mask, held - returned, vehicle)
+            pairs = [(int(b), int(t)) for b, t in zip(*np.nonzero(rows_mask))]
+            _insert(conn, """INSERT INTO delivery_vehicle_empty_stock
+                    (stock_day_id, delivery_boy_id, cylinder_type_id, empty_qty, returned_qty)
+                    VALUES (:d, :b, :t, :e, :r)""",
+                    [{"d": d, "b": b + 1, "t": t + 1, "e": int(vehicle[b, t]), "r": int(returned[b, t])}
+                     for b, t in pairs])
+            if is_open:
+                open_returns = {(b + 1, t + 1): int(returned[b, t]) for b, t in pairs}
+            vsum = np.where(rows_mask, vehicle, 0).sum(axis=0)
+            opening_filled = closing_filled
+            opening_empty = closing_empty + defective - vsum
+            defective = vsum
+
+            # Deliveries
+            qty = np.zeros((boys, types, 4))
+            issue_rows = []
+            for b in range(boys):
+                for t in range(types):
+                    if rng.random() < density:
+                        q = [rng.randint(1, 25), int(rng.random() < 0.2), int(rng.random() < 0.05),
+                             int(rng.random() < 0.1)]
+                        qty[b, t] = q
+                        issue_rows.append(Issue(d, stock_date, b + 1, t + 1, *q))
+            _insert(conn, """INSERT INTO delivery_issues (stock_day_id, delivery_boy_id, cylinder_type_id,
+                    regular_qty, nc_qty, dbc_qty, tv_out_qty, delivery_source)
+                    VALUES (:d, :b, :t, :r, :n, :c, :v, 'DELIVERY_BOY')""",
+                    [{"d": i.stock_day_id, "b": i.delivery_boy_id, "t": i.cylinder_type_id, "r": i.regular_qty,
+                      "n": i.nc_qty, "c": i.dbc_qty, "v": i.tv_out_qty} for i in issue_rows])
+            totals = qty.sum(axis=0)
+
+            # IOCL movements top filled stock back up
+            receipt = np.maximum(0, totals[:, :3].sum(axis=1) + np.array([rng.randint(-5, 10) for _ in range(types)]))
+            item_return = np.minimum(np.array([rng.randint(0, 40) for _ in range(types)]),
+                                     np.maximum(opening_empty, 0))
+            closing = compute_closing(opening_filled, opening_empty, defective, receipt, item_return, totals)
+
+            summary = []
+            for t in range(types):
+                row = {"d": d, "t": t + 1, "of": int(opening_filled[t]), "oe": int(opening_empty[t]),
+                       "dv": int(defective[t]), "ir": int(receipt[t]), "it": int(item_return[t]),
+                       "sr": 0, "nc": 0, "dbc": 0, "tv": int(totals[t, 3]),
+                       "cf": None, "ce": None, "ts": None, "rec": 0}
+                if not is_open:
+                    row.update(sr=int(totals[t, 0]), nc=int(totals[t, 1]), dbc=int(totals[t, 2]),
+                               cf=int(closing["closing_filled"][t]), ce=int(closing["closing_empty"][t]),
+                               ts=int(closing["total_stock"][t]), rec=1)
+                summary.append(row)
+            _insert(conn, """INSERT INTO daily_stock_summary (stock_day_id, cylinder_type_id, opening_filled,
+                    opening_empty, defective_empty_vehicle, item_receipt, item_return, sales_regular, nc_qty,
+                    dbc_qty, tv_out_qty, closing_filled, closing_empty, total_stock, is_reconciled)
+                    VALUES (:d, :t, :of, :oe, :dv, :ir, :it, :sr, :nc, :dbc, :tv, :cf, :ce, :ts, :rec)""", summary)
+
+            if is_open:
+                open_issues = {(i.delivery_boy_id, i.cylinder_type_id): i for i in issue_rows}
+                break
+
+            closing_filled = closing["closing_filled"]
+            closing_empty = closing["closing_empty"]
+            prev_regular = qty[:, :, 0]
+
+            # Cash: expected priced from the issues, most of it deposited, the rest carried forward
+            expected = expected_rows_by_day(issue_rows, master)
+            _insert(conn, """INSERT INTO delivery_expected_amount (stock_day_id, delivery_boy_id, expected_amount,
+                    regular_amt, nc_amt, dbc_amt, tv_refund)
+                    VALUES (:stock_day_id, :delivery_boy_id, :expected_amount, :regular_amt, :nc_amt, :dbc_amt,
+                    :tv_refund)""", list(expected.values()))
+            deposits, balances = [], []
+            for b in range(boys):
+                exp = float(expected.get((d, b + 1), {}).get("expected_amount", 0))
+                paid = round(max(0.0, exp + cash[b] - rng.choice((0, 0, 0, 50, 120))), 2)
+                upi = round(paid * rng.uniform(0, 0.5), 2)
+                deposits.append({"d": d, "b": b + 1, "c": round(paid - upi, 2), "u": upi, "x": paid})
+                closing_balance = round(cash[b] + exp - paid, 2)
+                balances.append({"d": d, "b": b + 1, "o": cash[b], "e": exp, "x": paid, "c": closing_balance,
+                                 "s": "SETTLED" if closing_balance == 0 else "PENDING"})
+                cash[b] = closing_balance
+            _insert(conn, """INSERT INTO delivery_cash_deposit (stock_day_id, delivery_boy_id, cash_amount,
+                    upi_amount, total_deposited) VALUES (:d, :b, :c, :u, :x)""", deposits)
+            _insert(conn, """INSERT INTO delivery_cash_balance (stock_day_id, delivery_boy_id, opening_balance,
+                    today_expected, today_deposited, closing_balance, balance_status)
+                    VALUES (:d, :b, :o, :e, :x, :c, :s)""", balances)
+
+        conn.execute(text("UPDATE master_data_version SET version = version + 1 WHERE id = 1"))
+
+    with engine.connect() as conn:
+        rebuild_workflow_state(conn)
+        rebuild_vehicle_balances(conn)
+        rebuild_carry_forward(conn)
+        backfill_rollups(conn)
+
+    return Dataset(days, days, days - 1, start, start + timedelta(days=days - 1),
+                   [b.delivery_boy_id for b in boy_rows], [t.cylinder_type_id for t in type_rows], open_issues, open_returns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--boys", type=int, default=20)
+    parser.add_argument("--types", type=int, default=6)
+    parser.add_argument("--density", type=float, default=0.4, help="share of boy/type pairs with issues per day")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if APP_ENV != "bench":
+        sys.exit("Refusing to wipe a non-bench database: set APP_ENV=bench and point DB_NAME at a scratch schema.")
+
+    from app.db.session import engine
+    ds = generate(engine, args.days, args.boys, args.types, args.density, args.seed)
+    print(f"Generated {ds.days} days ({ds.first_date} .. {ds.last_date}), {len(ds.boy_ids)} boys, "
+          f"{len(ds.type_ids)} types; open day {ds.open_day_id} has {len(ds.open_issues)} issue rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Login throughput against concurrency, with password hashing inline vs on the bounded pool.
+
+By default this drives the hashing stage in-process (no database needed): each simulated login verifies
+one stored hash, either inline on the calling thread (the old route) or through
+app.services.passwords.verify_password. Passing --url instead POSTs real logins to a running server:
+
+    python -m benchmarks.login_throughput --concurrency 1 4 16 64 --logins 200
+    python -m benchmarks.login_throughput --url http://localhost:5000/login --username bench --password bench
+
+Pool size, queue depth and hash cost come from PASSWORD_HASH_* in the environment, as in the app.
+"""
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.config.settings import PASSWORD_HASH_METHOD
+from app.services.passwords import HashingBusy, verify_password
+
+
+def inline_login(stored, password):
+    return check_password_hash(stored, password)
+
+
+def pooled_login(stored, password):
+    return verify_password(stored, password)[0]
+
+
+def http_login(url, username, password):
+    body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    opener = urllib.request.build_opener(NoRedirect)
+    try:
+        opener.open(urllib.request.Request(url, data=body), timeout=30)
+    except urllib.error.HTTPError as e:
+        if e.code == 503:
+            raise HashingBusy()
+        if e.code != 302:
+            raise
+    return True
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run(login, concurrency, logins):
+    latencies, rejected = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal rejected
+        t0 = time.perf_counter()
+        try:
+            login()
+        except HashingBusy:
+            with lock:
+                rejected += 1
+            return
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(one, range(logins)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    return {
+        "ok": len(latencies),
+        "rejected": rejected,
+        "per_sec": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95_ms": p95 * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--logins", type=int, default=200, help="logins attempted per concurrency level")
+    parser.add_argument("--url", help="POST to a running app's /login instead of hashing in-process")
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench-password")
+    args = parser.parse_args()
+
+    if args.url:
+        modes = {"http": lambda: http_login(args.url, args.username, args.password)}
+    else:
+        stored = generate_password_hash(args.password, method=PASSWORD_HASH_METHOD)
+        modes = {
+            "inline": lambda: inline_login(stored, args.password),
+            "pooled": lambda: pooled_login(stored, args.password),
+        }
+
+    print(f"{'mode':>7} {'clients':>8} {'ok':>6} {'rejected':>9} {'logins/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, login in modes.items():
+        for concurrency in args.concurrency:
+            r = run(login, concurrency, args.logins)
+            print(f"{name:>7} {concurrency:>8} {r['ok']:>6} {r['rejected']:>9} "
+                  f"{r['per_sec']:>10.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Time every blueprint's GET and POST handlers through the Flask test client at several data scales.
+
+For each scale the scratch database is regenerated (benchmarks.datagen), a logged-in test client
+walks the workflow pages in order, and each case is timed REPEAT times. Besides wall time, the DB time
+and statement count per request are read from app.db.instrumentation.route_stats once the response body
+has been consumed, so streamed exports include the queries their body runs (the Server-Timing header is
+sent before that). Results are printed and written as JSON for comparison between runs:
+
+    APP_ENV=bench DB_NAME=gas_agency_bench python -m benchmarks.routes --days 30 365 1095 --repeat 10
+    APP_ENV=bench DATABASE_URL=sqlite:///bench.db python -m benchmarks.routes --days 30 365
+
+POSTs that lock a step (finalize, expected cash, cash collection) can only take effect once per
+dataset, so they run a single time, in workflow order, after the repeatable cases of earlier steps.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from app.config.settings import APP_ENV, METRICS_TOKEN
+
+Case = namedtuple("Case", "name method path data once")
+
+
+def build_cases(ds):
+    grid = {}
+    for b in ds.boy_ids:
+        for t in ds.type_ids:
+            i = ds.open_issues.get((b, t))
+            grid.update({f"issue_{b}_{t}_REFILL": i.regular_qty if i else 0,
+                         f"issue_{b}_{t}_NC": i.nc_qty if i else 0,
+                         f"issue_{b}_{t}_DBC": i.dbc_qty if i else 0,
+                         f"issue_{b}_{t}_TVOUT": i.tv_out_qty if i else 0})
+    iocl = {}
+    for t in ds.type_ids:
+        iocl.update({f"receipt_{t}": 10, f"return_{t}": 5})
+    mid = ds.first_date + (ds.last_date - ds.first_date) / 2
+    closed_day = max(1, ds.prev_day_id)
+    span = {"start": str(ds.first_date), "end": str(ds.last_date)}
+
+    return [
+        Case("dashboard", "GET", "/dashboard", None, False),
+        Case("history", "GET", "/history?limit=20", None, False),
+        Case("monthly summary", "GET", f"/monthly-summary?year={ds.last_date.year}", None, False),
+        Case("day report (stock)", "POST", "/generate-report", {"report_type": "stock", "selected_date": str(mid)}, False),
+        Case("day report (cash)", "POST", "/generate-report", {"report_type": "cash", "selected_date": str(mid)}, False),
+        Case("range statement", "POST", "/range-report",
+             {"start_date": span["start"], "end_date": span["end"], "period": "month"}, False),
+        Case("export stock csv", "GET", f"/export/stock?start={span['start']}&end={span['end']}&format=csv", None, False),
+        Case("export cash xlsx", "GET", f"/export/cash?start={span['start']}&end={span['end']}&format=xlsx", None, False),
+        Case("download stock day", "GET", f"/download-stock/{closed_day}", None, False),
+        Case("download cash day", "GET", f"/download-cash/{closed_day}", None, False),
+        Case("delivery boys", "GET", "/delivery-boys", None, False),
+        Case("delivery boys csv", "GET", "/delivery-boys/download", None, False),
+        Case("cylinder types", "GET", "/cylinder-types", None, False),
+        Case("cylinder types csv", "GET", "/cylinder-types/download", None, False),
+        # Step 1-3 (repeatable saves)
+        Case("opening stock", "GET", "/opening-stock", None, False),
+        Case("opening reconcile", "GET", "/opening-stock/reconcile", None, False),
+        Case("opening reconcile save", "POST", "/opening-stock/reconcile",
+             {f"actual_{b}_{t}": q for (b, t), q in ds.open_returns.items()}, False),
+        Case("vehicle report csv", "GET", "/opening-stock/download-vehicle-report", None, False),
+        Case("iocl movements", "GET", "/iocl-movements", None, False),
+        Case("iocl movements save", "POST", "/iocl-movements", iocl, False),
+        Case("delivery grid", "GET", "/delivery-transactions", None, False),
+        Case("delivery grid save", "POST", "/delivery-transactions", grid, False),
+        # Step 4-7 (each POST locks its step)
+        Case("closing stock", "GET", "/closing-stock", None, False),
+        Case("closing stock finalize", "POST", "/closing-stock", {}, True),
+        Case("expected cash", "GET", "/cash-settlement", None, False),
+        Case("expected cash save", "POST", "/cash-settlement", {}, True),
+        Case("cash collection", "GET", "/cash-collection", None, False),
+        Case("cash collection save", "POST", "/cash-collection",
+             {f"cash_{b}": 1000 for b in ds.boy_ids}, True),
+        Case("cash reconciliation", "GET", "/cash-reconciliation", None, False),
+        Case("cash reconciliation save", "POST", "/cash-reconciliation",
+             {f"{k}_{b}": 0 for b in ds.boy_ids for k in ("opening", "expected", "deposited")}, False),
+    ] + ([Case("metrics", "GET", "/metrics", None, False)] if METRICS_TOKEN else [])
+
+
+def _sql_totals():
+    from app.db.instrumentation import route_stats
+    rows = route_stats.snapshot().values()
+    return sum(r["db_seconds"] for r in rows), sum(r["queries"] for r in rows)
+
+
+def run_case(client, case, repeat):
+    samples, db_ms, queries = [], [], []
+    for _ in range(1 if case.once else repeat + 1):
+        db_before, queries_before = _sql_totals()
+        t0 = time.perf_counter()
+        response = client.open(case.path, method=case.method, data=case.data)
+        response.get_data()
+        # Closing ends a streamed body's request context, which is when its statements are recorded
+        response.close()
+        samples.append((time.perf_counter() - t0) * 1000)
+        db_after, queries_after = _sql_totals()
+        db_ms.append((db_after - db_before) * 1000)
+        queries.append(queries_after - queries_before)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{case.name}: HTTP {response.status_code}")
+    if not case.once:
+        # First request warms template and master-data caches
+        samples, db_ms, queries = samples[1:], db_ms[1:], queries[1:]
+    samples.sort()
+    return {
+        "case": case.name, "method": case.method, "path": case.path.split("?")[0],
+        "runs": len(samples),
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples), math.ceil(len(samples) * 0.95)) - 1], 2),
+        "db_ms": round(statistics.median(db_ms), 2) if db_ms else None,
+        "queries": max(queries) if queries else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365])
+    parser.add_argument("--boys", type=int, default=20)
+    parser.add_argument("--types", type=int, default=6)
+    parser.add_argument("--density", type=float, default=0.4)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--out", default=None, help="JSON results file (default ./routes_<ts>.json)")
+    args = parser.parse_args()
+    if APP_ENV != "bench":
+        sys.exit("Refusing to wipe a non-bench database: set APP_ENV=bench and point DB_NAME at a scratch schema.")
+
+    from app.db.session import engine
+    from app.main import create_app
+    from app.services.day_context import invalidate_day_context
+    from app.services.master_data import invalidate_master_data
+    from benchmarks.datagen import BENCH_USER, generate
+
+    app = create_app()
+    results = {"started": datetime.now(timezone.utc).isoformat(), "args": vars(args), "scales": []}
+    for days in args.days:
+        ds = generate(engine, days, args.boys, args.types, args.density)
+        invalidate_day_context()
+        invalidate_master_data()
+
+        client = app.test_client()
+        if METRICS_TOKEN:
+            client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {METRICS_TOKEN}"
+        client.post("/login", data={"username": BENCH_USER[0], "password": BENCH_USER[1]})
+
+        print(f"\n{days} days, {args.boys} boys, {args.types} types")
+        print(f"{'case':<28} {'method':>6} {'p50 ms':>9} {'p95 ms':>9} {'db ms':>8} {'queries':>8}")
+        rows = []
+        for case in build_cases(ds):
+            r = run_case(client, case, args.repeat)
+            rows.append(r)
+            print(f"{r['case']:<28} {r['method']:>6} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+                  f"{r['db_ms'] if r['db_ms'] is not None else '-':>8} {r['queries'] if r['queries'] is not None else '-':>8}")
+        results["scales"].append({"days": days, "boys": args.boys, "types": args.types, "results": rows})
+
+    out = args.out or f"routes_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
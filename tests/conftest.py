@@ -0,0 +1,53 @@
+"""Shared fixtures: the app on a private in-memory SQLite database, filled by benchmarks.datagen.
+
+Settings are read at import time, so the environment is pinned here before anything from app is
+imported. DATABASE_URL is overridden unconditionally: datagen wipes whatever database it is given.
+"""
+import os
+
+os.environ["APP_ENV"] = "bench"
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+os.environ.pop("AGENCY_DATABASE_URLS", None)
+os.environ.pop("METRICS_TOKEN", None)
+
+import pytest
+from app.db.session import SessionLocal, engine
+from app.services.day_context import invalidate_day_context
+from app.services.master_data import invalidate_master_data
+from benchmarks.datagen import BENCH_USER, generate
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app.main import create_app
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def dataset():
+    """A fresh 20-day history (19 CLOSED days and an OPEN one) for each test."""
+    ds = generate(engine, days=20, boys=5, types=3)
+    invalidate_day_context()
+    invalidate_master_data()
+    return ds
+
+
+@pytest.fixture
+def db(dataset):
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.close()
+
+
+@pytest.fixture
+def client(app, dataset):
+    client = app.test_client()
+    response = client.post("/login", data={"username": BENCH_USER[0], "password": BENCH_USER[1]})
+    assert response.status_code == 302
+    return client
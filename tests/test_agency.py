@@ -0,0 +1,133 @@
+import pytest
+from sqlalchemy import text
+from app.services.agency import use_agency
+from app.services.master_data import invalidate_master_data
+from app.services.vehicle_stock import get_current_balances, load_reconcile_grid
+
+WORKFLOW_PAGES = ("/dashboard", "/delivery-boys", "/cylinder-types", "/opening-stock", "/opening-stock/reconcile",
+                  "/iocl-movements", "/delivery-transactions", "/closing-stock", "/cash-settlement",
+                  "/cash-collection", "/cash-reconciliation", "/download-stock/1", "/download-cash/1",
+                  "/export/stock?start=2020-01-01&end=2030-01-01&format=csv")
+
+
+@pytest.fixture
+def other_agency(app, db, dataset):
+    """A second agency on the same database, with one delivery boy and a signed-in client of its own."""
+    if not db.execute(text("SELECT 1 FROM agencies WHERE code = 'NORTH'")).fetchone():
+        db.execute(text("INSERT INTO agencies (code, name) VALUES ('NORTH', 'North')"))
+    agency_id = db.execute(text("SELECT agency_id FROM agencies WHERE code = 'NORTH'")).scalar()
+    db.execute(text("DELETE FROM master_data_version WHERE id = :a"), {"a": agency_id})
+    db.execute(text("INSERT INTO master_data_version (id, version) VALUES (:a, 1)"), {"a": agency_id})
+    db.execute(text("DELETE FROM delivery_boys WHERE agency_id = :a"), {"a": agency_id})
+    db.commit()
+
+    client = app.test_client()
+    client.post("/register", data={"full_name": "North", "username": "north", "password": "north-password",
+                                   "confirm_password": "north-password", "agency_code": "north"})
+    db.execute(text("UPDATE users SET is_approved = 1 WHERE username = 'north'"))
+    db.commit()
+    assert client.post("/login", data={"username": "north", "password": "north-password"}).status_code == 302
+    assert client.post("/delivery-boys", data={"action": "create", "name": "North Boy",
+                                               "mobile": "8000000001"}).status_code == 302
+    with use_agency(agency_id):
+        invalidate_master_data()
+    return agency_id, client
+
+
+@pytest.mark.parametrize("path", WORKFLOW_PAGES)
+def test_signed_out_requests_go_to_login(app, dataset, path):
+    response = app.test_client().get(path)
+    assert response.status_code == 302 and "/login" in response.headers["Location"]
+
+
+def test_signed_out_posts_write_nothing(app, db, dataset):
+    response = app.test_client().post("/delivery-boys", data={"action": "create", "name": "X", "mobile": "8000000009"})
+    assert response.status_code == 302
+    assert db.execute(text("SELECT COUNT(*) FROM delivery_boys WHERE name = 'X'")).scalar() == 0
+
+
+def test_agencies_see_only_their_own_data(client, db, dataset, other_agency):
+    agency_id, north = other_agency
+
+    assert "North Boy" in north.get("/delivery-boys").get_data(as_text=True)
+    assert "North Boy" not in client.get("/delivery-boys").get_data(as_text=True)
+    assert "Boy 001" not in north.get("/delivery-boys").get_data(as_text=True)
+    # No days of its own yet: the workflow pages send it back to the dashboard
+    assert north.get("/delivery-transactions").status_code == 302
+    assert north.get("/history").get_json()["items"] == []
+    download = north.get("/export/stock?start=2000-01-01&end=2100-01-01&format=csv").get_data(as_text=True)
+    assert download.splitlines()[0].startswith("Stock_Date,Cylinder_Type") and len(download.splitlines()) == 1
+
+
+def test_balances_are_read_per_agency(db, dataset, other_agency):
+    agency_id, _ = other_agency
+    boy = db.execute(text("SELECT delivery_boy_id FROM delivery_boys WHERE agency_id = :a"), {"a": agency_id}).scalar()
+    db.execute(text("INSERT INTO delivery_vehicle_balance (delivery_boy_id, cylinder_type_id, empty_qty, stock_day_id) "
+                    "VALUES (:b, :t, 99, :s)"), {"b": boy, "t": dataset.type_ids[0], "s": dataset.prev_day_id})
+
+    with use_agency(1):
+        assert all(b != boy for b, _ in get_current_balances(db))
+        grid = load_reconcile_grid(db, dataset.open_day_id, dataset.prev_day_id)
+        assert all(r.delivery_boy_id != boy for r in grid)
+    with use_agency(agency_id):
+        assert get_current_balances(db) == {(boy, dataset.type_ids[0]): 99}
+
+
+def other_agency_rows(db, agency_id):
+    boy = db.execute(text("SELECT delivery_boy_id FROM delivery_boys WHERE agency_id = :a"), {"a": agency_id}).scalar()
+    return {
+        "vehicle": db.execute(text("SELECT COUNT(*) FROM delivery_vehicle_balance WHERE delivery_boy_id = :b"),
+                              {"b": boy}).scalar(),
+        "carry": db.execute(text("SELECT COUNT(*) FROM delivery_cash_carry_forward WHERE delivery_boy_id = :b"),
+                            {"b": boy}).scalar(),
+        "rollup": db.execute(text("SELECT COUNT(*) FROM monthly_cash_rollup WHERE delivery_boy_id = :b"),
+                             {"b": boy}).scalar(),
+    }
+
+
+@pytest.fixture
+def other_agency_balances(db, dataset, other_agency):
+    """Derived rows for the second agency's boy that no source rows back, so only a rebuild for it drops them."""
+    agency_id, _ = other_agency
+    boy = db.execute(text("SELECT delivery_boy_id FROM delivery_boys WHERE agency_id = :a"), {"a": agency_id}).scalar()
+    params = {"b": boy, "t": dataset.type_ids[0], "s": dataset.prev_day_id, "m": dataset.first_date.replace(day=1)}
+    db.execute(text("INSERT INTO delivery_vehicle_balance (delivery_boy_id, cylinder_type_id, empty_qty, stock_day_id) "
+                    "VALUES (:b, :t, 4, :s)"), params)
+    db.execute(text("INSERT INTO delivery_cash_carry_forward (delivery_boy_id, opening_balance, stock_day_id) "
+                    "VALUES (:b, 250, :s)"), params)
+    db.execute(text("INSERT INTO monthly_cash_rollup (month_start, delivery_boy_id, expected, deposited, outstanding, "
+                    "days) VALUES (:m, :b, 1, 1, 0, 1)"), params)
+    db.commit()
+    return agency_id
+
+
+def test_rebuilds_leave_other_agencies_alone(db, dataset, other_agency_balances):
+    from app.services.cash_balance import rebuild_carry_forward
+    from app.services.rollups import backfill_rollups
+    from app.services.vehicle_stock import rebuild_vehicle_balances
+    from app.services.workflow_state import rebuild_workflow_state
+
+    with use_agency(1):
+        rebuild_vehicle_balances(db)
+        rebuild_carry_forward(db)
+        backfill_rollups(db)
+        rebuild_workflow_state(db)
+    assert other_agency_rows(db, other_agency_balances) == {"vehicle": 1, "carry": 1, "rollup": 1}
+
+    with use_agency(other_agency_balances):
+        rebuild_vehicle_balances(db)
+        rebuild_carry_forward(db)
+    assert other_agency_rows(db, other_agency_balances) == {"vehicle": 0, "carry": 0, "rollup": 1}
+    assert db.execute(text("SELECT COUNT(*) FROM delivery_cash_carry_forward")).scalar() == len(dataset.boy_ids)
+
+
+def test_cli_agency_option(app, db, dataset, other_agency_balances):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["rebuild-cash-carry-forward", "--agency", "999"])
+    assert result.exit_code != 0 and "No agency with id 999" in result.output
+
+    result = runner.invoke(args=["rebuild-cash-carry-forward", "--agency", str(other_agency_balances)])
+    assert result.exit_code == 0, result.output
+    db.rollback()
+    assert other_agency_rows(db, other_agency_balances)["carry"] == 0
+    assert db.execute(text("SELECT COUNT(*) FROM delivery_cash_carry_forward")).scalar() == len(dataset.boy_ids)
@@ -0,0 +1,38 @@
+import anyio
+import pytest
+from fastapi import HTTPException
+from app import api
+from app.services.agency import use_agency
+from app.services.day_context import invalidate_day_context
+
+
+def test_tokens_map_to_one_agency_each(monkeypatch):
+    assert api._parse_tokens(" north=2 ; south=3;", "main") == {"north": 2, "south": 3, "main": 1}
+    monkeypatch.setattr(api, "TOKENS", api._parse_tokens("north=2", None))
+
+    assert api.token_agency("Bearer north") == 2
+    for header in ("", "Bearer", "Bearer main", "north", "Bearer north2"):
+        with pytest.raises(HTTPException) as err:
+            api.token_agency(header)
+        assert err.value.status_code == 401
+
+
+def test_no_configured_token_means_no_access(monkeypatch):
+    monkeypatch.setattr(api, "TOKENS", api._parse_tokens("", None))
+    with pytest.raises(HTTPException):
+        api.token_agency("Bearer ")
+
+
+def test_days_are_read_for_the_token_agency_only(dataset):
+    closed = dataset.prev_day_id
+    own = anyio.run(api.run_db, api._stock_summary, 1, closed)
+    assert own["stock_day_id"] == closed and len(own["items"]) == len(dataset.type_ids)
+    assert anyio.run(api.run_db, api._day_status, 1)["open_day"]["stock_day_id"] == dataset.open_day_id
+
+    # Agency 2's token cannot name agency 1's day, and has no open day of its own
+    for fn, day_id in ((api._stock_summary, closed), (api._cash_balances, closed), (api._delivery_issues, None)):
+        with pytest.raises(HTTPException) as err:
+            anyio.run(api.run_db, fn, 2, day_id)
+        assert err.value.status_code == 404
+    with use_agency(2):
+        invalidate_day_context()
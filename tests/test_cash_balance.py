@@ -0,0 +1,36 @@
+from sqlalchemy import text
+from app.services.cash_balance import carry_forward_cash, rebuild_carry_forward
+from app.services.day_views import load_cash_balances
+
+
+def closing_balances(db, s_id):
+    return {r.delivery_boy_id: float(r.closing_balance) for r in db.execute(text(
+        "SELECT delivery_boy_id, closing_balance FROM delivery_cash_balance WHERE stock_day_id = :s"), {"s": s_id})}
+
+
+def carried(db):
+    return {r.delivery_boy_id: (float(r.opening_balance), r.stock_day_id) for r in db.execute(text(
+        "SELECT delivery_boy_id, opening_balance, stock_day_id FROM delivery_cash_carry_forward"))}
+
+
+def test_open_day_opens_with_the_last_closing_balance(db, dataset):
+    previous = closing_balances(db, dataset.prev_day_id)
+    assert carried(db) == {b: (bal, dataset.prev_day_id) for b, bal in previous.items()}
+    assert {r.delivery_boy_id: float(r.opening_bal) for r in load_cash_balances(db, dataset.open_day_id)} == previous
+
+
+def test_day_close_carries_forward_and_rebuild_agrees(db, dataset):
+    s_id, (first, second) = dataset.open_day_id, dataset.boy_ids[:2]
+    db.execute(text("INSERT INTO delivery_cash_balance (stock_day_id, delivery_boy_id, opening_balance, "
+                    "today_expected, today_deposited, closing_balance, balance_status) "
+                    "VALUES (:s, :b, 0, 42, 0, 42, 'PENDING')"), {"s": s_id, "b": first})
+    carry_forward_cash(db, s_id)
+
+    after = carried(db)
+    assert after[first] == (42, s_id)
+    # A boy without a balance row on the closed day keeps the earlier carry-forward
+    assert after[second][1] == dataset.prev_day_id
+
+    db.execute(text("UPDATE stock_days SET status = 'CLOSED' WHERE stock_day_id = :s"), {"s": s_id})
+    rebuild_carry_forward(db)
+    assert carried(db) == after
@@ -0,0 +1,54 @@
+import numpy as np
+from sqlalchemy import text
+from app.services.closing_stock import closing_rows, compute_closing, finalize_day
+from app.services.day_views import load_issue_totals, load_stock_summary
+
+
+def test_compute_closing_formulas():
+    # opening 100 filled / 20 empty, 3 defective; IOCL in 50, out 10; issues reg 30, NC 2, DBC 1, TV-out 4
+    out = compute_closing(100, 20, 3, 50, 10, [30, 2, 1, 4])
+    assert float(out["closing_filled"]) == 100 + 50 - 33
+    assert float(out["closing_empty"]) == 20 + 30 + 4 - 10
+    assert float(out["total_stock"]) == 117 + 44 + 3
+
+
+def test_compute_closing_treats_missing_as_zero_and_broadcasts():
+    out = compute_closing([[10, np.nan]], [[0, 5]], [[0, 0]], [[np.nan, 1]], [[0, 0]],
+                          [[[1, 0, 0, 0], [np.nan, 0, 0, 2]]])
+    assert out["closing_filled"].tolist() == [[9, 1]]
+    assert out["closing_empty"].tolist() == [[1, 7]]
+
+
+def assert_finalize_matches_closing_rows(db, dataset):
+    s_id = dataset.open_day_id
+    summary = load_stock_summary(db, s_id)
+    expected = {r["cylinder_type_id"]: r for r in closing_rows(summary, load_issue_totals(db, s_id))}
+
+    finalize_day(db, s_id)
+    locked = db.execute(text("SELECT * FROM daily_stock_summary WHERE stock_day_id = :s"), {"s": s_id}).fetchall()
+
+    assert len(locked) == len(dataset.type_ids)
+    for s in locked:
+        e = expected[s.cylinder_type_id]
+        assert (s.closing_filled, s.closing_empty, s.total_stock) == \
+            (e["closing"]["f"], e["closing"]["e"], e["total_stock"])
+        assert (s.sales_regular, s.tv_out_qty, s.is_reconciled) == (e["issues"]["reg"], e["tv"], 1)
+
+
+def test_finalize_day_matches_closing_rows(db, dataset):
+    assert_finalize_matches_closing_rows(db, dataset)
+
+
+def test_finalize_day_with_nulls_and_a_type_without_issues(db, dataset):
+    s_id, (first, second) = dataset.open_day_id, dataset.type_ids[:2]
+    # Receipts and returns are NOT NULL in the schema; openings stay NULL until the opening step saves them
+    db.execute(text("UPDATE daily_stock_summary SET opening_filled = NULL, opening_empty = NULL, item_receipt = 0, "
+                    "item_return = 0 WHERE stock_day_id = :s AND cylinder_type_id = :t"), {"s": s_id, "t": first})
+    db.execute(text("DELETE FROM delivery_issues WHERE stock_day_id = :s AND cylinder_type_id = :t"),
+               {"s": s_id, "t": second})
+    assert second not in load_issue_totals(db, s_id)
+
+    assert_finalize_matches_closing_rows(db, dataset)
+    row = db.execute(text("SELECT sales_regular, nc_qty, dbc_qty, tv_out_qty FROM daily_stock_summary "
+                          "WHERE stock_day_id = :s AND cylinder_type_id = :t"), {"s": s_id, "t": second}).fetchone()
+    assert tuple(row) == (0, 0, 0, 0)
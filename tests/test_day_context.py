@@ -0,0 +1,54 @@
+from flask import g
+from sqlalchemy import text
+from app.services.agency import use_agency
+from app.services.day_context import get_day_context, invalidate_day_context
+
+
+def close_open_day(db, s_id):
+    db.execute(text("UPDATE stock_days SET status = 'CLOSED' WHERE stock_day_id = :s"), {"s": s_id})
+
+
+def test_days_are_cached_until_invalidated(db, dataset):
+    ctx = get_day_context(db)
+    assert (ctx.stock_day_id, ctx.prev_day_id) == (dataset.open_day_id, dataset.prev_day_id)
+
+    close_open_day(db, dataset.open_day_id)
+    assert get_day_context(db).stock_day_id == dataset.open_day_id
+
+    invalidate_day_context()
+    ctx = get_day_context(db)
+    assert (ctx.stock_day_id, ctx.prev_day_id) == (None, dataset.open_day_id)
+
+
+def test_cache_is_per_agency(db, dataset):
+    assert get_day_context(db).stock_day_id == dataset.open_day_id
+    with use_agency(2):
+        assert get_day_context(db).stock_day_id is None
+        invalidate_day_context()
+
+    # Invalidating agency 2 leaves agency 1's copy in place
+    close_open_day(db, dataset.open_day_id)
+    assert get_day_context(db).stock_day_id == dataset.open_day_id
+
+
+def test_request_resolves_once(app, db, dataset):
+    with app.test_request_context():
+        g.agency_id = 1
+        ctx = get_day_context(db)
+        invalidate_day_context()
+        close_open_day(db, dataset.open_day_id)
+        assert get_day_context(db) is not ctx
+        assert get_day_context(db) is get_day_context(db)
+
+
+def test_writes_reread_the_days(app, db, dataset):
+    get_day_context(db)
+    # Closed by another worker: this process still holds the open day
+    close_open_day(db, dataset.open_day_id)
+
+    with app.test_request_context(method="GET"):
+        g.agency_id = 1
+        assert get_day_context(db).stock_day_id == dataset.open_day_id
+    with app.test_request_context(method="POST"):
+        g.agency_id = 1
+        assert get_day_context(db).stock_day_id is None
@@ -0,0 +1,40 @@
+from sqlalchemy import text
+from app.services.delivery_issues import save_issue_grid, sync_tv_out_totals
+from app.services.workflow_state import STEPS, read_progress, sync_steps
+
+
+def tv_out(db, s_id):
+    return dict(db.execute(text("SELECT cylinder_type_id, tv_out_qty FROM daily_stock_summary "
+                                "WHERE stock_day_id = :s"), {"s": s_id}).fetchall())
+
+
+def test_tv_out_is_retotalled_over_all_rows(db, dataset):
+    s_id = dataset.open_day_id
+    b1, b2 = dataset.boy_ids[:2]
+    t1, t2 = dataset.type_ids[:2]
+    db.execute(text("DELETE FROM delivery_issues WHERE stock_day_id = :s"), {"s": s_id})
+
+    zero = {"r": 0, "n": 0, "d": 0, "tv": 0}
+    assert save_issue_grid(db, s_id, {(b1, t1): {**zero, "tv": 3}, (b2, t1): {**zero, "tv": 2},
+                                      (b1, t2): zero}) == 2
+    # An imported row saved separately still counts towards the total
+    save_issue_grid(db, s_id, {(b2, t2): {**zero, "r": 1, "tv": 4}}, "IMPORT")
+    sync_tv_out_totals(db, s_id)
+
+    assert tv_out(db, s_id) == {t: {t1: 5, t2: 4}.get(t, 0) for t in dataset.type_ids}
+
+    db.execute(text("DELETE FROM delivery_issues WHERE stock_day_id = :s"), {"s": s_id})
+    sync_tv_out_totals(db, s_id)
+    assert set(tv_out(db, s_id).values()) == {0}
+
+
+def test_read_progress_does_not_seed_state(db, dataset):
+    s_id = dataset.open_day_id
+    sync_steps(db, s_id)
+    expected = read_progress(db, s_id)
+    db.execute(text("DELETE FROM day_workflow_state WHERE stock_day_id = :s"), {"s": s_id})
+
+    assert read_progress(db, s_id) == expected
+    assert expected["deliveries"] and not expected[STEPS[-1]]
+    assert db.execute(text("SELECT COUNT(*) FROM day_workflow_state WHERE stock_day_id = :s"),
+                      {"s": s_id}).scalar() == 0
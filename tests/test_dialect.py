@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine, text
+from app.db.bulk import bulk_upsert
+from app.db.dialect import constant_source, inserted, on_conflict_update
+
+# Never connects: only its dialect is read
+mysql = create_engine("mysql+pymysql://user:pw@localhost/db")
+
+
+def test_mysql_clauses():
+    assert inserted(mysql, "qty") == "VALUES(qty)"
+    assert on_conflict_update(mysql, "delivery_cash_carry_forward", ["opening_balance"]) == \
+        "ON DUPLICATE KEY UPDATE opening_balance = VALUES(opening_balance)"
+    assert constant_source(mysql) == "FROM DUAL"
+
+
+def test_sqlite_clauses(db):
+    assert inserted(db, "qty") == "excluded.qty"
+    assert on_conflict_update(db, "day_workflow_state", {"opening": "1"}) == \
+        "ON CONFLICT (stock_day_id) DO UPDATE SET opening = 1"
+    assert constant_source(db) == ""
+
+
+def test_bulk_upsert_inserts_then_updates(db, dataset):
+    columns = ("delivery_boy_id", "opening_balance", "stock_day_id")
+    boy = dataset.boy_ids[0]
+    db.execute(text("DELETE FROM delivery_cash_carry_forward WHERE delivery_boy_id = :b"), {"b": boy})
+
+    bulk_upsert(db, "delivery_cash_carry_forward", columns,
+                [{"delivery_boy_id": boy, "opening_balance": 10, "stock_day_id": 1}], columns[1:])
+    bulk_upsert(db, "delivery_cash_carry_forward", columns,
+                [{"delivery_boy_id": boy, "opening_balance": 25, "stock_day_id": 2}], columns[1:], chunk_size=1)
+
+    rows = db.execute(text("SELECT opening_balance, stock_day_id FROM delivery_cash_carry_forward "
+                           "WHERE delivery_boy_id = :b"), {"b": boy}).fetchall()
+    assert [(float(r.opening_balance), r.stock_day_id) for r in rows] == [(25.0, 2)]
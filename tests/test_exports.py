@@ -0,0 +1,30 @@
+import csv
+import io
+import zipfile
+
+
+def export_csv(client, report, start, end):
+    response = client.get(f"/export/{report}?start={start}&end={end}&format=csv")
+    assert response.status_code == 200
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_range_export_has_a_dated_row_per_day(client, dataset):
+    rows = export_csv(client, "stock", dataset.first_date, dataset.last_date)
+    assert rows[0][:2] == ["Stock_Date", "Cylinder_Type"]
+    assert {r[0] for r in rows[1:]} >= {str(dataset.first_date), str(dataset.last_date)}
+
+
+def test_empty_range_still_has_the_header(client, dataset):
+    assert export_csv(client, "stock", "1990-01-01", "1990-01-31") == [
+        ["Stock_Date", "Cylinder_Type", "opening_filled", "opening_empty", "item_receipt", "item_return",
+         "sales_regular", "nc_qty", "dbc_qty", "closing_filled", "closing_empty"]]
+    assert export_csv(client, "cash", "1990-01-01", "1990-01-31")[0][:2] == ["Stock_Date", "Delivery_Boy"]
+
+
+def test_empty_xlsx_sheet_has_the_header(client, dataset):
+    response = client.get("/export/cash?start=1990-01-01&end=1990-01-31&format=xlsx")
+    with zipfile.ZipFile(io.BytesIO(response.get_data())) as book:
+        sheet = book.read("xl/worksheets/sheet1.xml").decode()
+        strings = book.read("xl/sharedStrings.xml").decode() if "xl/sharedStrings.xml" in book.namelist() else sheet
+    assert "Delivery_Boy" in strings and 'r="A1"' in sheet
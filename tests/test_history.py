@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+
+def test_pages_walk_every_closed_day_once(client, dataset):
+    dates, before = [], ""
+    while True:
+        page = client.get(f"/history?limit=7{before}").get_json()
+        dates += [item["stock_date"] for item in page["items"]]
+        if not page["next_before"]:
+            break
+        assert page["next_before"] == page["items"][-1]["stock_date"]
+        before = f"&before={page['next_before']}"
+
+    closed = [str(dataset.first_date + timedelta(days=i)) for i in range(dataset.days - 1)]
+    assert dates == sorted(closed, reverse=True)
+
+
+def test_date_filters_and_bad_input(client, dataset):
+    start = dataset.first_date + timedelta(days=2)
+    page = client.get(f"/history?from={start}&to={start + timedelta(days=1)}").get_json()
+    assert [item["stock_date"] for item in page["items"]] == [str(start + timedelta(days=1)), str(start)]
+    assert page["next_before"] is None
+
+    response = client.get("/history?before=yesterday")
+    assert response.status_code == 400 and "before" in response.get_json()["error"]
@@ -0,0 +1,119 @@
+import io
+import zipfile
+import pytest
+from app.services.issue_import import ImportReport, collect_issues, iter_file_rows
+from app.services.master_data import MasterData
+from benchmarks.datagen import Boy, CylinderType
+
+MASTER = MasterData(1, [
+    Boy(1, "Ravi", "9000000001", 1),
+    Boy(2, "Asha", "9000000002", 1),
+    # A name that looks like another boy's id must not shadow the id match
+    Boy(3, "1", "9000000003", 1),
+    Boy(4, "Gone", "9000000004", 0),
+], [CylinderType(1, "DOM14", "DOMESTIC"), CylinderType(2, "COM19", "COMMERCIAL")], {}, [])
+
+
+def collect(lines):
+    report = ImportReport()
+    data = collect_issues(iter_file_rows("issues.csv", io.BytesIO("\n".join(lines).encode())), MASTER, report)
+    return data, report
+
+
+def test_csv_rows_are_matched_and_summed():
+    data, report = collect([
+        "Delivery Boy,Code,Regular,NC,DBC,TV Out",
+        "ravi,dom14,2,1,,",
+        "9000000002,2,0,0,1,1",
+        "1,DOM14,3,0,0,0",
+        ",,,,,",
+    ])
+    assert report.failed == 0 and report.rows_read == 3
+    assert data == {
+        (1, 1): {"r": 5, "n": 1, "d": 0, "tv": 0},
+        (2, 2): {"r": 0, "n": 0, "d": 1, "tv": 1},
+    }
+
+
+def test_invalid_rows_are_reported_not_saved():
+    data, report = collect([
+        "boy,type,regular",
+        "Gone,DOM14,1",
+        "Nobody,DOM14,1",
+        "Ravi,XX,1",
+        "Ravi,DOM14,-1",
+        "Ravi,DOM14,1.5",
+        "Ravi,DOM14,1e400",
+        "Ravi,DOM14,4",
+    ])
+    assert data == {(1, 1): {"r": 4, "n": 0, "d": 0, "tv": 0}}
+    assert report.failed == 6
+    assert [m for _, m in report.errors[:3]] == [
+        "Delivery boy 'Gone' is inactive", "Unknown delivery boy 'Nobody'", "Unknown cylinder type 'XX'"]
+    assert {line for line, _ in report.errors} == {2, 3, 4, 5, 6, 7}
+
+
+def test_missing_columns_and_unknown_extension():
+    with pytest.raises(ValueError, match="Missing column"):
+        collect(["boy,regular", "Ravi,1"])
+    with pytest.raises(ValueError, match="Only .csv and .xlsx"):
+        iter_file_rows("issues.xls", io.BytesIO(b""))
+
+
+def _sheet(rows):
+    cells = "".join(
+        f'<row r="{r}">' + "".join(f'<c r="{col}{r}" t="inlineStr"><is><t>{v}</t></is></c>'
+                                   for col, v in zip("ABC", values)) + "</row>"
+        for r, values in enumerate(rows, start=1))
+    return ('<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f"<sheetData>{cells}</sheetData></worksheet>")
+
+
+def test_xlsx_reads_first_tab_through_workbook_rels():
+    # The first tab is stored as sheet2.xml; sheet1.xml is the second tab
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as book:
+        book.writestr("xl/workbook.xml", (
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            '<sheet name="Issues" sheetId="2" r:id="rId7"/><sheet name="Notes" sheetId="1" r:id="rId1"/>'
+            "</sheets></workbook>"))
+        book.writestr("xl/_rels/workbook.xml.rels", (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/>'
+            '<Relationship Id="rId7" Target="/xl/worksheets/sheet2.xml"/></Relationships>'))
+        book.writestr("xl/worksheets/sheet1.xml", _sheet([["notes"], ["nothing to import"]]))
+        book.writestr("xl/worksheets/sheet2.xml", _sheet([["boy", "type", "regular"], ["Asha", "COM19", "7"]]))
+    buf.seek(0)
+
+    report = ImportReport()
+    data = collect_issues(iter_file_rows("issues.xlsx", buf), MASTER, report)
+    assert report.failed == 0
+    assert data == {(2, 2): {"r": 7, "n": 0, "d": 0, "tv": 0}}
+
+
+@pytest.mark.parametrize("content", [
+    b"not a zip at all",
+    {"xl/other.xml": "<x/>"},
+    {"xl/workbook.xml": "<workbook><sheets"},
+])
+def test_corrupt_workbook_is_a_value_error(content):
+    buf = io.BytesIO()
+    if isinstance(content, bytes):
+        buf.write(content)
+    else:
+        with zipfile.ZipFile(buf, "w") as book:
+            for name, data in content.items():
+                book.writestr(name, data)
+    buf.seek(0)
+
+    with pytest.raises(ValueError, match="Not a valid .xlsx workbook"):
+        collect_issues(iter_file_rows("issues.xlsx", buf), MASTER, ImportReport())
+
+
+def test_corrupt_upload_is_flashed_not_a_500(client):
+    response = client.post("/delivery-transactions/import",
+                           data={"issue_file": (io.BytesIO(b"PK\x03\x04 truncated"), "issues.xlsx")},
+                           content_type="multipart/form-data", follow_redirects=True)
+    assert response.status_code == 200
+    assert "Not a valid .xlsx workbook" in response.get_data(as_text=True)
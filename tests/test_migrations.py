@@ -0,0 +1,29 @@
+from sqlalchemy import text
+from app.db.migrations import applied_versions, load_migrations, upgrade
+from app.db.migrations.check import _hot_queries, explain_hot_queries
+from app.db.session import engine
+
+
+def test_upgrade_is_idempotent(app):
+    upgrade(engine)
+    assert upgrade(engine) == []
+    with engine.connect() as conn:
+        assert applied_versions(conn) >= {version for version, _, _ in load_migrations()}
+
+
+def test_hot_queries_are_the_services_statements(dataset):
+    from app.services.day_context import OPEN_DAY_SQL
+    from app.services.vehicle_stock import RECONCILE_GRID_SQL
+
+    queries = dict(_hot_queries())
+    assert queries["day_context.OPEN_DAY_SQL"] == str(OPEN_DAY_SQL)
+    assert queries["vehicle_stock.RECONCILE_GRID_SQL"] == str(RECONCILE_GRID_SQL)
+    # Pricing is done in Python now; nothing reads the old price join any more
+    assert not any("price_nc_components" in sql for sql in queries.values())
+
+
+def test_hot_queries_use_indexes(dataset):
+    with engine.connect() as conn:
+        findings = explain_hot_queries(conn)
+    assert {name for name, *_ in findings} == {name for name, _ in _hot_queries()}
+    assert [f for f in findings if f[-1]] == []
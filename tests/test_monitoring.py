@@ -0,0 +1,38 @@
+import logging
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.db import instrumentation, session
+from app.db.instrumentation import RequestStats, render_prometheus
+
+
+def test_pool_stats_cover_routed_engines(monkeypatch, tmp_path):
+    monkeypatch.setitem(session.AGENCY_DATABASE_URLS, 2, f"sqlite:///{tmp_path / 'agency2.db'}")
+    routed = session.engine_for(2)
+    with routed.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats = session.get_pool_stats()
+
+    by_name = {e["engine"]: e for e in stats["engines"]}
+    assert set(by_name) == {"main", "agency_2"}
+    assert by_name["agency_2"]["checked_out"] == 1 and by_name["agency_2"]["checkouts"] == 1
+    assert stats["checked_out"] == sum(e["checked_out"] for e in stats["engines"])
+
+    exported = render_prometheus(stats)
+    assert 'app_db_pool_connections{engine="agency_2",state="checked_out"} 1' in exported
+    assert 'app_db_pool_size{engine="main"} 1' in exported
+    routed.dispose()
+
+
+def test_failed_statements_are_timed_and_logged(app, monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0.000001)
+    with app.test_request_context(), session.engine.connect() as conn, caplog.at_level(logging.WARNING, "app.sql.slow"):
+        g.sql_stats = stats = RequestStats()
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+
+        assert (stats.queries, stats.slow_queries) == (2, 2)
+        assert "failed SELECT * FROM no_such_table" in caplog.text
+        assert not any(key.startswith("query") for key in conn.info)
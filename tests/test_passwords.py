@@ -0,0 +1,32 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from werkzeug.security import generate_password_hash
+from app.services import passwords
+from app.services.passwords import HashingBusy, hash_password, verify_password
+
+
+def test_verify_upgrades_outdated_hashes():
+    assert verify_password(hash_password("secret"), "secret") == (True, None)
+    assert verify_password(hash_password("secret"), "wrong") == (False, None)
+
+    ok, new_hash = verify_password(generate_password_hash("secret", method="pbkdf2:sha256:500"), "secret")
+    assert ok and new_hash.startswith(passwords.current_method() + "$")
+
+
+def test_queueing_and_hashing_share_one_wait(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_WAIT", 0.3)
+    monkeypatch.setattr(passwords, "_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(passwords, "_executor", ThreadPoolExecutor(max_workers=1))
+    # The only slot frees up after 0.2 s; the hash itself then takes longer than what is left of the wait
+    passwords._slots.acquire()
+    threading.Timer(0.2, passwords._slots.release).start()
+
+    started = time.monotonic()
+    with pytest.raises(HashingBusy):
+        passwords._run(time.sleep, 0.6)
+    waited = time.monotonic() - started
+    # Let the hash finish and free its slot before the patched pool is restored
+    passwords._executor.shutdown(wait=True)
+    assert waited < 0.45
@@ -0,0 +1,72 @@
+import logging
+from collections import namedtuple
+import numpy as np
+from app.services.master_data import MasterData
+from app.services.pricing import PriceBook, expected_rows_by_day
+from benchmarks.datagen import Boy, CylinderType, Issue, Price
+
+Revision = namedtuple("Revision", "cylinder_type_id effective_from " + " ".join(Price._fields[1:]))
+
+TYPES = [CylinderType(1, "T01", "DOMESTIC"), CylinderType(2, "T02", "COMMERCIAL")]
+PRICES = {1: Price(1, 1000, 500, 50, 100, 150)}
+
+
+def test_unit_prices_per_category():
+    book = PriceBook(TYPES, PRICES)
+    # regular refill, NC (everything), DBC (no regulator), TV-out refund (deposit)
+    assert book.unit_prices()[0].tolist() == [500, 1800, 1650, 1000]
+    assert book.unit_prices()[1].tolist() == [0, 0, 0, 0]
+
+
+def test_revisions_apply_from_their_date():
+    book = PriceBook(TYPES, PRICES, [Revision(1, "2026-02-01", 1000, 600, 50, 100, 150),
+                                     Revision(2, "2026-03-01", 2000, 900, 0, 0, 0)])
+    assert book.unit_prices("2026-01-31")[0][0] == 500
+    assert book.unit_prices("2026-02-01")[0][0] == 600
+    assert book.is_priced([1, 2, 99], "2026-02-15").tolist() == [True, False, False]
+    assert book.is_priced([1, 2], "2026-03-01").tolist() == [True, True]
+
+    amounts = book.price_issues([1, 2], np.array([[2, 0, 0, 1], [1, 0, 0, 0]], dtype=float), "2026-03-01")
+    assert amounts.tolist() == [[1200, 0, 0, 1000], [900, 0, 0, 0]]
+
+
+def test_unpriced_issues_are_left_out(caplog):
+    master = MasterData(1, [Boy(1, "Boy 1", "9000000001", 1)], TYPES, PRICES, [])
+    issues = [Issue(1, "2026-01-10", 1, 1, 2, 1, 0, 0), Issue(1, "2026-01-10", 1, 2, 5, 0, 0, 0)]
+
+    with caplog.at_level(logging.WARNING, logger="app.services.pricing"):
+        rows = expected_rows_by_day(issues, master)
+
+    assert list(rows) == [(1, 1)]
+    row = rows[(1, 1)]
+    assert (row["regular_amt"], row["nc_amt"], row["expected_amount"]) == (1000, 1800, 2800)
+    assert "No price for cylinder type(s) [2]" in caplog.text
+
+
+def test_day_with_only_unpriced_issues_has_no_rows():
+    master = MasterData(1, [Boy(1, "Boy 1", "9000000001", 1)], TYPES, PRICES, [])
+    assert expected_rows_by_day([Issue(1, "2026-01-10", 1, 2, 5, 0, 0, 0)], master) == {}
+
+
+def test_price_revision_command_bumps_master_data(app, db, dataset):
+    from sqlalchemy import text
+    from app.services.master_data import get_master_data
+
+    type_id = dataset.type_ids[0]
+    code = db.execute(text("SELECT code FROM cylinder_types WHERE cylinder_type_id = :t"), {"t": type_id}).scalar()
+    version = get_master_data(db).version
+    runner = app.test_cli_runner()
+
+    for refill in (700, 750):
+        result = runner.invoke(args=["add-price-revision", code.lower(), "--from", str(dataset.last_date),
+                                     "--refill", str(refill)])
+        assert result.exit_code == 0, result.output
+    db.rollback()
+
+    master = get_master_data(db)
+    assert master.version == version + 2
+    assert [(r.cylinder_type_id, float(r.refill_amount)) for r in master.price_revisions] == [(type_id, 750)]
+    assert master.price_book.unit_prices(dataset.last_date)[master.price_book.type_index[type_id]][0] == 750
+
+    result = runner.invoke(args=["add-price-revision", "NOPE", "--from", str(dataset.last_date)])
+    assert result.exit_code != 0 and "Unknown cylinder type 'NOPE'" in result.output
@@ -0,0 +1,58 @@
+import math
+import pandas as pd
+from sqlalchemy import text
+from app.services.range_report import aggregate_cash, aggregate_stock, build_range_report
+
+
+def stock_frame(rows):
+    cols = ["stock_date", "cylinder_type", "opening_filled", "opening_empty", "item_receipt", "item_return",
+            "sales_regular", "nc_qty", "dbc_qty", "tv_out_qty", "closing_filled", "closing_empty"]
+    df = pd.DataFrame(rows, columns=cols)
+    df["stock_date"] = pd.to_datetime(df["stock_date"])
+    return df
+
+
+def test_stock_aggregates_per_type_and_week():
+    # Sunday, Monday, Tuesday: the Monday starts a new week
+    by_type, by_week, daily = aggregate_stock(stock_frame([
+        ("2024-03-05", "DOM", 90, 30, 5, 0, 6, 0, 0, 0, 89, 36),
+        ("2024-03-03", "DOM", 100, 20, 10, 5, 10, 1, 0, 2, 99, 27),
+        ("2024-03-04", "DOM", 99, 27, 0, None, 9, 0, 0, 0, 90, 30),
+        ("2024-03-03", "COM", 50, 5, 0, 0, 3, 0, 1, 0, 46, 8),
+    ]), "week")
+
+    dom = by_type.set_index("cylinder_type").loc["DOM"]
+    assert (dom.opening_filled, dom.closing_filled, dom.closing_empty) == (100, 89, 36)
+    assert (dom.sales_regular, dom.item_return, dom.total_sales, dom.days) == (25, 5, 26, 3)
+
+    weeks = by_week[by_week.cylinder_type == "DOM"].set_index("period_start")["sales_regular"]
+    assert weeks.to_dict() == {pd.Timestamp("2024-02-26"): 10, pd.Timestamp("2024-03-04"): 15}
+    assert daily.set_index("stock_date").loc[pd.Timestamp("2024-03-03"), "total_sales"] == 15
+
+
+def test_collection_rate_is_blank_without_expected_cash():
+    cash = pd.DataFrame([
+        ("2024-03-01", "Ravi", 0, 100, 80, 20),
+        ("2024-03-02", "Ravi", 20, 50, 70, 0),
+        ("2024-03-01", "Asha", 0, 0, 0, 0),
+    ], columns=["stock_date", "delivery_boy", "opening_balance", "today_expected", "today_deposited",
+                "closing_balance"])
+    cash["stock_date"] = pd.to_datetime(cash["stock_date"])
+    by_boy, by_month = aggregate_cash(cash)
+
+    boys = by_boy.set_index("delivery_boy")
+    assert boys.loc["Ravi", "collection_rate"] == 1.0 and boys.loc["Ravi", "closing_balance"] == 0
+    assert math.isnan(boys.loc["Asha", "collection_rate"])
+    assert by_month.set_index("delivery_boy").loc["Ravi", "expected"] == 150
+
+
+def test_statement_covers_closed_days_only(db, dataset):
+    sheets = build_range_report(db, dataset.first_date, dataset.last_date, "month")
+    closed_sales = db.execute(text(
+        "SELECT SUM(sales_regular) FROM daily_stock_summary WHERE stock_day_id < :s"), {"s": dataset.open_day_id}
+    ).scalar()
+
+    assert sheets["Stock_By_Type"]["sales_regular"].sum() == closed_sales
+    assert sheets["Stock_By_Month"]["sales_regular"].sum() == closed_sales
+    assert sheets["Daily_Totals"]["stock_date"].max().date() < dataset.last_date
+    assert set(sheets) == {"Stock_By_Type", "Stock_By_Month", "Daily_Totals", "Cash_By_Boy", "Cash_By_Month"}
@@ -0,0 +1,36 @@
+from sqlalchemy import text
+from app.services.recompute import recompute_from
+
+
+def summary(db, s_id, t_id):
+    return db.execute(text("SELECT * FROM daily_stock_summary WHERE stock_day_id = :s AND cylinder_type_id = :t"),
+                      {"s": s_id, "t": t_id}).fetchone()
+
+
+def test_generated_history_is_consistent(db, dataset):
+    changes, days = recompute_from(db, dataset.first_date, dry_run=True)
+    assert changes == [] and days == dataset.days
+
+
+def test_correction_is_replayed_once(db, dataset):
+    s_id, t_id = 5, dataset.type_ids[0]
+    day = db.execute(text("SELECT stock_date FROM stock_days WHERE stock_day_id = :s"), {"s": s_id}).scalar()
+    before = summary(db, s_id, t_id)
+    # A late IOCL receipt correction on a closed day
+    db.execute(text("UPDATE daily_stock_summary SET item_receipt = item_receipt + 10 "
+                    "WHERE stock_day_id = :s AND cylinder_type_id = :t"), {"s": s_id, "t": t_id})
+    db.commit()
+
+    preview, _ = recompute_from(db, day, dry_run=True)
+    changes, _ = recompute_from(db, day)
+    assert changes and changes == preview
+    assert {c.table for c in changes} == {"daily_stock_summary"}
+
+    after = summary(db, s_id, t_id)
+    assert after.closing_filled == before.closing_filled + 10
+    assert summary(db, s_id + 1, t_id).opening_filled == after.closing_filled
+    assert summary(db, dataset.open_day_id, t_id).opening_filled == \
+        summary(db, dataset.prev_day_id, t_id).closing_filled
+
+    again, _ = recompute_from(db, day, dry_run=True)
+    assert again == []
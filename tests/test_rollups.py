@@ -0,0 +1,46 @@
+from sqlalchemy import text
+from app.services.day_context import get_day_context
+from app.services.rollups import fold_day_into_rollups, month_start, rebuild_month
+
+
+def rollups(db):
+    stock = db.execute(text("SELECT * FROM monthly_stock_rollup ORDER BY month_start, cylinder_type_id")).fetchall()
+    cash = db.execute(text("SELECT * FROM monthly_cash_rollup ORDER BY month_start, delivery_boy_id")).fetchall()
+    return [tuple(r) for r in stock], [tuple(r) for r in cash]
+
+
+def open_day(db, dataset):
+    return db.execute(text("SELECT * FROM stock_days WHERE stock_day_id = :s"), {"s": dataset.open_day_id}).fetchone()
+
+
+def test_fold_matches_rebuild_and_is_applied_once(db, dataset):
+    day = open_day(db, dataset)
+    db.execute(text("UPDATE stock_days SET status = 'CLOSED' WHERE stock_day_id = :s"), {"s": day.stock_day_id})
+
+    assert fold_day_into_rollups(db, day.stock_day_id, day.stock_date)
+    folded = rollups(db)
+    assert not fold_day_into_rollups(db, day.stock_day_id, day.stock_date)
+    assert rollups(db) == folded
+
+    rebuild_month(db, month_start(day.stock_date))
+    assert rollups(db) == folded
+
+
+def test_day_close_folds_once(client, db, dataset):
+    days_before = db.execute(text("SELECT MAX(days) FROM monthly_stock_rollup")).scalar()
+    # A worker still holding the day in its cache
+    get_day_context(db)
+
+    assert client.get("/day-close").status_code == 405
+    assert client.post("/day-close").status_code == 302
+    assert client.post("/day-close").status_code == 302
+
+    db.rollback()
+    day = open_day(db, dataset)
+    assert (day.status, day.rolled_up) == ("CLOSED", 1)
+    counts = db.execute(text("SELECT days FROM monthly_stock_rollup WHERE month_start = :m"),
+                        {"m": month_start(day.stock_date)}).scalars().all()
+    assert counts and max(counts) <= days_before + 1
+    rebuilt = rollups(db)
+    rebuild_month(db, month_start(day.stock_date))
+    assert rollups(db) == rebuilt
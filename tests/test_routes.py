@@ -0,0 +1,47 @@
+from sqlalchemy import text
+from benchmarks.routes import build_cases, run_case
+
+
+def test_benchmark_cases_run(client, dataset):
+    # Same walk as benchmarks.routes: every step page, in workflow order, each answering below 400
+    for case in build_cases(dataset):
+        run_case(client, case, repeat=1)
+
+
+def test_streamed_exports_report_their_queries(client, dataset):
+    case = next(c for c in build_cases(dataset) if c.name == "export stock csv")
+    result = run_case(client, case, repeat=2)
+    assert result["runs"] == 2 and result["queries"] > 0 and result["db_ms"] > 0
+
+
+def test_day_is_settled_after_the_walk(client, db, dataset):
+    for case in build_cases(dataset):
+        run_case(client, case, repeat=1)
+    state = db.execute(text("SELECT * FROM day_workflow_state WHERE stock_day_id = :s"),
+                       {"s": dataset.open_day_id}).fetchone()
+    assert state.finalized_stock and state.expected_cash and state.cash_collection and state.reconciled_cash
+
+
+def test_grid_ignores_ids_outside_the_agency(client, db, dataset):
+    b, t = dataset.boy_ids[0], dataset.type_ids[0]
+    response = client.post("/delivery-transactions", data={
+        f"issue_{b}_{t}_REFILL": 7, f"issue_{b}_9999_REFILL": 5, f"issue_9999_{t}_REFILL": 5})
+    assert response.status_code == 302
+
+    rows = db.execute(text("SELECT delivery_boy_id, cylinder_type_id, regular_qty FROM delivery_issues "
+                           "WHERE stock_day_id = :s"), {"s": dataset.open_day_id}).fetchall()
+    assert [tuple(r) for r in rows if r.regular_qty == 5] == []
+    assert (b, t, 7) in [tuple(r) for r in rows]
+
+
+def test_dashboard_does_not_write(client, db, dataset):
+    db.execute(text("DELETE FROM day_workflow_state WHERE stock_day_id = :s"), {"s": dataset.open_day_id})
+    db.commit()
+    assert client.get("/dashboard").status_code == 200
+    assert db.execute(text("SELECT COUNT(*) FROM day_workflow_state WHERE stock_day_id = :s"),
+                      {"s": dataset.open_day_id}).scalar() == 0
+
+
+def test_pages_need_a_login(app, dataset):
+    response = app.test_client().get("/dashboard")
+    assert response.status_code == 302 and "/login" in response.headers["Location"]
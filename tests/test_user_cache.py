@@ -0,0 +1,43 @@
+from sqlalchemy import text
+from app.services import user_cache
+from app.services.user_cache import TTLCache, bump_user_directory_version, get_identity
+
+
+def test_ttl_cache_evicts_least_recent_and_expired(monkeypatch):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is user_cache._MISSING and (cache.get("a"), cache.get("c")) == (1, 3)
+
+    now = user_cache.time.monotonic()
+    monkeypatch.setattr(user_cache.time, "monotonic", lambda: now + 61)
+    assert cache.get("a") is user_cache._MISSING
+
+
+def test_revocation_elsewhere_reaches_cached_identities(app, db, dataset, monkeypatch):
+    monkeypatch.setattr(user_cache, "USER_VERSION_CHECK_INTERVAL", 0)
+    user_id = db.execute(text("SELECT user_id FROM users WHERE username = 'bench'")).scalar()
+
+    with app.test_request_context():
+        assert get_identity(user_id).username == "bench"
+    # Another worker revokes the user: only the table and the version stamp change
+    db.execute(text("UPDATE users SET is_approved = 0 WHERE user_id = :id"), {"id": user_id})
+    bump_user_directory_version(db)
+    db.commit()
+    with app.test_request_context():
+        assert get_identity(user_id) is None
+
+
+def test_identity_is_read_once_per_ttl(app, db, dataset, monkeypatch):
+    user_id = db.execute(text("SELECT user_id FROM users WHERE username = 'bench'")).scalar()
+    calls = []
+    fetch = user_cache._fetch_identity
+    monkeypatch.setattr(user_cache, "_fetch_identity", lambda uid: calls.append(uid) or fetch(uid))
+    user_cache.invalidate_user(user_id)
+
+    with app.test_request_context():
+        first = get_identity(user_id)
+        assert get_identity(user_id) == first and first.agency_id == 1
+    assert calls == [str(user_id)]
@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from app.services.vehicle_stock import (
+    get_balances_as_of, get_current_balances, load_expected_empties, load_prev_vehicle_empties,
+    rebuild_vehicle_balances, save_vehicle_balances,
+)
+
+
+def balance_rows(db):
+    return sorted(tuple(r) for r in db.execute(text(
+        "SELECT delivery_boy_id, cylinder_type_id, stock_day_id, empty_qty, prev_empty_qty FROM delivery_vehicle_balance")))
+
+
+def test_current_balances_match_history(db, dataset):
+    # The generated open day already has its returns saved
+    assert get_current_balances(db) == get_balances_as_of(db, dataset.open_day_id)
+
+
+def test_resaving_the_open_day_is_idempotent(db, dataset):
+    s_id, p_id = dataset.open_day_id, dataset.prev_day_id
+    before = load_prev_vehicle_empties(db, s_id)
+    assert before == get_balances_as_of(db, p_id)
+    expected = load_expected_empties(db, p_id)
+
+    rows = save_vehicle_balances(db, s_id, p_id, dataset.open_returns)
+    first = get_current_balances(db)
+    # Saving the same day again starts from prev_empty_qty, not from the balance the first save left
+    save_vehicle_balances(db, s_id, p_id, dataset.open_returns)
+    assert get_current_balances(db) == first
+
+    for r in rows:
+        pair = (r["delivery_boy_id"], r["cylinder_type_id"])
+        assert first[pair] == before.get(pair, 0) + expected.get(pair, 0) - dataset.open_returns[pair]
+
+
+def test_rebuild_reproduces_the_maintained_table(db, dataset):
+    save_vehicle_balances(db, dataset.open_day_id, dataset.prev_day_id, dataset.open_returns)
+    db.commit()
+    maintained = balance_rows(db)
+
+    db.execute(text("UPDATE delivery_vehicle_balance SET empty_qty = empty_qty + 7"))
+    rebuild_vehicle_balances(db)
+    assert balance_rows(db) == maintained